@@ -0,0 +1,51 @@
+"""
+Arranque del servidor con WORKERS procesos de uvicorn.
+
+    python -m api --host 0.0.0.0 --port 8000
+
+Con más de un worker conviene SHARED_STATE_BACKEND=sqlite (o redis) para que
+las sesiones de chat y las métricas se compartan, y CACHE_BACKEND=sqlite (o
+redis) para compartir la caché de respuestas.
+
+    python -m api --profile-startup
+
+muestra el tiempo de importación por módulo y termina (código 1 si supera
+STARTUP_IMPORT_BUDGET_MS); con STARTUP_PROFILE=true se muestra al arrancar.
+"""
+
+import argparse
+import logging
+
+import uvicorn
+
+from .config.config import settings
+from . import startup_profile
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=f"Servidor de {settings.APP_NAME}")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--profile-startup", action="store_true", help="Mostrar el tiempo de importación por módulo y salir")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        raise SystemExit(startup_profile.main([]))
+    if settings.STARTUP_PROFILE:
+        summary = startup_profile.summarize(startup_profile.profile_imports())
+        print(startup_profile.format_report(summary, settings.STARTUP_IMPORT_BUDGET_MS), flush=True)
+
+    if settings.WORKERS > 1 and settings.SHARED_STATE_BACKEND == "local":
+        logging.basicConfig(level=logging.INFO)
+        logger.warning(
+            "⚠️ %s workers con SHARED_STATE_BACKEND=local: "
+            "las sesiones de chat y las métricas quedan separadas por proceso",
+            settings.WORKERS,
+        )
+    uvicorn.run("api.main:app", host=args.host, port=args.port, workers=settings.WORKERS)
+
+
+if __name__ == "__main__":
+    main()
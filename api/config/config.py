@@ -7,6 +7,176 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: Optional[str] = None
     GEMINI_MODEL: str = "gemini-2.5-flash"
 
+    # Varias claves y modelos: GEMINI_API_KEYS (separadas por comas, se suman a GEMINI_API_KEY)
+    # reparte las llamadas entre claves según el uso del último minuto. Con límites por clave
+    # (RPM/TPM, 0 = sin límite; se dividen entre WORKERS) se saltean las claves agotadas antes
+    # de que la API responda 429, y una clave que recibe 429 descansa GEMINI_KEY_COOLDOWN_SECONDS.
+    # Con GEMINI_LIGHT_MODEL, los prompts cortos y simples (hasta GEMINI_LIGHT_MAX_PROMPT_TOKENS,
+    # sin historial ni pasajes) van a ese modelo más barato y rápido
+    GEMINI_API_KEYS: Optional[str] = None
+    GEMINI_KEY_RPM: int = 0
+    GEMINI_KEY_TPM: int = 0
+    GEMINI_KEY_COOLDOWN_SECONDS: float = 30.0
+    GEMINI_LIGHT_MODEL: Optional[str] = None
+    GEMINI_LIGHT_MAX_PROMPT_TOKENS: int = 80
+    GEMINI_LIGHT_KEY_RPM: int = 0
+    GEMINI_LIGHT_KEY_TPM: int = 0
+
+    # Proveedor del modelo: "gemini" (con GEMINI_API_KEY; sin ella, modo simulación), "openai"
+    # (cualquier servidor compatible con la API de OpenAI, p. ej. Ollama o vLLM en
+    # OPENAI_BASE_URL) o "simulator" (modelo local sin red con latencia, velocidad de
+    # generación y errores configurables). Los límites, plazos, reintentos y el circuit
+    # breaker GEMINI_*/BREAKER_* aplican a cualquier proveedor
+    LLM_PROVIDER: str = "gemini"
+    OPENAI_BASE_URL: str = "http://localhost:11434/v1"
+    OPENAI_API_KEY: Optional[str] = None
+    OPENAI_MODEL: str = "llama3.1"
+    SIMULATOR_LATENCY_MEDIAN_SECONDS: float = 0.8
+    SIMULATOR_LATENCY_SIGMA: float = 0.5
+    SIMULATOR_TOKENS_PER_SECOND: float = 50.0
+    SIMULATOR_ERROR_RATE: float = 0.0
+    SIMULATOR_REPLY_TOKENS: int = 150
+    SIMULATOR_SEED: Optional[int] = None
+
+    # Límite de llamadas simultáneas a Gemini y espera máxima en cola antes de responder 503
+    GEMINI_MAX_CONCURRENCY: int = 16
+    GEMINI_QUEUE_TIMEOUT_SECONDS: float = 2.0
+
+    # Plazo máximo de cada llamada a Gemini
+    GEMINI_CALL_TIMEOUT_SECONDS: float = 20.0
+
+    # Reutilizar la instrucción de sistema de cada modo como contexto cacheado en Gemini
+    # (solo aplica si el prefijo supera el mínimo de tokens cacheables del modelo)
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = False
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS: int = 3600
+
+    # Reintentos ante errores transitorios (429/5xx/plazo vencido) con backoff exponencial
+    # y jitter, sin pasarse del plazo total de la solicitud
+    GEMINI_REQUEST_DEADLINE_SECONDS: float = 30.0
+    GEMINI_MAX_RETRIES: int = 2
+    GEMINI_RETRY_BACKOFF_SECONDS: float = 0.25
+    GEMINI_RETRY_BACKOFF_MAX_SECONDS: float = 2.0
+
+    # Hedging: si Gemini no respondió al llegar al percentil indicado de las latencias
+    # recientes, se lanza una segunda llamada idéntica y gana la primera (consume más tokens)
+    GEMINI_HEDGE_ENABLED: bool = False
+    GEMINI_HEDGE_PERCENTILE: float = 95.0
+    GEMINI_HEDGE_MIN_DELAY_SECONDS: float = 0.5
+
+    # Circuit breaker: con Gemini fallando o lento se responde al instante en modo degradado
+    BREAKER_ENABLED: bool = True
+    BREAKER_WINDOW_SIZE: int = 20
+    BREAKER_MIN_CALLS: int = 5
+    BREAKER_ERROR_RATE: float = 0.5
+    BREAKER_SLOW_CALL_SECONDS: float = 10.0
+    BREAKER_SLOW_CALL_RATE: float = 0.8
+    BREAKER_OPEN_SECONDS: float = 30.0
+    BREAKER_HALF_OPEN_CALLS: int = 1
+
+    # Sesiones de chat: historial en memoria por session_id y presupuesto de tokens del historial
+    CHAT_SESSIONS_ENABLED: bool = True
+    CHAT_SESSION_MAX_SESSIONS: int = 5000
+    CHAT_SESSION_MAX_TURNS: int = 20
+    CHAT_SESSION_IDLE_SECONDS: float = 1800.0
+    CHAT_HISTORY_TOKEN_BUDGET: int = 1200
+
+    # Agrupar consultas idénticas simultáneas en una sola llamada a Gemini
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Endpoints por lotes: máximo de consultas por solicitud y cuántas se procesan en paralelo
+    BATCH_MAX_ITEMS: int = 50
+    BATCH_MAX_PARALLELISM: int = 8
+
+    # Base de conocimiento: directorio con archivos .md/.jsonl (relativo a la raíz del proyecto),
+    # revisión periódica de cambios (0 = desactivada) y token del endpoint de recarga
+    KB_DIRECTORY: str = "knowledge_base"
+    KB_WATCH_INTERVAL_SECONDS: float = 0.0
+    ADMIN_TOKEN: Optional[str] = None
+
+    # Clasificador local de intención para /simulador/rag: saludos, agradecimientos y preguntas
+    # ajenas al curso se responden sin llamar a Gemini. El modelo se entrena al iniciar con
+    # INTENT_TRAINING_FILE y solo decide con confianza >= INTENT_MIN_CONFIDENCE
+    INTENT_ROUTER_ENABLED: bool = True
+    INTENT_TRAINING_FILE: str = "data/intents.jsonl"
+    INTENT_MIN_CONFIDENCE: float = 0.85
+
+    # RAG - búsqueda en la base de conocimiento local
+    RAG_KB_MIN_CONFIDENCE: float = 0.6
+    RAG_KB_MAX_RESULTS: int = 3
+    # Corrección de errores de tipeo cuando BM25 no encuentra nada ("chat gpt", "contrasenias"):
+    # cada palabra desconocida se cambia por el término de la base más parecido por trigramas
+    # (similitud mínima entre 0 y 1) y se vuelve a buscar con RAG_KB_MIN_CONFIDENCE
+    RAG_FUZZY_ENABLED: bool = True
+    RAG_FUZZY_MIN_SIMILARITY: float = 0.5
+
+    # RAG - búsqueda semántica: "keyword" (BM25), "semantic" (embeddings) o "hybrid" (ambas)
+    RAG_RETRIEVAL_MODE: str = "keyword"
+    RAG_EMBEDDER: str = "hashing"  # "hashing" (local, sin red) o "gemini"
+    GEMINI_EMBEDDING_MODEL: str = "models/text-embedding-004"
+    RAG_EMBEDDINGS_PATH: Optional[str] = ".cache/kb_embeddings.npy"  # relativo a la raíz del proyecto
+    RAG_SEMANTIC_MIN_SCORE: float = 0.55
+
+    # RAG - contexto para Gemini: pasajes de la base (de hasta RAG_PASSAGE_MAX_TOKENS
+    # tokens estimados) que se adjuntan a la pregunta, dentro de un presupuesto de tokens
+    RAG_PASSAGE_MAX_TOKENS: int = 120
+    RAG_CONTEXT_TOKEN_BUDGET: int = 600
+    RAG_CONTEXT_MAX_PASSAGES: int = 4
+    RAG_CONTEXT_MIN_CONFIDENCE: float = 0.3
+
+    # Caché de respuestas de /simulador/rag
+    RAG_CACHE_ENABLED: bool = True
+    RAG_CACHE_MAX_ENTRIES: int = 1024
+    RAG_CACHE_TTL_SECONDS: float = 3600.0
+
+    # Caché de /simulador/chat sin sesión (mismo prompt → misma respuesta); apagada por defecto
+    CHAT_CACHE_ENABLED: bool = False
+    CHAT_CACHE_MAX_ENTRIES: int = 1024
+    CHAT_CACHE_TTL_SECONDS: float = 3600.0
+
+    # Segundo nivel persistente de las cachés: "memory" (solo en proceso), "sqlite"
+    # (L1 en memoria + L2 en SQLite, compartida entre workers y reinicios) o "redis"
+    # (L2 en REDIS_URL, compartida entre máquinas; usa CACHE_SQLITE_TTL_SECONDS)
+    CACHE_BACKEND: str = "memory"
+    CACHE_SQLITE_PATH: str = ".cache/answers.sqlite3"  # relativo a la raíz del proyecto
+    CACHE_SQLITE_MAX_ENTRIES: int = 20000
+    CACHE_SQLITE_TTL_SECONDS: float = 7 * 24 * 3600.0
+
+    # Varios workers: WORKERS procesos (python -m api) se reparten GEMINI_MAX_CONCURRENCY y
+    # comparten sesiones de chat y métricas a través de SHARED_STATE_BACKEND: "local" (un
+    # solo proceso), "sqlite" (workers de una máquina) o "redis" (REDIS_URL)
+    WORKERS: int = 1
+    SHARED_STATE_BACKEND: str = "local"
+    SHARED_STATE_SQLITE_PATH: str = ".cache/shared_state.sqlite3"  # relativo a la raíz del proyecto
+    REDIS_URL: Optional[str] = None
+    METRICS_PUBLISH_INTERVAL_SECONDS: float = 5.0
+
+    # Precalentamiento al iniciar: clientes e índices y, opcionalmente, respuestas cacheadas
+    # de las preguntas frecuentes (títulos de la base de conocimiento). /health responde 503
+    # hasta que termina o vence WARMUP_TIMEOUT_SECONDS
+    WARMUP_ENABLED: bool = True
+    WARMUP_PREGENERATE: bool = False
+    WARMUP_CONCURRENCY: int = 4
+    WARMUP_TIMEOUT_SECONDS: float = 120.0
+
+    # Respuestas comprimidas con gzip (si el cliente envía Accept-Encoding: gzip) a partir
+    # de este tamaño en bytes; 0 desactiva la compresión
+    GZIP_MINIMUM_SIZE: int = 1024
+
+    # Perfil de arranque: con STARTUP_PROFILE=true, `python -m api` muestra el tiempo de
+    # importación por módulo antes de levantar el servidor (también `--profile-startup`) y
+    # avisa si supera STARTUP_IMPORT_BUDGET_MS (0 = sin presupuesto)
+    STARTUP_PROFILE: bool = False
+    STARTUP_IMPORT_BUDGET_MS: float = 0.0
+
+    # Trazas por solicitud: una fracción TRACE_SAMPLE_RATE de las solicitudes (y las que envían
+    # X-Trace: 1) mide cada etapa (caché, búsqueda, cola, llamada al modelo, serialización) y
+    # la devuelve en la cabecera Server-Timing y en el logger "api.trace". Toda respuesta lleva
+    # X-Request-ID. LOG_FORMAT: "text" o "json" (un objeto por línea, con request_id)
+    TRACE_SAMPLE_RATE: float = 0.01
+    TRACE_SERVER_TIMING: bool = True
+    LOG_FORMAT: str = "text"
+    LOG_LEVEL: str = "INFO"
+
     # App settings
     APP_NAME: str = "Simulador ChatGPT - Capacitación"
     DEBUG: bool = False
@@ -1,9 +1,72 @@
-﻿from fastapi import FastAPI
+﻿from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from .config.config import settings
+from .middleware import MetricsMiddleware, TracingMiddleware
+from .responses import FastJSONResponse, PrecomputedJSON
 from .routes.simulador_router import router as simulador_router
+from .services.simulador_service import (
+    check_gemini_sdk,
+    configured_model,
+    gemini_key_pool,
+    publish_metrics_periodically,
+    refresh_context_caches,
+    render_metrics,
+    warm_up,
+    watch_knowledge_base,
+)
+from .services.tracing import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_warm_up(app: FastAPI) -> None:
+    """Precalienta el servicio y marca la app como lista (también si falla o vence el plazo)"""
+    try:
+        summary = await asyncio.wait_for(
+            warm_up(settings.WARMUP_PREGENERATE, settings.WARMUP_CONCURRENCY),
+            timeout=settings.WARMUP_TIMEOUT_SECONDS,
+        )
+        app.state.warm_up = summary
+        logger.info("🔥 Precalentamiento completado en %ss: %s", summary["duration_seconds"], summary)
+    except asyncio.TimeoutError:
+        logger.warning("⚠️ El precalentamiento superó %gs; se atiende igual", settings.WARMUP_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.error("❌ Error en el precalentamiento: %s", e)
+    finally:
+        app.state.ready = True
+        app.state.health = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Al iniciar lanza el precalentamiento en segundo plano (/health indica cuándo terminó),
+    si está configurada, la revisión periódica de la base de conocimiento, con estado
+    compartido, la publicación de las métricas del worker y, con contexto cacheado de
+    Gemini, su creación y renovación"""
+    app.state.warm_up = None
+    app.state.ready = not settings.WARMUP_ENABLED
+    app.state.health = None
+    # Con varias claves, un SDK incompatible debe impedir el inicio (importa el SDK en un hilo)
+    await asyncio.to_thread(check_gemini_sdk)
+    tasks = []
+    if settings.WARMUP_ENABLED:
+        tasks.append(asyncio.create_task(_run_warm_up(app)))
+    if settings.KB_WATCH_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(watch_knowledge_base(settings.KB_WATCH_INTERVAL_SECONDS)))
+    if settings.SHARED_STATE_BACKEND != "local":
+        tasks.append(asyncio.create_task(publish_metrics_periodically(settings.METRICS_PUBLISH_INTERVAL_SECONDS)))
+    if settings.LLM_PROVIDER == "gemini" and settings.GEMINI_CONTEXT_CACHE_ENABLED:
+        tasks.append(asyncio.create_task(refresh_context_caches()))
+    yield
+    for task in tasks:
+        if not task.done():
+            task.cancel()
 
 
 def create_app() -> FastAPI:
@@ -11,8 +74,15 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title=settings.APP_NAME,
         description="API para simular ChatGPT y sistema RAG para capacitación",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan,
+        default_response_class=FastJSONResponse,
     )
+    # Sin lifespan (p. ej. transporte ASGI en pruebas) la app se considera lista
+    app.state.ready = True
+    app.state.warm_up = None
+    # Cuerpo de /health ya codificado; se recalcula cuando cambia el estado de precalentamiento
+    app.state.health = None
 
     # Configurar CORS - permite todas las origins para demo/capacitación
     app.add_middleware(
@@ -21,32 +91,62 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Request-ID", "Server-Timing"],
+    )
+
+    # Compresión gzip de las respuestas grandes si el cliente la acepta (no aplica a SSE)
+    if settings.GZIP_MINIMUM_SIZE > 0:
+        app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE)
+
+    # Métricas por ruta (cantidad, latencia, errores, solicitudes en curso)
+    app.add_middleware(MetricsMiddleware)
+
+    # Request ID y trazas por etapa (el más externo: su total incluye a los demás)
+    app.add_middleware(
+        TracingMiddleware, sample_rate=settings.TRACE_SAMPLE_RATE, server_timing=settings.TRACE_SERVER_TIMING
     )
 
     # Incluir routers
     app.include_router(simulador_router)
 
+    welcome = PrecomputedJSON({
+        "message": "Bienvenido al Simulador ChatGPT para Capacitación",
+        "endpoints": {
+            "simulador_chat": "/simulador/chat",
+            "simulador_rag": "/simulador/rag",
+            "metrics": "/metrics",
+            "docs": "/docs"
+        }
+    })
+
     @app.get("/")
-    async def root():
+    async def root(request: Request):
         """Endpoint de bienvenida"""
-        return {
-            "message": "Bienvenido al Simulador ChatGPT para Capacitación",
-            "endpoints": {
-                "simulador_chat": "/simulador/chat",
-                "simulador_rag": "/simulador/rag",
-                "docs": "/docs"
-            }
-        }
+        return welcome.response(request)
 
     @app.get("/health")
-    async def health_check():
-        """Verificar estado del servicio"""
-        return {
-            "status": "healthy",
-            "app_name": settings.APP_NAME,
-            "model": settings.GEMINI_MODEL,
-            "api_configured": settings.GEMINI_API_KEY is not None
-        }
+    async def health_check(request: Request):
+        """Verificar estado del servicio (503 mientras se precalienta)"""
+        if app.state.health is None:
+            ready = app.state.ready
+            app.state.health = PrecomputedJSON(
+                {
+                    "status": "healthy" if ready else "warming_up",
+                    "ready": ready,
+                    "app_name": settings.APP_NAME,
+                    "provider": settings.LLM_PROVIDER,
+                    "model": configured_model(),
+                    "api_configured": bool(gemini_key_pool()) or settings.LLM_PROVIDER != "gemini",
+                    "warm_up": app.state.warm_up,
+                },
+                status_code=200 if ready else 503,
+            )
+        return app.state.health.response(request)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        """Métricas en formato de texto de Prometheus (de todos los workers si hay estado compartido)"""
+        return PlainTextResponse(await render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
     return app
 
@@ -54,8 +154,7 @@ def create_app() -> FastAPI:
 app = create_app()
 
 # Configurar logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-logger.info(f"🚀 Iniciando {settings.APP_NAME}")
-logger.info(f"📝 Modelo configurado: {settings.GEMINI_MODEL}")
-logger.info(f"🔑 API Key configurada: {'Sí' if settings.GEMINI_API_KEY else 'No (modo simulación)'}")
+configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+logger.info("🚀 Iniciando %s", settings.APP_NAME)
+logger.info("📝 Modelo configurado: %s (%s)", configured_model(), settings.LLM_PROVIDER)
+logger.info("🔑 API Keys configuradas: %s", len(gemini_key_pool()) or "No (modo simulación)")
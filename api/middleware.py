@@ -0,0 +1,104 @@
+from time import perf_counter
+import logging
+import random
+
+from .services.metrics import HTTP_ERRORS, HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS
+from .services.tracing import end_trace, new_request_id, start_trace, valid_request_id
+
+trace_logger = logging.getLogger("api.trace")
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que registra cantidad, duración y errores de cada solicitud.
+
+    Se etiqueta por la plantilla de la ruta (p. ej. "/simulador/rag"), no por
+    la URL concreta, para que la cantidad de series no crezca sin límite.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            HTTP_ERRORS.labels(_route_label(scope), type(e).__name__).inc()
+            raise
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = _route_label(scope)
+            HTTP_LATENCY.labels(route).observe(perf_counter() - started)
+            HTTP_REQUESTS.labels(scope["method"], route, status).inc()
+
+
+class TracingMiddleware:
+    """Middleware ASGI que abre la traza de cada solicitud (ver `services.tracing`).
+
+    Toda respuesta lleva `X-Request-ID` (el del cliente si es válido). Una
+    fracción `sample_rate` de las solicitudes, más las que envían `X-Trace: 1`,
+    mide sus etapas: se devuelven en `Server-Timing` (las terminadas antes de
+    enviar las cabeceras) y se registran completas en el logger "api.trace".
+    """
+
+    def __init__(self, app, sample_rate: float = 0.0, server_timing: bool = True):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id, forced = None, False
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+            elif name == b"x-trace":
+                forced = value == b"1"
+        if not valid_request_id(request_id):
+            request_id = new_request_id()
+        sampled = forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        trace, token = start_trace(request_id, sampled)
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [*message.get("headers", ()), (b"x-request-id", request_id.encode("latin-1"))]
+                if sampled and self.server_timing:
+                    headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            if sampled:
+                route = _route_label(scope)
+                details = {"method": scope["method"], "route": route, "status": status, **trace.to_dict()}
+                trace_logger.info(
+                    "%s %s %s %s", scope["method"], route, status, trace.server_timing(), extra={"trace": details}
+                )
+            end_trace(token)
+
+
+def _route_label(scope) -> str:
+    # FastAPI deja la ruta encontrada en el scope; las URLs sin ruta se agrupan
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
@@ -0,0 +1,61 @@
+"""
+Capa de respuestas HTTP: serialización rápida y cuerpos precalculados.
+
+- `FastJSONResponse` serializa con orjson (si está instalado) directamente a
+  bytes, sin pasar por `jsonable_encoder`. Los endpoints que ya arman un
+  diccionario la devuelven tal cual: FastAPI no vuelve a validar ni a
+  codificar el contenido (el `response_model` del endpoint solo documenta).
+- `PrecomputedJSON` guarda un cuerpo fijo ya codificado con su ETag; ante
+  `If-None-Match` coincidente responde 304 sin cuerpo.
+"""
+
+from typing import Any, Optional
+import hashlib
+import json
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+# orjson es opcional: sin él se usa json de la biblioteca estándar
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """JSON en UTF-8 sin escapar caracteres no ASCII (tildes, emojis)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """`JSONResponse` que serializa con `dumps`"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class PrecomputedJSON:
+    """Cuerpo JSON fijo, codificado una sola vez, con ETag para respuestas 304"""
+
+    def __init__(self, content: Any, status_code: int = 200):
+        self.body = dumps(content)
+        self.status_code = status_code
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()[:16]}"'
+
+    def response(self, request: Optional[Request] = None) -> Response:
+        headers = {"ETag": self.etag}
+        if request is not None and self.status_code == 200 and _etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, status_code=self.status_code, media_type="application/json", headers=headers)
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    return "*" in candidates or etag in candidates
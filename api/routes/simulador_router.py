@@ -1,38 +1,199 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional
-from ..services.simulador_service import chat_simulate, rag_answer
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Any, AsyncIterator, Dict, List, Optional
+import hmac
+from ..config.config import settings
+from ..responses import FastJSONResponse, dumps
+from ..services.simulador_service import (
+    chat_simulate,
+    chat_simulate_batch,
+    chat_simulate_stream,
+    clear_chat_session,
+    rag_answer,
+    rag_answer_batch,
+    rag_answer_stream,
+    get_service_stats,
+    reload_knowledge_base,
+)
+from ..services.tracing import span
 
 router = APIRouter(prefix="/simulador", tags=["simulador"])
 
 
 class ChatRequest(BaseModel):
     prompt: str
+    # Opcional: identificador elegido por el cliente (p. ej. un UUID) para mantener el contexto
+    session_id: Optional[str] = Field(None, min_length=8, max_length=64, pattern=r"^[A-Za-z0-9_-]+$")
 
 
 class RagRequest(BaseModel):
     question: str
 
 
-@router.post("/chat")
+class ChatBatchRequest(BaseModel):
+    prompts: List[str]
+
+
+class RagBatchRequest(BaseModel):
+    questions: List[str]
+
+
+# Modelos de respuesta: documentan el esquema en /docs. Los endpoints devuelven
+# `FastJSONResponse` con el diccionario del servicio, así que FastAPI no los
+# vuelve a validar ni a codificar en cada solicitud.
+class ChatResponse(BaseModel):
+    model: str
+    reply: str
+    is_simulated: bool
+    tokens_used: Optional[Dict[str, int]] = None
+    cached: Optional[bool] = None
+    degraded: Optional[bool] = None
+    session_id: Optional[str] = None
+
+
+class RagResponse(BaseModel):
+    answer: str
+    sources: List[Dict[str, Any]]
+    total_results: int
+    source_type: str
+    tokens_used: Optional[Dict[str, int]] = None
+    cached: Optional[bool] = None
+    degraded: Optional[bool] = None
+
+
+class BatchItem(BaseModel):
+    index: int
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchItem]
+    total: int
+    unique: int
+    errors: int
+
+
+@router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(req: ChatRequest):
     """
     Endpoint para simular una conversación con ChatGPT.
     Recibe un prompt y devuelve una respuesta simulada (o real si hay API key configurada).
+    Con `session_id` se mantiene el contexto de la conversación entre mensajes.
     """
-    result = await chat_simulate(req.prompt)
+    result = await chat_simulate(req.prompt, req.session_id)
     if "error" in result:
-        raise HTTPException(status_code=400, detail=result["error"])
-    return result
+        raise HTTPException(status_code=result.get("status_code", 400), detail=result["error"])
+    with span("serialize"):
+        return FastJSONResponse(result)
 
 
-@router.post("/rag")
+@router.post("/rag", response_model=RagResponse)
 async def rag_endpoint(req: RagRequest):
     """
     Endpoint para consultar la base de conocimiento del curso (RAG).
     Responde preguntas sobre IA, ChatGPT, prompting, seguridad y el curso.
     """
     result = await rag_answer(req.question)
+    if "error" in result:
+        raise HTTPException(status_code=result.get("status_code", 400), detail=result["error"])
+    with span("serialize"):
+        return FastJSONResponse(result)
+
+
+@router.post("/chat/batch", response_model=BatchResponse)
+async def chat_batch_endpoint(req: ChatBatchRequest):
+    """
+    Procesa varios prompts de chat en una sola solicitud.
+    Devuelve los resultados en el mismo orden, con errores individuales por elemento.
+    """
+    result = await chat_simulate_batch(req.prompts)
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    with span("serialize"):
+        return FastJSONResponse(result)
+
+
+@router.post("/rag/batch", response_model=BatchResponse)
+async def rag_batch_endpoint(req: RagBatchRequest):
+    """
+    Procesa varias preguntas de RAG en una sola solicitud.
+    Devuelve los resultados en el mismo orden, con errores individuales por elemento.
+    """
+    result = await rag_answer_batch(req.questions)
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
-    return result
+    with span("serialize"):
+        return FastJSONResponse(result)
+
+
+async def _sse_response(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """Convierte los eventos del servicio en una respuesta Server-Sent Events.
+
+    Si el primer evento es un error (validación o servicio saturado) se
+    responde 400/503 en lugar de abrir el stream.
+    """
+    first = await events.__anext__()
+    if first["event"] == "error":
+        raise HTTPException(status_code=first["data"].get("status_code", 400), detail=first["data"]["error"])
+
+    async def encode() -> AsyncIterator[bytes]:
+        yield b"event: %s\ndata: %s\n\n" % (first["event"].encode(), dumps(first["data"]))
+        async for event in events:
+            yield b"event: %s\ndata: %s\n\n" % (event["event"].encode(), dumps(event["data"]))
+
+    return StreamingResponse(
+        encode(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """
+    Igual que /simulador/chat pero envía la respuesta a medida que se genera (SSE).
+    Eventos: "chunk" con cada fragmento de texto y "done" al final con tokens_used.
+    """
+    return await _sse_response(chat_simulate_stream(req.prompt, req.session_id))
+
+
+@router.delete("/chat/sessions/{session_id}")
+async def delete_chat_session_endpoint(session_id: str):
+    """
+    Borra el historial de una sesión de chat (empezar una conversación nueva).
+    """
+    if not await clear_chat_session(session_id):
+        raise HTTPException(status_code=404, detail="La sesión no existe o ya expiró")
+    return {"session_id": session_id, "deleted": True}
+
+
+@router.post("/rag/stream")
+async def rag_stream_endpoint(req: RagRequest):
+    """
+    Igual que /simulador/rag pero envía la respuesta a medida que se genera (SSE).
+    El evento "done" final incluye las fuentes y source_type.
+    """
+    return await _sse_response(rag_answer_stream(req.question))
+
+
+@router.get("/stats")
+async def stats_endpoint():
+    """
+    Estadísticas operativas del simulador: aciertos y fallos de la caché de RAG.
+    """
+    return get_service_stats()
+
+
+@router.post("/admin/kb/reload")
+async def reload_kb_endpoint(x_admin_token: Optional[str] = Header(None)):
+    """
+    Recarga la base de conocimiento desde KB_DIRECTORY (solo los documentos que cambiaron).
+    Requiere el encabezado X-Admin-Token con el valor de ADMIN_TOKEN.
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="La recarga está deshabilitada: configura ADMIN_TOKEN")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token de administración inválido")
+    return await reload_knowledge_base()
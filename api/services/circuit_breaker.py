@@ -0,0 +1,139 @@
+from typing import Dict, Any, Callable
+from collections import deque
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: no se llama al modelo hasta que se recupere"""
+
+
+class CircuitBreaker:
+    """Circuit breaker sobre una ventana de las últimas llamadas al modelo.
+
+    - Cerrado: deja pasar todo y registra cada resultado.
+    - Abierto: rechaza al instante durante `open_seconds`; se abre cuando la
+      tasa de errores o de llamadas lentas supera su umbral (con al menos
+      `min_calls` resultados en la ventana).
+    - Semiabierto: deja pasar hasta `half_open_max_calls` llamadas de prueba;
+      si salen bien se cierra, si alguna falla se vuelve a abrir. Una prueba
+      que no informa su resultado en `probe_timeout` segundos (p. ej. una
+      tarea cancelada que nunca llamó a `record_*`) se da por perdida y libera
+      su lugar, para que el circuito no quede semiabierto para siempre.
+
+    Se usa solo desde el event loop, sin locks.
+    """
+
+    def __init__(
+        self,
+        window_size: int,
+        min_calls: int,
+        error_rate_threshold: float,
+        slow_call_seconds: float,
+        slow_call_rate_threshold: float,
+        open_seconds: float,
+        half_open_max_calls: int = 1,
+        probe_timeout: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.probe_timeout = probe_timeout
+        self._clock = clock
+        # Cada resultado: (falló, fue_lenta)
+        self._window: deque = deque(maxlen=window_size)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._last_probe_at = 0.0
+        self.times_opened = 0
+        self.lost_probes = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Indica si se puede llamar al modelo. Cada `True` debe cerrarse con `record_*`"""
+        if self.state == OPEN:
+            if self._clock() - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._half_open_in_flight = 0
+
+        if self.state == HALF_OPEN:
+            now = self._clock()
+            if self._half_open_in_flight >= self.half_open_max_calls:
+                if now - self._last_probe_at < self.probe_timeout:
+                    self.rejected += 1
+                    return False
+                # Las pruebas en curso no informaron a tiempo: se descartan
+                self.lost_probes += self._half_open_in_flight
+                self._half_open_in_flight = 0
+            self._half_open_in_flight += 1
+            self._last_probe_at = now
+        return True
+
+    def _probe_done(self) -> None:
+        # Una prueba ya descartada por vencida puede informar tarde: el contador no baja de 0
+        self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def record_success(self, duration: float) -> None:
+        slow = duration >= self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            self._probe_done()
+            if slow:
+                self._open()
+            elif self._half_open_in_flight <= 0:
+                self._close()
+            return
+        self._window.append((False, slow))
+        self._evaluate()
+
+    def record_failure(self) -> None:
+        if self.state == HALF_OPEN:
+            self._probe_done()
+            self._open()
+            return
+        self._window.append((True, False))
+        self._evaluate()
+
+    def record_ignored(self) -> None:
+        """La llamada no llegó al modelo (p. ej. cola local llena): no cuenta como resultado"""
+        if self.state == HALF_OPEN:
+            self._probe_done()
+
+    def _evaluate(self) -> None:
+        calls = len(self._window)
+        if self.state != CLOSED or calls < self.min_calls:
+            return
+        failures = sum(1 for failed, _ in self._window if failed)
+        slow_calls = sum(1 for _, slow in self._window if slow)
+        if failures / calls >= self.error_rate_threshold or slow_calls / calls >= self.slow_call_rate_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = self._clock()
+        self.times_opened += 1
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._window.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        calls = len(self._window)
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "error_rate": round(sum(1 for failed, _ in self._window if failed) / calls, 4) if calls else 0.0,
+            "slow_call_rate": round(sum(1 for _, slow in self._window if slow) / calls, 4) if calls else 0.0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "lost_probes": self.lost_probes,
+        }
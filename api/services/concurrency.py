@@ -0,0 +1,80 @@
+from typing import Dict, Any, AsyncIterator, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import time
+
+
+class UpstreamBusyError(Exception):
+    """Se superó el tiempo de espera en la cola del limitador de concurrencia"""
+
+
+class UpstreamTimeoutError(Exception):
+    """El modelo no respondió dentro del plazo configurado para la llamada"""
+
+
+class ConcurrencyLimiter:
+    """Limita las llamadas simultáneas al modelo con un semáforo global.
+
+    Las solicitudes que no consiguen lugar dentro de `queue_timeout` segundos
+    fallan con `UpstreamBusyError` en lugar de quedar encoladas sin límite.
+    Lleva contadores de profundidad de cola y tiempo de espera.
+    """
+
+    def __init__(self, max_concurrency: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Reserva un lugar para una llamada al modelo mientras dure el bloque `async with`"""
+        # El semáforo se crea dentro del event loop que lo va a usar
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if self._semaphore.locked():
+            started = time.perf_counter()
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise UpstreamBusyError(
+                    f"El servicio está ocupado ({self.in_flight} consultas en curso). Intenta nuevamente en unos segundos."
+                )
+            finally:
+                self.waiting -= 1
+                waited = time.perf_counter() - started
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        else:
+            await self._semaphore.acquire()
+
+        self.acquired += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_timeout_seconds": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "wait_seconds_total": round(self.wait_seconds_total, 4),
+            "wait_seconds_max": round(self.wait_seconds_max, 4),
+        }
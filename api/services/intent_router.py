@@ -0,0 +1,194 @@
+"""
+Clasificador local de intención para /simulador/rag, previo a llamar al modelo.
+
+Decide entre tres caminos:
+- "instant": saludos y agradecimientos, con una respuesta fija.
+- "off_topic": preguntas ajenas al curso (o texto sin sentido), con una
+  invitación a volver a los temas del curso.
+- "llm": todo lo demás sigue hacia Gemini.
+
+Primero se prueban reglas exactas (confianza 1): solo ellas responden al
+instante, cuando el mensaje es nada más que un saludo o un agradecimiento. Si
+ninguna aplica, decide un modelo lineal (regresión logística multiclase) sobre rasgos con hashing:
+palabras, pares de palabras y trigramas de caracteres. Se entrena al iniciar
+desde un archivo JSONL con líneas `{"text": ..., "label": ...}`, en una
+fracción de segundo y sin dependencias. Ante la duda (confianza menor al umbral) la
+pregunta va al modelo: equivocarse hacia "llm" solo cuesta una llamada. Una
+predicción de saludo o agradecimiento también sigue hacia el modelo, porque
+el mensaje puede traer una pregunta ("gracias, ¿y cómo me registro?").
+"""
+
+from typing import Dict, Any, Iterable, List, NamedTuple, Optional, Tuple
+from collections import Counter
+import json
+import logging
+import math
+import random
+import re
+import zlib
+
+from .text_processing import normalize_text
+from .trigram_index import trigrams
+
+logger = logging.getLogger(__name__)
+
+INTENT_OUTCOMES = {
+    "greeting": "instant",
+    "thanks": "instant",
+    "off_topic": "off_topic",
+    "course": "llm",
+}
+
+# Un saludo o agradecimiento "puro" solo contiene estas palabras (y al menos una central)
+_GREETING_CORE = frozenset("hola holaa holi buenas buenos buen saludos hey".split())
+_GREETING_WORDS = _GREETING_CORE | frozenset(
+    "dia dias tardes noches que tal como estas esta usted le va profe profesor profesora instructor a todos muy cordiales de nuevo".split()
+)
+# Agradecimientos y despedidas
+_THANKS_CORE = frozenset("gracias agradezco agradecida agradecido chau adios hasta".split())
+_THANKS_WORDS = _THANKS_CORE | frozenset(
+    "muchas muchisimas mil te le lo profe por todo la ayuda ok vale listo perfecto genial excelente muy bien entendido "
+    "luego manana pronto nos vemos".split()
+)
+_GIBBERISH_RE = re.compile(r"^(?=.*[a-z])(?=.*[0-9])[a-z0-9]{6,}$|^[^aeiou0-9]{4,}$")
+
+
+class RouteDecision(NamedTuple):
+    intent: str
+    outcome: str
+    confidence: float
+    # "rule" o "model"
+    source: str
+
+
+def _rule(words: List[str]) -> Optional[str]:
+    if not words or all(_GIBBERISH_RE.match(word) for word in words):
+        return "off_topic"
+    word_set = set(words)
+    if word_set <= _GREETING_WORDS and word_set & _GREETING_CORE:
+        return "greeting"
+    if word_set <= _THANKS_WORDS and word_set & _THANKS_CORE:
+        return "thanks"
+    return None
+
+
+def features(text: str, dims: int) -> List[int]:
+    """Índices (con hashing) de los rasgos del texto: palabras, pares de palabras y trigramas"""
+    words = normalize_text(text).split()
+    raw = [f"w:{word}" for word in words]
+    raw.extend(f"b:{first} {second}" for first, second in zip(words, words[1:]))
+    raw.extend(f"t:{gram}" for gram in trigrams(text))
+    return sorted({zlib.crc32(feature.encode("utf-8")) % dims for feature in raw})
+
+
+class LinearIntentModel:
+    """Regresión logística multiclase sobre rasgos con hashing (pesos en diccionarios dispersos)"""
+
+    def __init__(self, labels: Iterable[str], dims: int = 1 << 18):
+        self.labels = sorted(labels)
+        self.dims = dims
+        self._weights: Dict[str, Dict[int, float]] = {label: {} for label in self.labels}
+        self._bias: Dict[str, float] = {label: 0.0 for label in self.labels}
+
+    def train(self, examples: List[Tuple[str, str]], epochs: int = 15, learning_rate: float = 0.5, l2: float = 1e-4, seed: int = 0) -> None:
+        """Descenso por gradiente estocástico sobre la entropía cruzada"""
+        rng = random.Random(seed)
+        data = [(features(text, self.dims), label) for text, label in examples]
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch * 0.1)
+            for feature_ids, label in data:
+                probabilities = self._probabilities(feature_ids)
+                scale = 1.0 / math.sqrt(len(feature_ids)) if feature_ids else 0.0
+                for candidate in self.labels:
+                    gradient = probabilities[candidate] - (1.0 if candidate == label else 0.0)
+                    weights = self._weights[candidate]
+                    for feature_id in feature_ids:
+                        old = weights.get(feature_id, 0.0)
+                        weights[feature_id] = old - rate * (gradient * scale + l2 * old)
+                    self._bias[candidate] -= rate * gradient
+
+    def _probabilities(self, feature_ids: List[int]) -> Dict[str, float]:
+        scale = 1.0 / math.sqrt(len(feature_ids)) if feature_ids else 0.0
+        scores = {}
+        for label in self.labels:
+            weights = self._weights[label]
+            scores[label] = self._bias[label] + scale * sum(weights.get(feature_id, 0.0) for feature_id in feature_ids)
+        top = max(scores.values())
+        exps = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exps.values())
+        return {label: value / total for label, value in exps.items()}
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        probabilities = self._probabilities(features(text, self.dims))
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+
+def load_examples(path: str) -> List[Tuple[str, str]]:
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                text, label = str(item["text"]), str(item["label"])
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning("⚠️ Ejemplo %s inválido en %s: %s", number, path, e)
+                continue
+            if label not in INTENT_OUTCOMES:
+                logger.warning("⚠️ Ejemplo %s con etiqueta desconocida en %s: %s", number, path, label)
+                continue
+            examples.append((text, label))
+    return examples
+
+
+class IntentRouter:
+    """Reglas + modelo lineal. Sin modelo (archivo ausente) solo aplican las reglas."""
+
+    def __init__(self, model: Optional[LinearIntentModel] = None, min_confidence: float = 0.85):
+        self.model = model
+        self.min_confidence = min_confidence
+        self.examples = 0
+        # Decisiones por "intención:camino"; los caminos distintos de "llm" son llamadas evitadas
+        self.decisions: Counter = Counter()
+
+    @classmethod
+    def from_file(cls, path: str, min_confidence: float = 0.85) -> "IntentRouter":
+        examples = load_examples(path)
+        if not examples:
+            return cls(None, min_confidence)
+        model = LinearIntentModel(INTENT_OUTCOMES)
+        model.train(examples)
+        router = cls(model, min_confidence)
+        router.examples = len(examples)
+        return router
+
+    def route(self, text: str) -> RouteDecision:
+        decision = self._decide(text)
+        self.decisions[f"{decision.intent}:{decision.outcome}"] += 1
+        return decision
+
+    def _decide(self, text: str) -> RouteDecision:
+        intent = _rule(normalize_text(text).split())
+        if intent is not None:
+            return RouteDecision(intent, INTENT_OUTCOMES[intent], 1.0, "rule")
+        if self.model is None:
+            return RouteDecision("course", "llm", 0.0, "rule")
+
+        intent, confidence = self.model.predict(text)
+        # Solo las reglas responden al instante; el modelo únicamente puede descartar preguntas ajenas
+        outcome = "off_topic" if intent == "off_topic" and confidence >= self.min_confidence else "llm"
+        return RouteDecision(intent, outcome, round(confidence, 4), "model")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model is not None,
+            "examples": self.examples,
+            "min_confidence": self.min_confidence,
+            "decisions": dict(self.decisions),
+            "upstream_calls_avoided": sum(
+                count for key, count in self.decisions.items() if not key.endswith(":llm")
+            ),
+        }
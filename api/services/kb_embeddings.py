@@ -0,0 +1,269 @@
+from typing import Dict, Any, Callable, List, Optional
+import hashlib
+import json
+import logging
+import os
+import zlib
+
+from .kb_search import SearchHit
+from .text_processing import fold_accents, tokenize
+
+# NumPy es necesario solo para el modo de búsqueda semántica
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Función de embeddings: recibe textos y devuelve una matriz float32 (n_textos x dimensión)
+Embedder = Callable[[List[str]], "np.ndarray"]
+
+
+def hashing_embedder(texts: List[str], dim: int = 512) -> "np.ndarray":
+    """Embedder local y determinista basado en el truco de hashing.
+
+    Combina términos normalizados y trigramas de caracteres, así que tolera
+    variaciones de escritura sin depender de la red. Pensado para pruebas y
+    para funcionar sin API key; no captura sinónimos reales.
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        features = tokenize(text)
+        for term in features[:]:
+            padded = f" {term} "
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        for feature in features:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if digest & 1 else -1.0
+            matrix[row, (digest >> 1) % dim] += sign
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def make_gemini_embedder(model_name: str, task_type: str) -> Embedder:
+    """Crea un embedder que usa la API de embeddings de Gemini"""
+    import google.generativeai as genai
+
+    def embed(texts: List[str]) -> "np.ndarray":
+        result = genai.embed_content(model=model_name, content=texts, task_type=task_type)
+        matrix = np.asarray(result["embedding"], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    return embed
+
+
+def chunk_documents(documents: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Divide cada documento en fragmentos por párrafo, anteponiendo el título"""
+    chunks = []
+    for doc in documents:
+        paragraphs = [p.strip() for p in doc["content"].split("\n\n") if p.strip()]
+        for position, paragraph in enumerate(paragraphs):
+            chunks.append({
+                "id": f"{doc['id']}#{position}",
+                "doc_id": doc["id"],
+                "text": f"{doc['title']}\n{paragraph}",
+            })
+    return chunks
+
+
+class EmbeddingIndex:
+    """Matriz contigua de embeddings (float32) de los fragmentos de la base de conocimiento.
+
+    La búsqueda es un único producto matriz-vector seguido de `argpartition`
+    para quedarse con los k mejores sin ordenar toda la matriz.
+    """
+
+    def __init__(
+        self,
+        documents: List[Dict[str, str]],
+        chunks: List[Dict[str, str]],
+        matrix: "np.ndarray",
+        query_embedder: Embedder,
+        embedder_name: str = "",
+        chunk_hashes: Optional[List[str]] = None,
+    ):
+        self.chunks = chunks
+        self.matrix = matrix
+        self.query_embedder = query_embedder
+        self.embedder_name = embedder_name
+        self.chunk_hashes = chunk_hashes or [_chunk_hash(chunk) for chunk in chunks]
+        # Fragmentos calculados al construir (0 si se cargó o reutilizó todo)
+        self.embedded_chunks = 0
+        self._documents_by_id = {doc["id"]: doc for doc in documents}
+
+    @classmethod
+    def load_or_build(
+        cls,
+        documents: List[Dict[str, str]],
+        embedder: Embedder,
+        embedder_name: str,
+        path: Optional[str] = None,
+        query_embedder: Optional[Embedder] = None,
+        previous: Optional["EmbeddingIndex"] = None,
+    ) -> "EmbeddingIndex":
+        """Carga el índice persistido (memory-mapped) o lo calcula y lo guarda.
+
+        El archivo `.npy` se abre con `mmap_mode="r"`, así varios workers
+        comparten las mismas páginas en memoria. Un archivo `.json` al lado
+        guarda la huella del contenido y del embedder: si la base de
+        conocimiento cambió, el índice se recalcula. Al recalcular solo se
+        piden embeddings de los fragmentos nuevos o modificados; el resto se
+        copia de `previous` (el índice en uso) o del archivo anterior.
+        """
+        chunks = chunk_documents(documents)
+        hashes = [_chunk_hash(chunk) for chunk in chunks]
+        fingerprint = _fingerprint(chunks, hashes, embedder_name)
+        query_embedder = query_embedder or embedder
+
+        if path:
+            matrix = _load_matrix(path, fingerprint, len(chunks))
+            if matrix is not None:
+                logger.info("📦 Índice de embeddings cargado desde %s", path)
+                return cls(documents, chunks, matrix, query_embedder, embedder_name, hashes)
+
+        if previous is not None and previous.embedder_name == embedder_name:
+            known = dict(zip(previous.chunk_hashes, previous.matrix))
+        else:
+            known = _load_previous_rows(path, embedder_name) if path else {}
+        missing = [position for position, chunk_hash in enumerate(hashes) if chunk_hash not in known]
+
+        new_rows = embedder([chunks[position]["text"] for position in missing]) if missing else None
+        if new_rows is not None:
+            dim = new_rows.shape[1]
+        else:
+            dim = len(next(iter(known.values()))) if known else 0
+        matrix = np.empty((len(chunks), dim), dtype=np.float32)
+        for position, chunk_hash in enumerate(hashes):
+            if chunk_hash in known:
+                matrix[position] = known[chunk_hash]
+        if missing:
+            matrix[missing] = new_rows
+        logger.info("🧮 Embeddings: %s fragmentos calculados, %s reutilizados", len(missing), len(chunks) - len(missing))
+
+        if path:
+            try:
+                _save_matrix(path, matrix, fingerprint, chunks, hashes, embedder_name)
+                matrix = np.load(path, mmap_mode="r")
+                logger.info("💾 Índice de embeddings guardado en %s", path)
+            except OSError as e:
+                logger.warning("No se pudo guardar el índice de embeddings en %s: %s", path, e)
+        index = cls(documents, chunks, matrix, query_embedder, embedder_name, hashes)
+        index.embedded_chunks = len(missing)
+        return index
+
+    def search(self, query: str, limit: int = 3) -> List[SearchHit]:
+        """Devuelve los documentos más similares a la pregunta.
+
+        Cada documento se puntúa con la similitud coseno de su mejor fragmento.
+        """
+        if not query.strip() or len(self.chunks) == 0:
+            return []
+
+        query_vector = self.query_embedder([query])[0]
+        scores = self.matrix @ query_vector
+
+        # Se piden más fragmentos que documentos porque varios pueden ser del mismo documento
+        top_k = min(len(scores), limit * 4)
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        hits: List[SearchHit] = []
+        seen = set()
+        for chunk_idx in candidates:
+            doc_id = self.chunks[chunk_idx]["doc_id"]
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            score = float(scores[chunk_idx])
+            hits.append(SearchHit(self._documents_by_id[doc_id], score, score))
+            if len(hits) == limit:
+                break
+        return hits
+
+
+def _chunk_hash(chunk: Dict[str, str]) -> str:
+    """Huella del texto de un fragmento: si no cambia, su embedding se reutiliza"""
+    return hashlib.sha1(fold_accents(chunk["text"]).encode("utf-8")).hexdigest()
+
+
+def _fingerprint(chunks: List[Dict[str, str]], hashes: List[str], embedder_name: str) -> str:
+    digest = hashlib.sha256(embedder_name.encode("utf-8"))
+    for chunk, chunk_hash in zip(chunks, hashes):
+        digest.update(chunk["id"].encode("utf-8"))
+        digest.update(chunk_hash.encode("ascii"))
+    return digest.hexdigest()
+
+
+def _meta_path(path: str) -> str:
+    return f"{path}.meta.json"
+
+
+def _load_matrix(path: str, fingerprint: str, expected_rows: int) -> Optional["np.ndarray"]:
+    try:
+        with open(_meta_path(path), encoding="utf-8") as f:
+            meta: Dict[str, Any] = json.load(f)
+        if meta.get("fingerprint") != fingerprint:
+            logger.info("La base de conocimiento cambió; se recalcula el índice de embeddings")
+            return None
+        matrix = np.load(path, mmap_mode="r")
+    except (OSError, ValueError) as e:
+        logger.info("No hay índice de embeddings utilizable en %s: %s", path, e)
+        return None
+
+    if matrix.dtype != np.float32 or matrix.ndim != 2 or matrix.shape[0] != expected_rows:
+        return None
+    return matrix
+
+
+def _load_previous_rows(path: str, embedder_name: str) -> Dict[str, "np.ndarray"]:
+    """Embeddings del archivo anterior por huella de fragmento (vacío si no sirve)"""
+    try:
+        with open(_meta_path(path), encoding="utf-8") as f:
+            meta: Dict[str, Any] = json.load(f)
+        hashes = meta.get("chunk_hashes")
+        if meta.get("embedder") != embedder_name or not hashes:
+            return {}
+        matrix = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return {}
+    if matrix.dtype != np.float32 or matrix.ndim != 2 or matrix.shape[0] != len(hashes):
+        return {}
+    return dict(zip(hashes, matrix))
+
+
+def _save_matrix(
+    path: str,
+    matrix: "np.ndarray",
+    fingerprint: str,
+    chunks: List[Dict[str, str]],
+    hashes: List[str],
+    embedder_name: str,
+) -> None:
+    """Escribe el índice en archivos temporales y los reemplaza de forma atómica"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_matrix = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_matrix, "wb") as f:
+        np.save(f, matrix)
+    tmp_meta = f"{_meta_path(path)}.{os.getpid()}.tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump({
+            "fingerprint": fingerprint,
+            "embedder": embedder_name,
+            "chunk_ids": [c["id"] for c in chunks],
+            "chunk_hashes": hashes,
+        }, f)
+
+    os.replace(tmp_matrix, path)
+    os.replace(tmp_meta, _meta_path(path))
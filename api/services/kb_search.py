@@ -0,0 +1,171 @@
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+from collections import Counter
+import math
+
+from .text_processing import tokenize
+
+# Peso de cada campo del documento al construir el índice (BM25F simplificado)
+FIELD_WEIGHTS: Dict[str, int] = {
+    "title": 3,
+    "category": 2,
+    "keywords": 2,
+    "content": 1,
+}
+
+
+class SearchHit(NamedTuple):
+    document: Dict[str, str]
+    score: float
+    confidence: float
+
+
+class AnalyzedDocument(NamedTuple):
+    """Términos de un documento ya tokenizados; se reutiliza al reindexar si el documento no cambió"""
+    term_freqs: Dict[str, int]
+    title_terms: frozenset
+    heading_terms: frozenset
+
+
+def analyze_document(doc: Dict[str, str]) -> AnalyzedDocument:
+    term_freqs: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(doc.get(field, "")):
+            term_freqs[term] += weight
+    return AnalyzedDocument(
+        dict(term_freqs),
+        frozenset(tokenize(doc.get("title", ""))),
+        frozenset(tokenize(f"{doc.get('title', '')} {doc.get('category', '')} {doc.get('keywords', '')}")),
+    )
+
+
+class BM25Index:
+    """Índice invertido BM25 en memoria sobre los documentos de la base de conocimiento.
+
+    Se construye una sola vez; cada búsqueda solo recorre las listas de
+    postings de los términos de la pregunta. `analyzed` permite pasar los
+    documentos ya tokenizados (solo se tokenizan los que cambiaron).
+    """
+
+    def __init__(
+        self,
+        documents: List[Dict[str, str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        analyzed: Optional[List[AnalyzedDocument]] = None,
+    ):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._doc_lengths: List[int] = []
+        self._title_terms: List[frozenset] = []
+        self._heading_terms: List[frozenset] = []
+
+        if analyzed is None:
+            analyzed = [analyze_document(doc) for doc in documents]
+
+        for doc_idx, (term_freqs, title_terms, heading_terms) in enumerate(analyzed):
+            self._doc_lengths.append(sum(term_freqs.values()))
+            self._title_terms.append(title_terms)
+            self._heading_terms.append(heading_terms)
+            for term, freq in term_freqs.items():
+                self._postings.setdefault(term, []).append((doc_idx, freq))
+
+        total_docs = len(documents)
+        self._avg_length = (sum(self._doc_lengths) / total_docs) if total_docs else 0.0
+        self._idf: Dict[str, float] = {
+            term: math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+        self._unseen_idf = math.log(1 + (total_docs + 0.5) / 0.5)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._postings
+
+    def vocabulary(self) -> List[str]:
+        """Términos indexados (ya normalizados)"""
+        return list(self._postings)
+
+    def search(self, query: str, limit: int = 3) -> List[SearchHit]:
+        """Devuelve hasta `limit` documentos ordenados por puntaje.
+
+        El puntaje es BM25 más la cobertura del título: una pregunta que contiene
+        todos los términos del título ("qué es chatgpt") gana aunque esos términos
+        sean frecuentes en toda la base. Cada resultado incluye además una confianza entre 0 y 1: la fracción
+        (ponderada por IDF) de los términos de la pregunta que aparecen en el
+        documento. Si ningún término coincide con el título o la categoría, la
+        confianza se reduce a la mitad, para no responder "receta de pasta"
+        con un documento que solo la menciona como ejemplo.
+        """
+        return self.search_terms(tokenize(query), limit)
+
+    def search_terms(self, terms: List[str], limit: int = 3) -> List[SearchHit]:
+        """Como `search`, con los términos ya tokenizados (p. ej. una pregunta corregida)"""
+        query_terms = set(terms)
+        if not query_terms or not self.documents:
+            return []
+
+        scores: Dict[int, float] = {}
+        matched_idf: Dict[int, float] = {}
+        for term in query_terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_idx, freq in self._postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_idx] / self._avg_length)
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+                matched_idf[doc_idx] = matched_idf.get(doc_idx, 0.0) + idf
+
+        for doc_idx in scores:
+            title_terms = self._title_terms[doc_idx]
+            if title_terms:
+                scores[doc_idx] += len(title_terms & query_terms) / len(title_terms)
+
+        # Los términos desconocidos pesan como el término más raro posible
+        total_idf = sum(self._idf.get(term, self._unseen_idf) for term in query_terms)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        hits = []
+        for doc_idx, score in ranked:
+            confidence = matched_idf[doc_idx] / total_idf
+            if not self._heading_terms[doc_idx] & query_terms:
+                confidence *= 0.5
+            hits.append(SearchHit(self.documents[doc_idx], score, confidence))
+        return hits
+
+
+def select_kb_hits(hits: List[SearchHit], min_confidence: float, relative_score: float = 0.75) -> List[SearchHit]:
+    """Filtra los resultados que alcanzan para responder sin consultar al modelo.
+
+    Solo se aceptan documentos con confianza suficiente y cuyo puntaje esté
+    cerca del mejor, para no mezclar el documento preciso con otros que
+    apenas comparten una palabra.
+    """
+    if not hits:
+        return []
+    best_score = hits[0].score
+    return [
+        hit for hit in hits
+        if hit.confidence >= min_confidence and hit.score >= best_score * relative_score
+    ]
+
+
+def format_kb_answer(results: List[SearchHit]) -> Dict[str, Any]:
+    """Arma la respuesta de /simulador/rag a partir de documentos de la base de conocimiento"""
+    sections = []
+    sources = []
+    for position, (doc, _score, confidence) in enumerate(results, start=1):
+        sections.append(f"{position}. {doc['title']}\n{doc['content']}")
+        sources.append({
+            "id": doc["id"],
+            "title": doc["title"],
+            "category": doc["category"],
+            "score": round(confidence, 3),
+        })
+
+    return {
+        "answer": "\n\n".join(sections),
+        "sources": sources,
+        "total_results": len(results),
+        "source_type": "knowledge_base",
+    }
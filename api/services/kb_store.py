@@ -0,0 +1,264 @@
+"""
+Base de conocimiento cargada desde un directorio de archivos.
+
+- `*.md`: un documento por archivo, con encabezado `---` de líneas `clave: valor`
+  (`id`, `title`, `category` y, opcional, `keywords` separadas por comas); el
+  resto del archivo es el contenido. Sin `id` se usa el nombre del archivo y
+  sin `title` el primer encabezado `# `.
+- `*.jsonl`: un documento por línea con `id`, `title`, `category`, `content` y
+  `keywords` opcional.
+
+Cada recarga produce un `KnowledgeBase` nuevo e inmutable: solo se vuelven a
+leer los archivos modificados y a tokenizar los documentos que cambiaron.
+Además del índice por documento se indexan sus pasajes, que son los que se
+envían al modelo como contexto, y su vocabulario en un índice de trigramas
+para corregir errores de tipeo de las preguntas antes de volver a buscar.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import time
+
+from .kb_search import AnalyzedDocument, BM25Index, analyze_document
+from .text_processing import tokenize
+from .passages import Passage, passage_document, split_passages
+from .trigram_index import TrigramIndex
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ("id", "title", "category", "content")
+
+# Firma de un archivo: (mtime en ns, tamaño)
+FileSignature = Tuple[int, int]
+
+# Pasajes de un documento con su análisis, por huella del documento
+PassageEntry = Tuple[str, List[Tuple[Passage, AnalyzedDocument]]]
+
+
+def directory_signature(directory: str) -> Dict[str, FileSignature]:
+    """Firma de los archivos de la base: barata de calcular, sirve para detectar cambios"""
+    signature: Dict[str, FileSignature] = {}
+    try:
+        entries = list(os.scandir(directory))
+    except OSError as e:
+        logger.error("❌ No se pudo leer el directorio de la base de conocimiento %s: %s", directory, e)
+        return signature
+    for entry in entries:
+        if entry.is_file() and entry.name.endswith((".md", ".jsonl")):
+            stat = entry.stat()
+            signature[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return signature
+
+
+def parse_markdown(text: str, fallback_id: str) -> Dict[str, str]:
+    doc: Dict[str, str] = {"id": fallback_id}
+    body = text.lstrip("\ufeff")
+    if body.startswith("---"):
+        header, _, rest = body[3:].partition("\n---")
+        for line in header.splitlines():
+            key, separator, value = line.partition(":")
+            if separator and key.strip():
+                doc[key.strip()] = value.strip()
+        body = rest
+    body = body.strip()
+    if "title" not in doc and body.startswith("# "):
+        title_line, _, body = body.partition("\n")
+        doc["title"] = title_line[2:].strip()
+        body = body.strip()
+    doc.setdefault("category", "general")
+    doc["content"] = body
+    return doc
+
+
+def parse_jsonl(text: str) -> List[Dict[str, str]]:
+    documents = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            doc = json.loads(line)
+        except ValueError as e:
+            logger.warning("⚠️ Línea %s inválida en la base de conocimiento: %s", number, e)
+            continue
+        if isinstance(doc, dict):
+            documents.append({key: str(value) for key, value in doc.items()})
+    return documents
+
+
+def _read_file(path: str) -> List[Dict[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".jsonl"):
+        return parse_jsonl(text)
+    return [parse_markdown(text, os.path.splitext(os.path.basename(path))[0])]
+
+
+def document_hash(doc: Dict[str, str]) -> str:
+    raw = "\x1f".join(doc.get(field, "") for field in REQUIRED_FIELDS + ("keywords",))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _analyze_passages(doc: Dict[str, str], digest: str, max_tokens: int) -> PassageEntry:
+    return digest, [
+        (passage, analyze_document(passage_document(passage)))
+        for passage in split_passages(doc, max_tokens)
+    ]
+
+
+class KnowledgeBase:
+    """Foto inmutable de la base de conocimiento con sus índices BM25 (documentos y pasajes).
+
+    Se reemplaza completa al recargar (una asignación), así las búsquedas en
+    curso siguen usando la foto anterior sin bloquearse. `embedding_index` se
+    completa aparte, solo si la búsqueda semántica lo necesita.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        documents: List[Dict[str, str]],
+        files: Dict[str, Tuple[FileSignature, List[Dict[str, str]]]],
+        analyzed: Dict[str, Tuple[str, AnalyzedDocument]],
+        passages: Optional[Dict[str, PassageEntry]] = None,
+        passage_max_tokens: int = 120,
+        unreadable: Optional[Dict[str, FileSignature]] = None,
+    ):
+        self.directory = directory
+        self.documents = documents
+        self._files = files
+        self._analyzed = analyzed
+        # Los archivos que no se pudieron leer también entran en la firma: así el
+        # watcher no recarga en cada revisión, sino cuando el archivo vuelve a cambiar
+        self.unreadable = unreadable or {}
+        self.signature = {**self.unreadable, **{name: signature for name, (signature, _) in files.items()}}
+        self.index = BM25Index(documents, analyzed=[analyzed[doc["id"]][1] for doc in documents])
+
+        if passages is None:
+            passages = {doc["id"]: _analyze_passages(doc, analyzed[doc["id"]][0], passage_max_tokens) for doc in documents}
+        self._passages = passages
+        self.passage_max_tokens = passage_max_tokens
+        entries = [entry for doc in documents for entry in passages[doc["id"]][1]]
+        self.passages: Dict[str, Passage] = {passage.id: passage for passage, _ in entries}
+        self.passage_index = BM25Index(
+            [passage_document(passage) for passage, _ in entries],
+            analyzed=[analysis for _, analysis in entries],
+        )
+        self.term_index = TrigramIndex((term, term) for term in self.index.vocabulary())
+        version = hashlib.sha1()
+        for doc in documents:
+            version.update(analyzed[doc["id"]][0].encode("ascii"))
+        self.version = version.hexdigest()[:12]
+        self.loaded_at = time.time()
+        self.embedding_index = None
+        self.embedding_index_failed = False
+
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        previous: Optional["KnowledgeBase"] = None,
+        passage_max_tokens: int = 120,
+    ) -> Tuple["KnowledgeBase", Dict[str, Any]]:
+        """Lee el directorio reutilizando de `previous` lo que no cambió.
+
+        Devuelve la base nueva y un resumen de cambios por documento.
+        """
+        started = time.perf_counter()
+        previous_files = previous._files if previous else {}
+        previous_analyzed = previous._analyzed if previous else {}
+        reuse_passages = previous is not None and previous.passage_max_tokens == passage_max_tokens
+        previous_passages = previous._passages if reuse_passages else {}
+
+        files: Dict[str, Tuple[FileSignature, List[Dict[str, str]]]] = {}
+        unreadable: Dict[str, FileSignature] = {}
+        for name, signature in sorted(directory_signature(directory).items()):
+            cached = previous_files.get(name)
+            if cached is not None and cached[0] == signature:
+                files[name] = cached
+                continue
+            try:
+                files[name] = (signature, _read_file(os.path.join(directory, name)))
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning("⚠️ No se pudo leer %s: %s", name, e)
+                unreadable[name] = signature
+
+        documents: List[Dict[str, str]] = []
+        analyzed: Dict[str, Tuple[str, AnalyzedDocument]] = {}
+        passages: Dict[str, PassageEntry] = {}
+        changes = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "invalid": 0}
+        for name, (_, file_documents) in files.items():
+            for doc in file_documents:
+                missing = [field for field in REQUIRED_FIELDS if not doc.get(field)]
+                if missing or doc["id"] in analyzed:
+                    reason = f"faltan {', '.join(missing)}" if missing else "id duplicado"
+                    logger.warning("⚠️ Documento ignorado en %s (%s): %s", name, doc.get("id"), reason)
+                    changes["invalid"] += 1
+                    continue
+                digest = document_hash(doc)
+                old = previous_analyzed.get(doc["id"])
+                if old is not None and old[0] == digest:
+                    analyzed[doc["id"]] = old
+                    changes["unchanged"] += 1
+                else:
+                    analyzed[doc["id"]] = (digest, analyze_document(doc))
+                    changes["updated" if old is not None else "added"] += 1
+                old_passages = previous_passages.get(doc["id"])
+                if old_passages is not None and old_passages[0] == digest:
+                    passages[doc["id"]] = old_passages
+                else:
+                    passages[doc["id"]] = _analyze_passages(doc, digest, passage_max_tokens)
+                documents.append(doc)
+        changes["removed"] = len(set(previous_analyzed) - set(analyzed))
+
+        knowledge_base = cls(directory, documents, files, analyzed, passages, passage_max_tokens, unreadable)
+        changes["unreadable"] = len(unreadable)
+        changes["documents"] = len(documents)
+        changes["passages"] = len(knowledge_base.passages)
+        changes["version"] = knowledge_base.version
+        changes["duration_seconds"] = round(time.perf_counter() - started, 4)
+        return knowledge_base, changes
+
+    def correct_terms(self, question: str, min_similarity: float = 0.5) -> Optional[List[str]]:
+        """Términos de la pregunta con los errores de tipeo corregidos, o None si no hay nada que corregir.
+
+        Solo se tocan las palabras que no están en el vocabulario de la base:
+        dos palabras seguidas que juntas forman un término ("chat gpt") se
+        unen, y las demás de 4 letras o más se reemplazan por el término más
+        parecido por trigramas ("contrasenias" → "contrasena"). Las palabras sin
+        un término parecido quedan como están, así la búsqueda posterior
+        mantiene su umbral de confianza sobre toda la pregunta.
+        """
+        terms = tokenize(question)
+        corrected: List[str] = []
+        changed = False
+        position = 0
+        while position < len(terms):
+            term = terms[position]
+            if position + 1 < len(terms) and term + terms[position + 1] in self.index:
+                corrected.append(term + terms[position + 1])
+                changed = True
+                position += 2
+                continue
+            position += 1
+            if term not in self.index and len(term) >= 4:
+                matches = self.term_index.search(term, limit=1, min_similarity=min_similarity)
+                if matches:
+                    term = matches[0][0]
+                    changed = True
+            corrected.append(term)
+        return corrected if changed else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "documents": len(self.documents),
+            "passages": len(self.passages),
+            "files": len(self.signature),
+            "unreadable_files": sorted(self.unreadable),
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "embedding_index": self.embedding_index is not None,
+        }
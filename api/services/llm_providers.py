@@ -0,0 +1,420 @@
+"""
+Proveedores de modelos de lenguaje con una interfaz común.
+
+Cada proveedor corresponde a un modo (una instrucción de sistema) y ofrece:
+- `generate(prompt)`: respuesta completa como `Generation`.
+- `stream(prompt)`: fragmentos `Generation` a medida que llegan; el último
+  trae el uso de tokens si el proveedor lo informa.
+- `count_tokens(text)`: tokens del texto según el proveedor (o estimados).
+
+Implementaciones:
+- `GeminiProvider`: envuelve un `genai.GenerativeModel` (o un objeto con la
+  misma interfaz), con la API asíncrona del SDK o un pool de hilos.
+- `OpenAICompatibleProvider`: `/chat/completions` de cualquier servidor
+  compatible con OpenAI (vLLM, llama.cpp, Ollama, LM Studio...) vía httpx.
+- `SimulatorProvider`: modelo local sin red con latencia log-normal hasta el
+  primer token, velocidad de generación en tokens por segundo, errores
+  inyectados y metadatos de uso, para pruebas de carga y de fallas.
+
+Los errores HTTP se traducen a excepciones con los mismos nombres que las de
+`google.api_core.exceptions`, así `resilience.is_retryable` reintenta igual
+un 429 de Gemini que uno de un servidor compatible con OpenAI.
+"""
+
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Sequence
+from concurrent.futures import Executor
+import asyncio
+import json
+import logging
+import math
+import random
+import threading
+
+from .text_processing import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class Generation(NamedTuple):
+    text: str
+    # {"prompt_tokens", "candidates_tokens", "total_tokens"} o None si no se informó
+    usage: Optional[Dict[str, int]] = None
+    # Modelo que respondió, si no es el configurado (lo completa `ModelRouter`)
+    model: Optional[str] = None
+
+
+def make_usage(prompt_tokens: int, candidates_tokens: int, total_tokens: Optional[int] = None) -> Dict[str, int]:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "candidates_tokens": candidates_tokens,
+        "total_tokens": prompt_tokens + candidates_tokens if total_tokens is None else total_tokens,
+    }
+
+
+class ProviderError(Exception):
+    """Error de un proveedor; `status_code` es el código HTTP si lo hubo"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TooManyRequests(ProviderError):
+    pass
+
+
+class ServiceUnavailable(ProviderError):
+    pass
+
+
+class InternalServerError(ProviderError):
+    pass
+
+
+class GatewayTimeout(ProviderError):
+    pass
+
+
+def error_for_status(status_code: int, message: str) -> ProviderError:
+    """Excepción correspondiente a un código HTTP de error"""
+    if status_code == 429:
+        return TooManyRequests(message, status_code)
+    if status_code == 503:
+        return ServiceUnavailable(message, status_code)
+    if status_code == 504:
+        return GatewayTimeout(message, status_code)
+    if status_code >= 500:
+        return InternalServerError(message, status_code)
+    return ProviderError(message, status_code)
+
+
+class GeminiProvider:
+    """Modelo de Gemini. Sin API asíncrona, las llamadas bloqueantes corren en `executor`.
+
+    `client_manager` (un `_ClientManager` del SDK configurado con otra clave)
+    hace que el modelo use esa clave en lugar de la global de `genai.configure`.
+    """
+
+    name = "gemini"
+    simulated = False
+
+    def __init__(self, model: Any, model_name: str, executor: Optional[Executor] = None, client_manager: Any = None):
+        self.model = model
+        self.model_name = model_name
+        self._executor = executor
+        self._client_manager = client_manager
+
+    def _bind_client(self, use_async: bool) -> None:
+        """Asigna al modelo el cliente de su clave (el asíncrono debe crearse dentro del event loop)"""
+        if self._client_manager is None:
+            return
+        if use_async and self.model._async_client is None:
+            self.model._async_client = self._client_manager.make_client("generative_async")
+        elif not use_async and self.model._client is None:
+            self.model._client = self._client_manager.make_client("generative")
+
+    @staticmethod
+    def _usage(response: Any) -> Optional[Dict[str, int]]:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return None
+        try:
+            return make_usage(
+                getattr(usage, "prompt_token_count", 0) or 0,
+                getattr(usage, "candidates_token_count", 0) or 0,
+                getattr(usage, "total_token_count", 0) or 0,
+            )
+        except Exception as e:
+            logger.warning("No se pudo extraer usage_metadata: %s", e)
+            return None
+
+    @staticmethod
+    def _text(response: Any) -> str:
+        try:
+            return response.text or ""
+        except (AttributeError, ValueError):
+            # El SDK lanza ValueError si el fragmento no trae texto (p. ej. solo metadatos)
+            return ""
+
+    async def generate(self, prompt: str) -> Generation:
+        if hasattr(self.model, "generate_content_async"):
+            self._bind_client(use_async=True)
+            response = await self.model.generate_content_async(prompt)
+        else:
+            self._bind_client(use_async=False)
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(self._executor, self.model.generate_content, prompt)
+        return Generation(response.text, self._usage(response))
+
+    async def stream(self, prompt: str) -> AsyncIterator[Generation]:
+        if hasattr(self.model, "generate_content_async"):
+            self._bind_client(use_async=True)
+            response = await self.model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                yield Generation(self._text(chunk), self._usage(chunk))
+            return
+
+        # El iterador bloqueante se recorre en el pool y los fragmentos se publican en una cola.
+        # Si el consumidor se va (desconexión, cancelación), `stop` corta la generación en el
+        # siguiente fragmento y no se espera al hilo: el slot del limitador se libera enseguida.
+        self._bind_client(use_async=False)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stop = threading.Event()
+
+        def post(item) -> None:
+            if stop.is_set():
+                return
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # El event loop ya se cerró
+                stop.set()
+
+        def produce():
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True):
+                    if stop.is_set():
+                        break
+                    post(chunk)
+            except Exception as e:
+                post(e)
+            finally:
+                post(done)
+
+        producer = loop.run_in_executor(self._executor, produce)
+        finished = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    finished = True
+                    break
+                if isinstance(item, Exception):
+                    finished = True
+                    raise item
+                yield Generation(self._text(item), self._usage(item))
+        finally:
+            stop.set()
+            if finished:
+                await producer
+
+    async def count_tokens(self, text: str) -> int:
+        try:
+            if hasattr(self.model, "count_tokens_async"):
+                self._bind_client(use_async=True)
+                return (await self.model.count_tokens_async(text)).total_tokens
+            self._bind_client(use_async=False)
+            loop = asyncio.get_running_loop()
+            return (await loop.run_in_executor(self._executor, self.model.count_tokens, text)).total_tokens
+        except Exception as e:
+            logger.warning("⚠️ No se pudieron contar los tokens con Gemini, se estiman: %s", e)
+            return estimate_tokens(text)
+
+
+class OpenAICompatibleProvider:
+    """Endpoint `/chat/completions` de un servidor compatible con OpenAI (local o remoto)"""
+
+    name = "openai"
+    simulated = False
+
+    def __init__(
+        self,
+        base_url: str,
+        model_name: str,
+        system_instruction: Optional[str] = None,
+        api_key: Optional[str] = None,
+        timeout: float = 30.0,
+        max_tokens: Optional[int] = None,
+        client: Any = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self._client = client
+
+    def _get_client(self) -> Any:
+        if self._client is None:
+            # httpx se importa recién al usar el proveedor (no suma al arranque en los demás modos)
+            import httpx
+
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(base_url=self.base_url, headers=headers, timeout=self.timeout)
+        return self._client
+
+    def _payload(self, prompt: str, stream: bool) -> Dict[str, Any]:
+        messages = [{"role": "system", "content": self.system_instruction}] if self.system_instruction else []
+        messages.append({"role": "user", "content": prompt})
+        payload: Dict[str, Any] = {"model": self.model_name, "messages": messages, "stream": stream}
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        if self.max_tokens:
+            payload["max_tokens"] = self.max_tokens
+        return payload
+
+    @staticmethod
+    def _usage(data: Optional[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+        if not data:
+            return None
+        return make_usage(data.get("prompt_tokens") or 0, data.get("completion_tokens") or 0, data.get("total_tokens"))
+
+    @staticmethod
+    def _check(status_code: int, body: str) -> None:
+        if status_code >= 400:
+            raise error_for_status(status_code, f"El servidor respondió {status_code}: {body[:200]}")
+
+    async def generate(self, prompt: str) -> Generation:
+        import httpx
+
+        try:
+            response = await self._get_client().post("/chat/completions", json=self._payload(prompt, stream=False))
+        except httpx.TransportError as e:
+            raise ServiceUnavailable(f"No se pudo conectar con {self.base_url}: {e}") from e
+        self._check(response.status_code, response.text)
+        data = response.json()
+        choices = data.get("choices") or [{}]
+        text = (choices[0].get("message") or {}).get("content") or ""
+        return Generation(text, self._usage(data.get("usage")))
+
+    async def stream(self, prompt: str) -> AsyncIterator[Generation]:
+        import httpx
+
+        try:
+            async with self._get_client().stream("POST", "/chat/completions", json=self._payload(prompt, stream=True)) as response:
+                if response.status_code >= 400:
+                    self._check(response.status_code, (await response.aread()).decode("utf-8", "replace"))
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    event = json.loads(data)
+                    choices = event.get("choices") or []
+                    text = ((choices[0].get("delta") or {}).get("content") or "") if choices else ""
+                    usage = self._usage(event.get("usage"))
+                    if text or usage:
+                        yield Generation(text, usage)
+        except httpx.TransportError as e:
+            raise ServiceUnavailable(f"Se cortó la conexión con {self.base_url}: {e}") from e
+
+    async def count_tokens(self, text: str) -> int:
+        # La API de OpenAI no tiene endpoint de conteo: se estima
+        return estimate_tokens(text)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+
+
+# Errores que inyecta el simulador (todos reintentables, como los transitorios reales)
+SIMULATED_ERRORS = (TooManyRequests, ServiceUnavailable, InternalServerError)
+
+
+class SimulatorProvider:
+    """Modelo local que imita los tiempos y las fallas de una API real.
+
+    - Latencia hasta el primer token: log-normal con mediana
+      `median_latency` y dispersión `sigma` (colas largas).
+    - Generación: `tokens_per_second` tokens por segundo (0 = instantánea),
+      en fragmentos de unos `chunk_tokens` tokens.
+    - Fallas: con probabilidad `error_rate` la llamada lanza un error
+      transitorio; en streaming puede ocurrir en medio de la respuesta.
+    - Uso: tokens estimados del prompt y de la respuesta.
+    `reply` arma el texto a partir del prompt (por defecto, `reply_tokens`
+    tokens de relleno).
+    """
+
+    name = "simulator"
+    simulated = True
+
+    def __init__(
+        self,
+        median_latency: float = 0.8,
+        sigma: float = 0.5,
+        tokens_per_second: float = 50.0,
+        error_rate: float = 0.0,
+        reply_tokens: int = 150,
+        chunk_tokens: int = 8,
+        model_name: str = "simulator",
+        reply: Optional[Callable[[str], str]] = None,
+        errors: Sequence[type] = SIMULATED_ERRORS,
+        seed: Optional[int] = None,
+        sleep: Callable[[float], Any] = asyncio.sleep,
+    ):
+        self.median_latency = median_latency
+        self.sigma = sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.reply_tokens = reply_tokens
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.model_name = model_name
+        self._reply = reply or self._default_reply
+        self._errors = tuple(errors)
+        self._random = random.Random(seed)
+        self._sleep = sleep
+        self.calls = 0
+        self.failures = 0
+
+    def _default_reply(self, prompt: str) -> str:
+        # ~4 caracteres por token, como `estimate_tokens`
+        header = f"Respuesta simulada para: {prompt[-60:]}\n"
+        return header + " ".join(["respuesta"] * max(0, self.reply_tokens * 4 // 10))
+
+    def _first_token_latency(self) -> float:
+        if self.median_latency <= 0:
+            return 0.0
+        return self._random.lognormvariate(math.log(self.median_latency), self.sigma)
+
+    def _generation_time(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _maybe_error(self) -> Optional[ProviderError]:
+        if self.error_rate <= 0 or self._random.random() >= self.error_rate:
+            return None
+        self.failures += 1
+        error = self._random.choice(self._errors)
+        return error("Error simulado del modelo")
+
+    def _chunks(self, text: str) -> List[str]:
+        words = text.split(" ")
+        size = max(1, math.ceil(self.chunk_tokens * 4 / 5))  # ~5 caracteres por palabra con espacio
+        pieces = [" ".join(words[start:start + size]) for start in range(0, len(words), size)]
+        return [piece + " " for piece in pieces[:-1]] + pieces[-1:]
+
+    async def generate(self, prompt: str) -> Generation:
+        self.calls += 1
+        text = self._reply(prompt)
+        usage = make_usage(estimate_tokens(prompt), estimate_tokens(text))
+        await self._sleep(self._first_token_latency() + self._generation_time(usage["candidates_tokens"]))
+        error = self._maybe_error()
+        if error is not None:
+            raise error
+        return Generation(text, usage)
+
+    async def stream(self, prompt: str) -> AsyncIterator[Generation]:
+        self.calls += 1
+        text = self._reply(prompt)
+        pieces = self._chunks(text)
+        error = self._maybe_error()
+        # Una falla puede llegar antes del primer fragmento o con la respuesta a medias
+        fail_at = self._random.randrange(len(pieces)) if error is not None else None
+
+        await self._sleep(self._first_token_latency())
+        for position, piece in enumerate(pieces):
+            if position == fail_at:
+                raise error
+            if position:
+                await self._sleep(self._generation_time(estimate_tokens(piece)))
+            last = position == len(pieces) - 1
+            yield Generation(piece, make_usage(estimate_tokens(prompt), estimate_tokens(text)) if last else None)
+
+    async def count_tokens(self, text: str) -> int:
+        return estimate_tokens(text)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "failures": self.failures}
@@ -0,0 +1,289 @@
+"""
+Métricas en formato de texto de Prometheus, sin dependencias externas.
+
+Cada métrica con etiquetas guarda un "hijo" por combinación de valores. El
+camino caliente (`inc`/`observe`) solo suma sobre atributos ya existentes:
+no toma locks ni crea objetos. Es seguro porque todo se registra desde el
+event loop (un solo hilo); el GIL cubre las lecturas desde /metrics.
+
+Con varios workers cada proceso publica un `snapshot()` (JSON) en el estado
+compartido y /metrics los combina con `render_prometheus(snapshots=...)`:
+contadores e histogramas se suman; los gauges se suman o se toma el máximo
+según su `aggregate`.
+"""
+
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+from bisect import bisect_left
+
+# Buckets (segundos) para latencias HTTP locales y llamadas al modelo
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    kind = ""
+    # Cómo se combinan los valores de varios workers: "sum" o "max"
+    aggregate = "sum"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        REGISTRY.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Devuelve (y crea la primera vez) el hijo para esos valores de etiqueta.
+
+        Conviene guardar el hijo en una variable cuando las etiquetas son fijas.
+        """
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        """Valores actuales por combinación de etiquetas (serializables en JSON)"""
+        return [(values, self._payload(child)) for values, child in list(self._children.items())]
+
+    def _payload(self, child) -> Any:
+        return child.value
+
+    def _merge(self, first: Any, second: Any) -> Any:
+        return max(first, second) if self.aggregate == "max" else first + second
+
+    def render(self, samples: Optional[List[Tuple[Tuple[str, ...], Any]]] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, payload in samples if samples is not None else self.samples():
+            lines.extend(self._render_payload(values, payload))
+        return lines
+
+    def _render_payload(self, values, payload) -> List[str]:
+        return [f"{self.name}{self._label_text(values)} {_format(payload)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._children[()].inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), aggregate: str = "sum"):
+        self.aggregate = aggregate
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._children[()].inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._children[()].dec(amount)
+
+    def set(self, value: float) -> None:
+        self._children[()].set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = HTTP_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def _payload(self, child) -> Any:
+        return [list(child.counts), child.sum, child.count]
+
+    def _merge(self, first: Any, second: Any) -> Any:
+        return [[a + b for a, b in zip(first[0], second[0])], first[1] + second[1], first[2] + second[2]]
+
+    def _render_payload(self, values, payload) -> List[str]:
+        counts, total, count = payload
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = 'le="' + _format(bound) + '"'
+            lines.append(f"{self.name}_bucket{self._label_text(values, le)} {cumulative}")
+        cumulative += counts[-1]
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{self._label_text(values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {_format(total)}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Métrica cuyo valor se lee al momento de exponerla (contadores de otros componentes)"""
+
+    def __init__(self, name: str, documentation: str, kind: str, callback: Callable[[], float], aggregate: str = "sum"):
+        self.kind = kind
+        self._callback = callback
+        self.aggregate = aggregate
+        super().__init__(name, documentation)
+
+    def _new_child(self):
+        return None
+
+    def _payload(self, child) -> Any:
+        return self._callback()
+
+
+REGISTRY: List[_Metric] = []
+
+
+def snapshot(registry: Optional[List[_Metric]] = None) -> Dict[str, List[Any]]:
+    """Valores de todas las métricas del proceso, para publicarlos en el estado compartido"""
+    return {
+        metric.name: [[list(values), payload] for values, payload in metric.samples()]
+        for metric in (registry if registry is not None else REGISTRY)
+    }
+
+
+def render_prometheus(registry: Optional[List[_Metric]] = None, snapshots: Optional[List[Dict[str, List[Any]]]] = None) -> str:
+    """Texto de exposición de Prometheus (versión 0.0.4) con todas las métricas.
+
+    Con `snapshots` (uno por worker) se exponen los valores combinados en
+    lugar de los del proceso actual.
+    """
+    lines: List[str] = []
+    for metric in registry if registry is not None else REGISTRY:
+        if snapshots is None:
+            lines.extend(metric.render())
+            continue
+        merged: Dict[Tuple[str, ...], Any] = {}
+        for worker_snapshot in snapshots:
+            for values, payload in worker_snapshot.get(metric.name, []):
+                key = tuple(values)
+                merged[key] = metric._merge(merged[key], payload) if key in merged else payload
+        lines.extend(metric.render(list(merged.items())))
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+# --- Métricas de la aplicación ---
+
+HTTP_REQUESTS = Counter(
+    "simulador_http_requests_total", "Solicitudes HTTP atendidas", ("method", "route", "status")
+)
+HTTP_LATENCY = Histogram(
+    "simulador_http_request_duration_seconds", "Duración de las solicitudes HTTP", ("route",), HTTP_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge("simulador_http_requests_in_flight", "Solicitudes HTTP en curso")
+HTTP_ERRORS = Counter(
+    "simulador_http_errors_total", "Errores no controlados en solicitudes HTTP", ("route", "type")
+)
+
+UPSTREAM_LATENCY = Histogram(
+    "simulador_upstream_request_duration_seconds", "Duración de las llamadas a Gemini", ("mode",), UPSTREAM_BUCKETS
+)
+UPSTREAM_ERRORS = Counter(
+    "simulador_upstream_errors_total", "Errores en llamadas a Gemini por tipo", ("mode", "type")
+)
+UPSTREAM_TOKENS = Counter(
+    "simulador_upstream_tokens_total", "Tokens consumidos en Gemini", ("mode", "kind")
+)
+UPSTREAM_RETRIES = Counter(
+    "simulador_upstream_retries_total", "Reintentos de llamadas a Gemini tras errores transitorios", ("mode",)
+)
+UPSTREAM_HEDGES = Counter(
+    "simulador_upstream_hedges_total", "Llamadas duplicadas (hedge) lanzadas por demora de Gemini", ("mode",)
+)
+UPSTREAM_HEDGE_WINS = Counter(
+    "simulador_upstream_hedge_wins_total", "Hedges que respondieron antes que la llamada original", ("mode",)
+)
+UPSTREAM_ROUTED = Counter(
+    "simulador_upstream_routed_total", "Llamadas al modelo por clave (huella), modelo y nivel", ("key", "model", "tier")
+)
+UPSTREAM_QUOTA_SKIPS = Counter(
+    "simulador_upstream_quota_skips_total",
+    "Claves salteadas antes de llamar: cuota del minuto agotada (quota) o pausa tras un 429 (cooldown)",
+    ("key", "model", "reason"),
+)
+UPSTREAM_KEY_TOKENS = Counter(
+    "simulador_upstream_key_tokens_total", "Tokens consumidos por clave (huella) y modelo", ("key", "model")
+)
+RAG_RESPONSES = Counter(
+    "simulador_rag_responses_total", "Respuestas de /simulador/rag por origen", ("source_type",)
+)
+INTENT_DECISIONS = Counter(
+    "simulador_intent_decisions_total",
+    "Decisiones del clasificador de intención; outcome distinto de llm = llamada a Gemini evitada",
+    ("intent", "outcome"),
+)
+INTENT_CONFIDENCE = Histogram(
+    "simulador_intent_confidence", "Confianza de las decisiones del clasificador de intención",
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99, 1.0),
+)
+DEGRADED_RESPONSES = Counter(
+    "simulador_degraded_responses_total", "Respuestas locales servidas con el circuito abierto", ("mode",)
+)
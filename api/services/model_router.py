@@ -0,0 +1,257 @@
+"""
+Reparto de llamadas entre varias claves de API y modelos.
+
+Cada combinación clave + modelo tiene su propia cuota (solicitudes y tokens
+por minuto). `KeyQuota` lleva el uso del último minuto en una ventana
+deslizante y una pausa tras un 429. `ModelRouter` es un proveedor más (misma
+interfaz que los de `llm_providers`) que, en cada llamada:
+
+1. Elige el nivel: los prompts cortos y simples (una sola pieza de texto, sin
+   historial ni pasajes del curso) van al modelo "light", más barato y
+   rápido; el resto al "standard".
+2. Entre las claves del nivel descarta las que están en pausa o no tienen
+   cuota para la llamada (antes de que la API responda 429) y elige la de más
+   margen. Si el nivel no tiene ninguna libre prueba con el otro; si no hay
+   ninguna, espera a que se libere cuota hasta `wait_timeout` y luego falla
+   con `QuotaExhaustedError` (503, como la cola llena del limitador).
+3. Al terminar corrige los tokens reservados con el uso real informado.
+
+Las claves nunca aparecen en métricas ni estadísticas: se identifican con una
+huella corta (`key_label`).
+"""
+
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple
+from collections import deque
+import asyncio
+import hashlib
+import time
+
+from .concurrency import UpstreamBusyError
+from .llm_providers import Generation
+from .metrics import UPSTREAM_KEY_TOKENS, UPSTREAM_QUOTA_SKIPS, UPSTREAM_ROUTED
+from .text_processing import estimate_tokens
+from .tracing import record_span
+
+STANDARD = "standard"
+LIGHT = "light"
+
+# Errores de cuota de la API (429): la clave descansa antes de volver a usarse
+QUOTA_ERROR_NAMES = frozenset({"ResourceExhausted", "TooManyRequests"})
+
+
+class QuotaExhaustedError(UpstreamBusyError):
+    """Ninguna clave tiene cuota disponible dentro del tiempo de espera"""
+
+
+def key_label(api_key: str) -> str:
+    """Huella corta y estable de una clave, para métricas y registros"""
+    return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class Reservation:
+    """Una llamada dentro de la ventana de una `KeyQuota`; `in_window` pasa a False cuando sale de ella"""
+
+    __slots__ = ("at", "tokens", "in_window")
+
+    def __init__(self, at: float, tokens: int):
+        self.at = at
+        self.tokens = tokens
+        self.in_window = True
+
+
+class KeyQuota:
+    """Uso del último minuto de una clave con un modelo, con límites opcionales (0 = sin límite)"""
+
+    def __init__(self, label: str, model: str, rpm_limit: int = 0, tpm_limit: int = 0, window_seconds: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.label = label
+        self.model = model
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.window_seconds = window_seconds
+        self._clock = clock
+        # Reservas en orden de llegada; `settle` corrige los tokens de una al conocer el uso real
+        self._events: deque = deque()
+        self._tokens = 0
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.throttled = 0
+        # Promedio móvil de tokens de salida, para estimar la reserva antes de la llamada
+        self.output_tokens_avg = 200.0
+
+    def _prune(self, now: float) -> None:
+        while self._events and self._events[0].at <= now - self.window_seconds:
+            event = self._events.popleft()
+            event.in_window = False
+            self._tokens -= event.tokens
+
+    def headroom(self, tokens: int) -> Optional[float]:
+        """Fracción de cuota que quedaría libre tras una llamada de `tokens`; None si no entra"""
+        now = self._clock()
+        self._prune(now)
+        ratios = [1.0]
+        if self.rpm_limit:
+            ratios.append((self.rpm_limit - len(self._events) - 1) / self.rpm_limit)
+        if self.tpm_limit:
+            ratios.append((self.tpm_limit - self._tokens - tokens) / self.tpm_limit)
+        free = min(ratios)
+        return free if free >= 0 else None
+
+    def cooling_down(self) -> bool:
+        return self._clock() < self.cooldown_until
+
+    def seconds_until_free(self) -> float:
+        """Cuánto falta para que venza la pausa o salga de la ventana la llamada más vieja"""
+        now = self._clock()
+        waits = [self.cooldown_until - now] if self.cooldown_until > now else []
+        if self._events:
+            waits.append(self._events[0].at + self.window_seconds - now)
+        return max(0.0, min(waits)) if waits else 0.0
+
+    def reserve(self, tokens: int) -> Reservation:
+        event = Reservation(self._clock(), tokens)
+        self._events.append(event)
+        self._tokens += tokens
+        self.calls += 1
+        return event
+
+    def settle(self, event: Reservation, usage: Optional[Dict[str, int]]) -> None:
+        """Reemplaza los tokens estimados de `event` por los reales"""
+        if not usage:
+            return
+        total = usage.get("total_tokens") or (usage.get("prompt_tokens", 0) + usage.get("candidates_tokens", 0))
+        # Si ya salió de la ventana sus tokens no cuentan en el total
+        if event.in_window:
+            self._tokens += total - event.tokens
+        event.tokens = total
+        self.output_tokens_avg = 0.8 * self.output_tokens_avg + 0.2 * (usage.get("candidates_tokens") or 0)
+        UPSTREAM_KEY_TOKENS.labels(self.label, self.model).inc(total)
+
+    def throttle(self, seconds: float) -> None:
+        self.throttled += 1
+        self.cooldown_until = max(self.cooldown_until, self._clock() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune(self._clock())
+        return {
+            "key": self.label,
+            "model": self.model,
+            "requests_last_minute": len(self._events),
+            "tokens_last_minute": self._tokens,
+            "rpm_limit": self.rpm_limit,
+            "tpm_limit": self.tpm_limit,
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "cooling_down": self.cooling_down(),
+        }
+
+
+class PoolTarget(NamedTuple):
+    tier: str
+    quota: KeyQuota
+    # Proveedor que llama a `quota.model` con `quota.label`
+    provider: Any
+
+
+class ModelRouter:
+    """Proveedor que reparte las llamadas entre `targets` (varias claves y modelos por nivel)"""
+
+    def __init__(
+        self,
+        targets: List[PoolTarget],
+        light_max_prompt_tokens: int = 80,
+        cooldown_seconds: float = 30.0,
+        wait_timeout: float = 2.0,
+        sleep: Callable[[float], Any] = asyncio.sleep,
+    ):
+        if not targets:
+            raise ValueError("ModelRouter necesita al menos una clave y un modelo")
+        self.targets = targets
+        self.light_max_prompt_tokens = light_max_prompt_tokens
+        self.cooldown_seconds = cooldown_seconds
+        self.wait_timeout = wait_timeout
+        self._sleep = sleep
+        first = next((t for t in targets if t.tier == STANDARD), targets[0])
+        self.name = first.provider.name
+        self.model_name = first.quota.model
+        self.simulated = all(t.provider.simulated for t in targets)
+        self._tiers = {t.tier for t in targets}
+
+    def tier_for(self, prompt: str) -> str:
+        """Nivel del prompt: "light" si es corto y de una sola pieza (sin historial ni contexto)"""
+        if LIGHT not in self._tiers:
+            return STANDARD
+        if "\n\n" in prompt.strip() or estimate_tokens(prompt) > self.light_max_prompt_tokens:
+            return STANDARD
+        return LIGHT
+
+    def _pick(self, tier: str, prompt_tokens: int) -> Optional[PoolTarget]:
+        order = [tier] + sorted(self._tiers - {tier})
+        for candidate_tier in order:
+            best, best_key = None, None
+            for target in self.targets:
+                if target.tier != candidate_tier:
+                    continue
+                quota = target.quota
+                if quota.cooling_down():
+                    UPSTREAM_QUOTA_SKIPS.labels(quota.label, quota.model, "cooldown").inc()
+                    continue
+                free = quota.headroom(prompt_tokens + int(quota.output_tokens_avg))
+                if free is None:
+                    UPSTREAM_QUOTA_SKIPS.labels(quota.label, quota.model, "quota").inc()
+                    continue
+                # Más margen primero; a igual margen, la que menos se usó (reparto parejo sin límites)
+                key = (free, -quota.calls)
+                if best_key is None or key > best_key:
+                    best, best_key = target, key
+            if best is not None:
+                return best
+        return None
+
+    async def _acquire(self, prompt: str) -> Tuple[PoolTarget, Reservation]:
+        tier = self.tier_for(prompt)
+        prompt_tokens = estimate_tokens(prompt)
+        waited = 0.0
+        while True:
+            target = self._pick(tier, prompt_tokens)
+            if target is not None:
+                if waited:
+                    record_span("quota_wait", waited)
+                quota = target.quota
+                UPSTREAM_ROUTED.labels(quota.label, quota.model, target.tier).inc()
+                return target, quota.reserve(prompt_tokens + int(quota.output_tokens_avg))
+            wait = min(t.quota.seconds_until_free() for t in self.targets) or 0.05
+            if waited + wait > self.wait_timeout:
+                raise QuotaExhaustedError(
+                    f"Todas las claves agotaron su cuota del minuto; se libera en {wait:.1f}s"
+                )
+            await self._sleep(wait)
+            waited += wait
+
+    def _failed(self, target: PoolTarget, error: BaseException) -> None:
+        if type(error).__name__ in QUOTA_ERROR_NAMES:
+            target.quota.throttle(self.cooldown_seconds)
+
+    async def generate(self, prompt: str) -> Generation:
+        target, event = await self._acquire(prompt)
+        try:
+            response = await target.provider.generate(prompt)
+        except Exception as e:
+            self._failed(target, e)
+            raise
+        target.quota.settle(event, response.usage)
+        return response._replace(model=target.quota.model)
+
+    async def stream(self, prompt: str) -> AsyncIterator[Generation]:
+        target, event = await self._acquire(prompt)
+        try:
+            async for chunk in target.provider.stream(prompt):
+                if chunk.usage:
+                    target.quota.settle(event, chunk.usage)
+                yield chunk._replace(model=target.quota.model)
+        except Exception as e:
+            self._failed(target, e)
+            raise
+
+    async def count_tokens(self, text: str) -> int:
+        return await self.targets[0].provider.count_tokens(text)
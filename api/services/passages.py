@@ -0,0 +1,98 @@
+from typing import Dict, Any, List, NamedTuple, Set, Tuple
+import hashlib
+
+from .kb_search import SearchHit
+from .text_processing import estimate_tokens
+
+
+class Passage(NamedTuple):
+    id: str
+    doc_id: str
+    title: str
+    category: str
+    text: str
+    # Posiciones de los párrafos del documento que abarca (para detectar solapamientos)
+    paragraphs: Tuple[int, ...]
+
+
+def split_passages(doc: Dict[str, str], max_tokens: int = 120, overlap: int = 1) -> List[Passage]:
+    """Divide un documento en pasajes de párrafos consecutivos de hasta `max_tokens`.
+
+    Pasajes vecinos comparten `overlap` párrafos para no cortar una idea a la
+    mitad. El id es `doc_id#<huella del texto>`: no cambia si se editan otros
+    párrafos del documento.
+    """
+    paragraphs = [p.strip() for p in doc["content"].split("\n\n") if p.strip()]
+    passages: List[Passage] = []
+    seen_ids: Set[str] = set()
+    start = 0
+    while start < len(paragraphs):
+        end = start + 1
+        tokens = estimate_tokens(paragraphs[start])
+        while end < len(paragraphs) and tokens + estimate_tokens(paragraphs[end]) <= max_tokens:
+            tokens += estimate_tokens(paragraphs[end])
+            end += 1
+
+        text = "\n\n".join(paragraphs[start:end])
+        passage_id = f"{doc['id']}#{hashlib.sha1(text.encode('utf-8')).hexdigest()[:8]}"
+        suffix = 2
+        while passage_id in seen_ids:
+            passage_id = f"{passage_id.split('~')[0]}~{suffix}"
+            suffix += 1
+        seen_ids.add(passage_id)
+        passages.append(Passage(passage_id, doc["id"], doc["title"], doc.get("category", ""), text, tuple(range(start, end))))
+
+        if end >= len(paragraphs):
+            break
+        start = max(start + 1, end - overlap)
+    return passages
+
+
+def passage_document(passage: Passage) -> Dict[str, str]:
+    """Forma de documento que entiende `BM25Index` (el título del documento pesa en cada pasaje)"""
+    return {
+        "id": passage.id,
+        "doc_id": passage.doc_id,
+        "title": passage.title,
+        "category": passage.category,
+        "content": passage.text,
+    }
+
+
+def pack_context(hits: List[SearchHit], passages_by_id: Dict[str, Passage], token_budget: int) -> Tuple[str, List[Dict[str, Any]]]:
+    """Arma el contexto para el modelo con los mejores pasajes dentro de `token_budget`.
+
+    Recorre los resultados de mejor a peor; de cada pasaje agrega solo los
+    párrafos que todavía no están en el contexto (los pasajes se solapan) y
+    salta los que no entran en el presupuesto restante. Devuelve el texto y
+    las fuentes usadas.
+    """
+    used_paragraphs: Set[Tuple[str, int]] = set()
+    sections: List[str] = []
+    sources: List[Dict[str, Any]] = []
+    budget = token_budget
+    for hit in hits:
+        passage = passages_by_id[hit.document["id"]]
+        paragraphs = passage.text.split("\n\n")
+        new = [
+            (position, paragraph)
+            for position, paragraph in zip(passage.paragraphs, paragraphs)
+            if (passage.doc_id, position) not in used_paragraphs
+        ]
+        if not new:
+            continue
+        section = f"[{len(sections) + 1}] {passage.title}\n" + "\n\n".join(paragraph for _, paragraph in new)
+        cost = estimate_tokens(section)
+        if cost > budget:
+            continue
+        budget -= cost
+        used_paragraphs.update((passage.doc_id, position) for position, _ in new)
+        sections.append(section)
+        sources.append({
+            "type": "passage",
+            "id": passage.id,
+            "doc_id": passage.doc_id,
+            "title": passage.title,
+            "score": round(hit.confidence, 3),
+        })
+    return "\n\n".join(sections), sources
@@ -0,0 +1,88 @@
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from collections import deque
+import asyncio
+import random
+
+from .concurrency import UpstreamTimeoutError
+
+# Errores transitorios del SDK de Google (google.api_core.exceptions) que vale la pena reintentar.
+# Se comparan por nombre para no depender del SDK cuando no está instalado.
+RETRYABLE_ERROR_NAMES = frozenset({
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "InternalServerError",
+    "DeadlineExceeded",
+    "GatewayTimeout",
+    "Aborted",
+})
+
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, UpstreamTimeoutError) or type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: Callable[[], float] = random.random) -> float:
+    """Espera antes del reintento `attempt` (0, 1, ...): backoff exponencial con jitter completo"""
+    return rng() * min(cap, base * (2 ** attempt))
+
+
+class LatencyTracker:
+    """Guarda las latencias recientes para calcular percentiles (p. ej. el retardo del hedge)"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples: deque = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._sorted: Optional[list] = None
+
+    def add(self, value: float) -> None:
+        self._samples.append(value)
+        self._sorted = None
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Percentil de la ventana, o None si todavía no hay muestras suficientes"""
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        rank = min(len(self._sorted) - 1, max(0, int(round(pct / 100 * len(self._sorted))) - 1))
+        return self._sorted[rank]
+
+
+async def hedged_call(
+    call: Callable[[], Awaitable[Any]],
+    hedge_delay: Optional[float],
+    should_hedge: Callable[[], bool] = lambda: True,
+) -> Tuple[Any, bool]:
+    """Ejecuta `call` y, si no terminó tras `hedge_delay` segundos, lanza una copia.
+
+    `should_hedge` se consulta justo antes de lanzar la copia (puede negarla,
+    p. ej. si no hay capacidad libre). Gana la primera respuesta exitosa y la
+    otra se cancela; si fallan ambas se propaga el primer error. Devuelve
+    `(resultado, ganó_la_copia)`.
+    """
+    primary = asyncio.ensure_future(call())
+    tasks = [primary]
+    try:
+        if hedge_delay is not None:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+            if not done and should_hedge():
+                tasks.append(asyncio.ensure_future(call()))
+        if len(tasks) == 1:
+            return await primary, False
+
+        pending = set(tasks)
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task is not primary
+                if first_error is None:
+                    first_error = task.exception()
+        raise first_error
+    finally:
+        # La perdedora (o ambas, si se cancela al llamador) no sigue consumiendo cuota
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,129 @@
+from typing import Dict, Any, Callable, Optional
+from collections import OrderedDict
+import hashlib
+import time
+
+from .text_processing import normalize_text
+
+
+def make_cache_key(text: str, model: str, prompt_version: str) -> str:
+    """Clave de caché: pregunta normalizada + modelo + versión del prompt"""
+    raw = "\x1f".join((normalize_text(text), model, prompt_version))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Caché en memoria de respuestas con tamaño acotado, desalojo LRU y TTL.
+
+    No es thread-safe: se usa solo desde el event loop.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la respuesta guardada o None si no existe o expiró"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Guarda una respuesta, desalojando la menos usada si se supera el límite"""
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    # Interfaz asíncrona común a todos los niveles de caché
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Dict[str, Any]) -> None:
+        self.set(key, value)
+
+    async def aclear(self) -> None:
+        self.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class TieredCache:
+    """Caché de dos niveles: L1 en memoria del proceso y L2 compartida (p. ej. SQLite).
+
+    Un acierto en L2 se copia a L1. Las escrituras van a ambos niveles (la de
+    L2 corre fuera del event loop).
+    """
+
+    def __init__(self, l1: ResponseCache, l2: Any):
+        self.l1 = l1
+        self.l2 = l2
+        self.hits = 0
+        self.misses = 0
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.l1.get(key)
+        if value is None:
+            value = await self.l2.aget(key)
+            if value is not None:
+                self.l1.set(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def aset(self, key: str, value: Dict[str, Any]) -> None:
+        self.l1.set(key, value)
+        await self.l2.aset(key, value)
+
+    async def aclear(self) -> None:
+        self.l1.clear()
+        await self.l2.aclear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "tiered",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "l1": self.l1.stats(),
+            "l2": self.l2.stats(),
+        }
@@ -0,0 +1,212 @@
+from typing import Dict, Any, Callable, List, NamedTuple, Optional, Tuple
+from collections import OrderedDict, deque
+import json
+import logging
+import time
+
+from .shared_state import STATE_ERRORS
+from .text_processing import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class Turn(NamedTuple):
+    user: str
+    assistant: str
+
+
+class _Session:
+    __slots__ = ("turns", "last_seen")
+
+    def __init__(self, max_turns: int, now: float):
+        self.turns: deque = deque(maxlen=max_turns)
+        self.last_seen = now
+
+
+class SessionStore:
+    """Historial de conversaciones en memoria, acotado por sesión y en total.
+
+    - Cada sesión guarda como máximo `max_turns` intercambios (se descartan los más viejos).
+    - Con más de `max_sessions` sesiones se desaloja la usada hace más tiempo (LRU).
+    - Una sesión sin actividad durante `idle_seconds` expira.
+
+    No es thread-safe: se usa solo desde el event loop.
+    """
+
+    def __init__(self, max_sessions: int, max_turns: int, idle_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.idle_seconds = idle_seconds
+        self._clock = clock
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def history(self, session_id: str) -> List[Turn]:
+        """Intercambios guardados de la sesión (del más viejo al más nuevo)"""
+        session = self._touch(session_id)
+        return list(session.turns) if session else []
+
+    def append(self, session_id: str, user: str, assistant: str) -> None:
+        """Agrega un intercambio, creando la sesión si no existe"""
+        if self.max_sessions <= 0 or self.max_turns <= 0:
+            return
+        session = self._touch(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session(self.max_turns, self._clock())
+        session.turns.append(Turn(user, assistant))
+        self._prune()
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    # Misma interfaz asíncrona que `SharedSessionStore`
+    async def ahistory(self, session_id: str) -> List[Turn]:
+        return self.history(session_id)
+
+    async def aappend(self, session_id: str, user: str, assistant: str) -> None:
+        self.append(session_id, user, assistant)
+
+    async def adelete(self, session_id: str) -> bool:
+        return self.delete(session_id)
+
+    def _touch(self, session_id: str) -> Optional[_Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        now = self._clock()
+        if now - session.last_seen >= self.idle_seconds:
+            del self._sessions[session_id]
+            self.expirations += 1
+            return None
+        session.last_seen = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _prune(self) -> None:
+        # Las sesiones están ordenadas por último uso: las expiradas quedan al principio
+        now = self._clock()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_seen < self.idle_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.expirations += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "max_turns": self.max_turns,
+            "idle_seconds": self.idle_seconds,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SharedSessionStore:
+    """Historial de conversaciones en un almacén compartido (`shared_state`), visible desde todos los workers.
+
+    Cada sesión es una lista acotada del almacén (un intercambio en JSON por
+    elemento) con vencimiento de `idle_seconds` que se renueva con cada
+    intercambio. Los intercambios se agregan de forma atómica
+    (`append_list`), así dos workers que responden a la vez no se pisan. El
+    límite total de sesiones lo impone el almacén (memoria de Redis, disco).
+    Si el almacén falla, la conversación sigue sin historial.
+    """
+
+    def __init__(self, state: Any, max_turns: int, idle_seconds: float, prefix: str = "session:"):
+        self._state = state
+        self.max_turns = max_turns
+        self.idle_seconds = idle_seconds
+        self.prefix = prefix
+        self.errors = 0
+
+    async def ahistory(self, session_id: str) -> List[Turn]:
+        try:
+            items = await self._state.get_list(self.prefix + session_id)
+        except STATE_ERRORS as e:
+            self.errors += 1
+            logger.warning("⚠️ No se pudo leer la sesión %s: %s", session_id, e)
+            return []
+        return [Turn(*json.loads(item)) for item in items]
+
+    async def aappend(self, session_id: str, user: str, assistant: str) -> None:
+        if self.max_turns <= 0:
+            return
+        try:
+            await self._state.append_list(
+                self.prefix + session_id,
+                json.dumps([user, assistant], ensure_ascii=False),
+                self.max_turns,
+                self.idle_seconds,
+            )
+        except STATE_ERRORS as e:
+            self.errors += 1
+            logger.warning("⚠️ No se pudo guardar la sesión %s: %s", session_id, e)
+
+    async def adelete(self, session_id: str) -> bool:
+        try:
+            return await self._state.delete(self.prefix + session_id)
+        except STATE_ERRORS as e:
+            self.errors += 1
+            logger.warning("⚠️ No se pudo borrar la sesión %s: %s", session_id, e)
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._state.stats(),
+            "max_turns": self.max_turns,
+            "idle_seconds": self.idle_seconds,
+            "errors": self.errors,
+        }
+
+
+def _clip(text: str, tokens: int) -> str:
+    """Recorta `text` a `tokens` tokens estimados, con "…" al final si se cortó"""
+    if estimate_tokens(text) <= tokens:
+        return text
+    return text[:tokens * 4 - 1] + "…" if tokens > 0 else ""
+
+
+def trim_history(turns: List[Turn], token_budget: int, summary_share: float = 0.2) -> Tuple[Optional[str], List[Turn]]:
+    """Ajusta el historial a `token_budget` tokens estimados.
+
+    Conserva completos los intercambios más recientes que entran en el
+    presupuesto; si ni el último entra, se recorta hasta entrar. Los anteriores se resumen en una línea con las preguntas del
+    usuario (como mucho `summary_share` del presupuesto), así el tamaño del
+    prompt no crece con la conversación. Devuelve `(resumen, intercambios)`.
+    """
+    if not turns or token_budget <= 0:
+        return None, []
+
+    summary_budget = int(token_budget * summary_share)
+    budget = token_budget - summary_budget
+    kept: List[Turn] = []
+    for turn in reversed(turns):
+        cost = estimate_tokens(turn.user) + estimate_tokens(turn.assistant)
+        if cost > budget:
+            if not kept:
+                # El último intercambio no entra entero: se recorta la respuesta y, si la
+                # pregunta sola no entra, también la pregunta (a lo sumo la mitad del presupuesto)
+                user_room = min(estimate_tokens(turn.user), max(budget - estimate_tokens(turn.assistant), budget // 2))
+                if user_room > 0:
+                    kept.append(Turn(_clip(turn.user, user_room), _clip(turn.assistant, budget - user_room)))
+            break
+        kept.append(turn)
+        budget -= cost
+    kept.reverse()
+
+    older = turns[:len(turns) - len(kept)]
+    if not older or summary_budget <= 0:
+        return None, kept
+
+    summary = "; ".join(turn.user.strip()[:120] for turn in older)
+    limit = summary_budget * 4
+    if len(summary) > limit:
+        summary = "…" + summary[-(limit - 1):]
+    return summary, kept
@@ -0,0 +1,345 @@
+"""
+Estado compartido entre procesos (workers de uvicorn/gunicorn).
+
+Un almacén clave-valor asíncrono con vencimiento por clave, más listas
+acotadas con agregado atómico (`append_list`/`get_list`), y tres
+implementaciones intercambiables:
+- `LocalState`: diccionario en memoria; un solo proceso (modo por defecto).
+- `SQLiteState`: archivo SQLite en modo WAL; todos los workers de una máquina.
+- `RedisState`: Redis o cualquier cliente compatible con `redis.asyncio`
+  (por ejemplo `fakeredis.aioredis.FakeRedis` en pruebas); varias máquinas.
+
+Sobre ese almacén se apoyan la caché de respuestas compartida
+(`SharedStateCache`), las sesiones de chat y la agregación de métricas.
+"""
+
+from typing import Dict, Any, Callable, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Redis es opcional: solo se necesita con SHARED_STATE_BACKEND=redis o CACHE_BACKEND=redis
+try:
+    import redis.asyncio as redis_asyncio
+    from redis.exceptions import RedisError
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis_asyncio = None
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Errores del almacén que se registran y se tratan como "sin dato" en lugar de fallar la solicitud
+STATE_ERRORS = (sqlite3.Error, OSError, RedisError)
+
+
+class LocalState:
+    """Almacén en memoria del proceso. Sirve con un solo worker."""
+
+    name = "local"
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._data: Dict[str, Any] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= self._clock():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        self._data[key] = (value, self._clock() + ttl_seconds if ttl_seconds else None)
+
+    async def get_list(self, key: str) -> List[str]:
+        raw = await self.get(key)
+        return json.loads(raw) if raw else []
+
+    async def append_list(self, key: str, value: str, max_items: int, ttl_seconds: Optional[float] = None) -> None:
+        """Agrega `value` al final de la lista, conserva los últimos `max_items` y renueva el vencimiento"""
+        # Sin esperas entre la lectura y la escritura: atómico dentro del event loop
+        items = await self.get_list(key)
+        items.append(value)
+        await self.set(key, json.dumps(items[-max_items:], ensure_ascii=False), ttl_seconds)
+
+    async def delete(self, key: str) -> bool:
+        return self._data.pop(key, None) is not None
+
+    async def delete_prefix(self, prefix: str) -> int:
+        keys = [key for key in self._data if key.startswith(prefix)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    async def items(self, prefix: str) -> Dict[str, str]:
+        now = self._clock()
+        return {
+            key: value
+            for key, (value, expires_at) in list(self._data.items())
+            if key.startswith(prefix) and (expires_at is None or expires_at > now)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "keys": len(self._data)}
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL
+);
+"""
+
+
+class SQLiteState:
+    """Almacén en un archivo SQLite (modo WAL) compartido por los workers de una máquina.
+
+    Igual que `SQLiteCache`, las consultas corren en un pool de hilos propio
+    con una conexión por hilo. Las claves vencidas se ignoran al leer y se
+    borran cada tanto al escribir.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self._clock = clock
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="shared-state")
+        self._writes_since_prune = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, self._clock()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str, ttl_seconds: Optional[float]) -> None:
+        now = self._clock()
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, now + ttl_seconds if ttl_seconds else None),
+        )
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= 500:
+            self._writes_since_prune = 0
+            connection.execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+
+    def _append_list(self, key: str, value: str, max_items: int, ttl_seconds: Optional[float]) -> None:
+        # BEGIN IMMEDIATE toma el lock de escritura antes de leer: otro worker no puede
+        # intercalar su agregado entre la lectura y la escritura
+        now = self._clock()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, now)
+            ).fetchone()
+            items = json.loads(row[0]) if row else []
+            items.append(value)
+            connection.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(items[-max_items:], ensure_ascii=False), now + ttl_seconds if ttl_seconds else None),
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _delete(self, key: str) -> bool:
+        return self._connection().execute("DELETE FROM state WHERE key = ?", (key,)).rowcount > 0
+
+    def _items(self, prefix: str) -> Dict[str, str]:
+        # Rango [prefix, prefix + U+FFFF) en lugar de LIKE para usar la clave primaria
+        rows = self._connection().execute(
+            "SELECT key, value FROM state WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)",
+            (prefix, prefix + "￿", self._clock()),
+        ).fetchall()
+        return dict(rows)
+
+    def _delete_prefix(self, prefix: str) -> int:
+        return self._connection().execute(
+            "DELETE FROM state WHERE key >= ? AND key < ?", (prefix, prefix + "￿")
+        ).rowcount
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        await self._run(self._set, key, value, ttl_seconds)
+
+    async def get_list(self, key: str) -> List[str]:
+        raw = await self.get(key)
+        return json.loads(raw) if raw else []
+
+    async def append_list(self, key: str, value: str, max_items: int, ttl_seconds: Optional[float] = None) -> None:
+        await self._run(self._append_list, key, value, max_items, ttl_seconds)
+
+    async def delete(self, key: str) -> bool:
+        return await self._run(self._delete, key)
+
+    async def items(self, prefix: str) -> Dict[str, str]:
+        return await self._run(self._items, prefix)
+
+    async def delete_prefix(self, prefix: str) -> int:
+        return await self._run(self._delete_prefix, prefix)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "path": self.path}
+
+
+class RedisState:
+    """Almacén en Redis. `client` es un cliente de `redis.asyncio` (o uno compatible)."""
+
+    name = "redis"
+
+    def __init__(self, client: Any, namespace: str = "simulador:"):
+        self._client = client
+        self.namespace = namespace
+
+    @classmethod
+    def from_url(cls, url: str, namespace: str = "simulador:") -> "RedisState":
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("El paquete redis no está instalado: pip install redis")
+        return cls(redis_asyncio.Redis.from_url(url, decode_responses=True), namespace)
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self._client.get(self.namespace + key)
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    async def set(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        px = max(1, int(ttl_seconds * 1000)) if ttl_seconds else None
+        await self._client.set(self.namespace + key, value, px=px)
+
+    async def get_list(self, key: str) -> List[str]:
+        values = await self._client.lrange(self.namespace + key, 0, -1)
+        return [value.decode("utf-8") if isinstance(value, bytes) else value for value in values]
+
+    async def append_list(self, key: str, value: str, max_items: int, ttl_seconds: Optional[float] = None) -> None:
+        # RPUSH + LTRIM (+ PEXPIRE) en una transacción MULTI/EXEC: los agregados no se pisan
+        key = self.namespace + key
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, value)
+            pipe.ltrim(key, -max_items, -1)
+            if ttl_seconds:
+                pipe.pexpire(key, max(1, int(ttl_seconds * 1000)))
+            await pipe.execute()
+
+    async def delete(self, key: str) -> bool:
+        return bool(await self._client.delete(self.namespace + key))
+
+    async def items(self, prefix: str) -> Dict[str, str]:
+        keys = [key async for key in self._client.scan_iter(match=f"{self.namespace}{prefix}*")]
+        if not keys:
+            return {}
+        values = await self._client.mget(keys)
+        start = len(self.namespace)
+        result = {}
+        for key, value in zip(keys, values):
+            if value is None:
+                continue
+            key = key.decode("utf-8") if isinstance(key, bytes) else key
+            result[key[start:]] = value.decode("utf-8") if isinstance(value, bytes) else value
+        return result
+
+    async def delete_prefix(self, prefix: str) -> int:
+        """Borra las claves de `prefix` recorriéndolas con SCAN, en lotes (nunca con KEYS)"""
+        deleted = 0
+        batch = []
+        async for key in self._client.scan_iter(match=f"{self.namespace}{prefix}*", count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                deleted += await self._client.delete(*batch)
+                batch = []
+        if batch:
+            deleted += await self._client.delete(*batch)
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "namespace": self.namespace}
+
+
+class SharedStateCache:
+    """Caché de respuestas sobre un almacén compartido, con la interfaz de `ResponseCache`.
+
+    Se usa como segundo nivel de `TieredCache` (CACHE_BACKEND=redis). El
+    vencimiento lo aplica el almacén; no hay límite de entradas propio (en
+    Redis se configura con `maxmemory-policy`).
+    """
+
+    def __init__(self, state: Any, ttl_seconds: float, prefix: str = "answers:"):
+        self._state = state
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = await self._state.get(self.prefix + key)
+        except STATE_ERRORS as e:
+            self.errors += 1
+            logger.warning("⚠️ Error al leer la caché compartida: %s", e)
+            return None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    async def aset(self, key: str, value: Dict[str, Any]) -> None:
+        try:
+            await self._state.set(self.prefix + key, json.dumps(value, ensure_ascii=False), self.ttl_seconds)
+        except STATE_ERRORS as e:
+            self.errors += 1
+            logger.warning("⚠️ Error al escribir la caché compartida: %s", e)
+
+    async def aclear(self) -> None:
+        """Borra solo las respuestas (`prefix`); las sesiones y métricas del almacén quedan"""
+        try:
+            await self._state.delete_prefix(self.prefix)
+        except STATE_ERRORS as e:
+            self.errors += 1
+            logger.warning("⚠️ Error al vaciar la caché compartida: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            **self._state.stats(),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+        }
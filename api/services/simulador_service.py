@@ -1,516 +1,1234 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 import asyncio
+import importlib.util
+import json
 import logging
+import math
+import os
+import re
+import socket
+import sqlite3
+import time
 from ..config.config import settings
-
-# Importar SDK de Google Generative AI
+from .kb_search import SearchHit, select_kb_hits, format_kb_answer
+from .kb_store import KnowledgeBase, directory_signature
+from .intent_router import IntentRouter, RouteDecision
+from .llm_providers import GeminiProvider, Generation, OpenAICompatibleProvider, SimulatorProvider
+from .model_router import LIGHT, STANDARD, KeyQuota, ModelRouter, PoolTarget, key_label
+from .passages import pack_context
+from .response_cache import ResponseCache, TieredCache, make_cache_key
+from .sqlite_cache import SQLiteCache
+from .shared_state import STATE_ERRORS, LocalState, RedisState, SharedStateCache, SQLiteState
+from .concurrency import ConcurrencyLimiter, UpstreamBusyError, UpstreamTimeoutError
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN
+from .single_flight import SingleFlight
+from .session_store import SessionStore, SharedSessionStore, trim_history
+from .prompts import CHAT_PROMPT, PROMPTS, RAG_PROMPT, PromptTemplate, chat_user_content, rag_user_content
+from .resilience import LatencyTracker, backoff_delay, hedged_call, is_retryable
+from .text_processing import normalize_text
+from .tracing import record_span, span
+from .metrics import (
+    CallbackMetric,
+    DEGRADED_RESPONSES,
+    INTENT_CONFIDENCE,
+    INTENT_DECISIONS,
+    RAG_RESPONSES,
+    UPSTREAM_ERRORS,
+    UPSTREAM_HEDGE_WINS,
+    UPSTREAM_HEDGES,
+    UPSTREAM_LATENCY,
+    UPSTREAM_RETRIES,
+    UPSTREAM_TOKENS,
+    render_prometheus,
+    snapshot,
+)
+from . import kb_embeddings
+
+# SDK de Google Generative AI: importarlo arrastra grpc y protobuf (casi un segundo), así que
+# solo se comprueba que esté instalado y se importa al usarlo por primera vez con una API key
+# (o en el precalentamiento, fuera del event loop)
 try:
-    import google.generativeai as genai
-    GENAI_AVAILABLE = True
-except ImportError:
+    GENAI_AVAILABLE = importlib.util.find_spec("google.generativeai") is not None
+except (ImportError, ValueError):
     GENAI_AVAILABLE = False
-    genai = None
+genai = None
 
 logger = logging.getLogger(__name__)
 
-# Configurar cliente de Gemini si la API key está disponible
-_gemini_model = None
+# Un proveedor por modo ("chat"/"rag"), cada uno con su instrucción de sistema
+_providers: Dict[str, Any] = {}
+_gemini_configured = False
+
+# Renovación (time.monotonic) del contexto cacheado de cada modo, si se usa (ver refresh_context_caches)
+_cached_context_expiry: Dict[str, float] = {}
+
+# Cuota de cada clave con cada modelo, compartida por los proveedores de chat y RAG
+_key_quotas: Dict[Tuple[str, str], KeyQuota] = {}
+# Clientes del SDK de las claves adicionales (genai.configure solo admite una clave global)
+_gemini_client_managers: Dict[str, Any] = {}
+# Versión del SDK con la que se verificaron los clientes internos que usa el pool (ver check_gemini_sdk)
+GENAI_POOL_SDK_VERSION = "0.8.6"
+
+
+def _project_path(path: str) -> str:
+    """Rutas de la configuración: si son relativas, respecto de la raíz del proyecto"""
+    if os.path.isabs(path):
+        return path
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), path)
+
+
+def _build_shared_state(backend: str):
+    """Almacén compartido entre workers según `backend` ("local", "sqlite" o "redis")"""
+    try:
+        if backend == "sqlite":
+            return SQLiteState(_project_path(settings.SHARED_STATE_SQLITE_PATH))
+        if backend == "redis":
+            if not settings.REDIS_URL:
+                raise RuntimeError("falta REDIS_URL")
+            return RedisState.from_url(settings.REDIS_URL)
+    except (RuntimeError, sqlite3.Error, OSError) as e:
+        logger.error("❌ No se pudo crear el estado compartido '%s', se usa memoria local: %s", backend, e)
+    return LocalState()
+
+
+# Estado compartido entre workers (sesiones de chat y métricas)
+_shared_state = _build_shared_state(settings.SHARED_STATE_BACKEND)
+
+# Segundo nivel de caché compartido por chat y RAG (las claves incluyen la versión del prompt)
+_shared_answer_cache: Optional[Any] = None
+
+
+def _build_answer_cache(max_entries: int, ttl_seconds: float):
+    """Caché en memoria o, con `CACHE_BACKEND=sqlite|redis`, L1 en memoria + L2 compartido"""
+    global _shared_answer_cache
+    memory = ResponseCache(max_entries, ttl_seconds)
+    if settings.CACHE_BACKEND == "redis":
+        if _shared_answer_cache is None:
+            state = _shared_state if _shared_state.name == "redis" else _build_shared_state("redis")
+            if state.name != "redis":
+                return memory
+            _shared_answer_cache = SharedStateCache(state, settings.CACHE_SQLITE_TTL_SECONDS)
+        return TieredCache(memory, _shared_answer_cache)
+    if settings.CACHE_BACKEND != "sqlite":
+        return memory
+    try:
+        if _shared_answer_cache is None:
+            _shared_answer_cache = SQLiteCache(
+                _project_path(settings.CACHE_SQLITE_PATH), settings.CACHE_SQLITE_MAX_ENTRIES, settings.CACHE_SQLITE_TTL_SECONDS
+            )
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(
+            "⚠️ No se pudo abrir la caché SQLite (%s), se usa solo memoria: %s", settings.CACHE_SQLITE_PATH, e
+        )
+        return memory
+    return TieredCache(memory, _shared_answer_cache)
+
+
+# Caché de respuestas de RAG (las preguntas del curso se repiten mucho) y del chat sin sesión
+_rag_cache = _build_answer_cache(settings.RAG_CACHE_MAX_ENTRIES, settings.RAG_CACHE_TTL_SECONDS)
+_chat_cache = _build_answer_cache(settings.CHAT_CACHE_MAX_ENTRIES, settings.CHAT_CACHE_TTL_SECONDS)
+
+# Límite de llamadas simultáneas a Gemini, con cola acotada en tiempo. Es un límite global:
+# con varios workers cada uno toma su parte
+_upstream_limiter = ConcurrencyLimiter(
+    max(1, math.ceil(settings.GEMINI_MAX_CONCURRENCY / max(1, settings.WORKERS))), settings.GEMINI_QUEUE_TIMEOUT_SECONDS
+)
+
+# Consultas idénticas simultáneas (p. ej. toda una clase escribiendo el mismo ejemplo)
+# comparten una sola llamada a Gemini
+_single_flight = SingleFlight()
+
+# Historial de las sesiones de chat (preguntas de seguimiento); con varios workers, en el
+# estado compartido para que cualquier worker continúe la conversación
+if _shared_state.name == "local":
+    _sessions: Any = SessionStore(
+        settings.CHAT_SESSION_MAX_SESSIONS, settings.CHAT_SESSION_MAX_TURNS, settings.CHAT_SESSION_IDLE_SECONDS
+    )
+else:
+    _sessions = SharedSessionStore(_shared_state, settings.CHAT_SESSION_MAX_TURNS, settings.CHAT_SESSION_IDLE_SECONDS)
+
+# Circuit breaker: si Gemini falla o está lento, se deja de llamarlo por un tiempo
+_breaker = CircuitBreaker(
+    window_size=settings.BREAKER_WINDOW_SIZE,
+    min_calls=settings.BREAKER_MIN_CALLS,
+    error_rate_threshold=settings.BREAKER_ERROR_RATE,
+    slow_call_seconds=settings.BREAKER_SLOW_CALL_SECONDS,
+    slow_call_rate_threshold=settings.BREAKER_SLOW_CALL_RATE,
+    open_seconds=settings.BREAKER_OPEN_SECONDS,
+    half_open_max_calls=settings.BREAKER_HALF_OPEN_CALLS,
+    # Una llamada de prueba no dura más que el plazo total de una solicitud
+    probe_timeout=settings.GEMINI_REQUEST_DEADLINE_SECONDS,
+)
+
+# Latencias recientes de Gemini para calcular el retardo del hedge
+_upstream_latencies = LatencyTracker()
+
+# Pool propio para modelos sin API asíncrona (no compite con el executor por defecto)
+_upstream_executor: Optional[ThreadPoolExecutor] = None
+
+# Métricas que se leen de los componentes al exponer /metrics
+CallbackMetric("simulador_upstream_in_flight", "Llamadas a Gemini en curso", "gauge", lambda: _upstream_limiter.in_flight)
+CallbackMetric("simulador_upstream_queue_depth", "Solicitudes esperando lugar para llamar a Gemini", "gauge", lambda: _upstream_limiter.waiting)
+CallbackMetric("simulador_upstream_rejected_total", "Solicitudes rechazadas por cola llena (503)", "counter", lambda: _upstream_limiter.rejected)
+CallbackMetric("simulador_upstream_queue_wait_seconds_total", "Tiempo total de espera en la cola del limitador", "counter", lambda: _upstream_limiter.wait_seconds_total)
+CallbackMetric("simulador_rag_cache_hits_total", "Aciertos de la caché de RAG", "counter", lambda: _rag_cache.hits)
+CallbackMetric("simulador_rag_cache_misses_total", "Fallos de la caché de RAG", "counter", lambda: _rag_cache.misses)
+CallbackMetric("simulador_chat_cache_hits_total", "Aciertos de la caché de chat", "counter", lambda: _chat_cache.hits)
+CallbackMetric("simulador_chat_cache_misses_total", "Fallos de la caché de chat", "counter", lambda: _chat_cache.misses)
+CallbackMetric(
+    "simulador_circuit_breaker_state", "Estado del circuit breaker (0 cerrado, 1 semiabierto, 2 abierto)", "gauge",
+    lambda: 0 if _breaker.state == CLOSED else 1 if _breaker.state == HALF_OPEN else 2,
+)
+CallbackMetric("simulador_circuit_breaker_rejected_total", "Llamadas evitadas con el circuito abierto", "counter", lambda: _breaker.rejected)
+CallbackMetric("simulador_chat_sessions", "Sesiones de chat activas en memoria", "gauge", lambda: _sessions.stats().get("sessions", 0))
+CallbackMetric(
+    "simulador_kb_documents", "Documentos en la base de conocimiento", "gauge",
+    lambda: len(_kb.documents) if _kb else 0, aggregate="max",
+)
+CallbackMetric("simulador_single_flight_coalesced_total", "Consultas que compartieron una llamada en curso", "counter", lambda: _single_flight.coalesced)
+
+def _load_genai() -> Any:
+    """Importa el SDK de Gemini la primera vez y lo devuelve (None si no se pudo)"""
+    global genai, GENAI_AVAILABLE
+    if genai is None and GENAI_AVAILABLE:
+        started = time.perf_counter()
+        try:
+            genai = importlib.import_module("google.generativeai")
+        except ImportError as e:
+            logger.warning("⚠️ No se pudo importar google-generativeai: %s", e)
+            GENAI_AVAILABLE = False
+            return None
+        logger.info("📦 SDK de Gemini importado en %.2fs", time.perf_counter() - started)
+    return genai
+
+
+def gemini_key_pool() -> List[str]:
+    """Claves de Gemini: GEMINI_API_KEY y las de GEMINI_API_KEYS, sin repetir"""
+    keys = [settings.GEMINI_API_KEY, *(settings.GEMINI_API_KEYS or "").split(",")]
+    return list(dict.fromkeys(key.strip() for key in keys if key and key.strip()))
+
+
+def _configure_genai() -> Any:
+    """SDK de Gemini importado y configurado con la primera clave, o None si no se puede usar"""
+    global _gemini_configured
 
-def _initialize_gemini():
-    """Inicializa el modelo de Gemini si no está configurado"""
-    global _gemini_model
-    
     if not GENAI_AVAILABLE:
         logger.warning("google-generativeai no está instalado. Usando modo simulación.")
         return None
-    
-    if not settings.GEMINI_API_KEY:
+
+    keys = gemini_key_pool()
+    if not keys:
         logger.info("GEMINI_API_KEY no configurada. Usando modo simulación.")
         return None
-    
-    if _gemini_model is None:
+
+    if _load_genai() is None:
+        return None
+    if not _gemini_configured:
+        genai.configure(api_key=keys[0])
+        _gemini_configured = True
+    return genai
+
+
+def _uses_model_router() -> bool:
+    """Varias claves, modelo ligero o límites por clave: las llamadas pasan por `ModelRouter`"""
+    return (
+        len(gemini_key_pool()) > 1
+        or bool(settings.GEMINI_LIGHT_MODEL)
+        or settings.GEMINI_KEY_RPM > 0
+        or settings.GEMINI_KEY_TPM > 0
+    )
+
+
+def check_gemini_sdk() -> None:
+    """Con varias claves de Gemini, verifica al iniciar que el SDK tenga los clientes internos que usa el pool.
+
+    `_gemini_client_manager` y `GeminiProvider._bind_client` usan
+    `client._ClientManager` y los atributos `_client`/`_async_client` del
+    modelo, que no son API pública del SDK: se verificaron con
+    google-generativeai `GENAI_POOL_SDK_VERSION` (fijada en requirements.txt).
+    Con otra versión que no los tenga se falla al iniciar, no en cada solicitud.
+    """
+    if settings.LLM_PROVIDER != "gemini" or len(gemini_key_pool()) < 2 or _load_genai() is None:
+        return
+    from google.generativeai import client as genai_client
+
+    version = getattr(genai, "__version__", "desconocida")
+    manager_class = getattr(genai_client, "_ClientManager", None)
+    model = genai.GenerativeModel(settings.GEMINI_MODEL)
+    missing = [
+        name
+        for name, present in (
+            ("client._ClientManager", all(hasattr(manager_class, attr) for attr in ("configure", "make_client"))),
+            ("GenerativeModel._client", hasattr(model, "_client")),
+            ("GenerativeModel._async_client", hasattr(model, "_async_client")),
+        )
+        if not present
+    ]
+    if missing:
+        raise RuntimeError(
+            f"GEMINI_API_KEYS necesita google-generativeai=={GENAI_POOL_SDK_VERSION}: la versión instalada "
+            f"({version}) no tiene {', '.join(missing)}. Instalar la versión de requirements.txt o usar una sola clave."
+        )
+    if version != GENAI_POOL_SDK_VERSION:
+        logger.warning(
+            "⚠️ El pool de claves se probó con google-generativeai %s y está instalada la %s",
+            GENAI_POOL_SDK_VERSION, version,
+        )
+
+
+def _gemini_client_manager(api_key: str) -> Any:
+    """Clientes del SDK configurados con `api_key` (se crean al primer uso de cada modelo)"""
+    manager = _gemini_client_managers.get(api_key)
+    if manager is None:
+        from google.generativeai import client as genai_client
+
+        manager = genai_client._ClientManager()
+        manager.configure(api_key=api_key)
+        _gemini_client_managers[api_key] = manager
+    return manager
+
+
+def _per_worker(limit: int) -> int:
+    """Parte de un límite por minuto que le toca a cada worker (0 = sin límite)"""
+    return max(1, limit // max(1, settings.WORKERS)) if limit > 0 else 0
+
+
+def _create_model_router(template: PromptTemplate) -> ModelRouter:
+    """Un `GeminiProvider` por clave y modelo (estándar y, si hay, ligero) detrás de un `ModelRouter`.
+
+    Sin contexto cacheado: cada clave tendría que subir y renovar el suyo.
+    """
+    tiers = [(STANDARD, settings.GEMINI_MODEL, settings.GEMINI_KEY_RPM, settings.GEMINI_KEY_TPM)]
+    if settings.GEMINI_LIGHT_MODEL:
+        tiers.append(
+            (LIGHT, settings.GEMINI_LIGHT_MODEL, settings.GEMINI_LIGHT_KEY_RPM, settings.GEMINI_LIGHT_KEY_TPM)
+        )
+
+    targets = []
+    for position, api_key in enumerate(gemini_key_pool()):
+        label = key_label(api_key)
+        # La primera clave es la global; las demás usan clientes propios
+        client_manager = _gemini_client_manager(api_key) if position else None
+        for tier, model_name, rpm, tpm in tiers:
+            quota = _key_quotas.get((label, model_name))
+            if quota is None:
+                quota = _key_quotas[(label, model_name)] = KeyQuota(label, model_name, _per_worker(rpm), _per_worker(tpm))
+            model = genai.GenerativeModel(model_name, system_instruction=template.system_instruction)
+            provider = GeminiProvider(model, model_name, _get_upstream_executor(), client_manager)
+            targets.append(PoolTarget(tier, quota, provider))
+
+    logger.info("🔀 %s combinaciones de clave y modelo para %s", len(targets), template.mode)
+    return ModelRouter(
+        targets,
+        light_max_prompt_tokens=settings.GEMINI_LIGHT_MAX_PROMPT_TOKENS,
+        cooldown_seconds=settings.GEMINI_KEY_COOLDOWN_SECONDS,
+        wait_timeout=settings.GEMINI_QUEUE_TIMEOUT_SECONDS,
+    )
+
+
+def configured_model() -> str:
+    """Modelo del proveedor configurado (se informa en las respuestas y forma parte de las claves de caché)"""
+    if settings.LLM_PROVIDER == "openai":
+        return settings.OPENAI_MODEL
+    if settings.LLM_PROVIDER == "simulator":
+        return "simulator"
+    return settings.GEMINI_MODEL
+
+
+def _create_provider(template: PromptTemplate) -> Any:
+    """Proveedor de LLM_PROVIDER para la plantilla, o None si no está disponible (modo simulación)"""
+    if settings.LLM_PROVIDER == "simulator":
+        return SimulatorProvider(
+            median_latency=settings.SIMULATOR_LATENCY_MEDIAN_SECONDS,
+            sigma=settings.SIMULATOR_LATENCY_SIGMA,
+            tokens_per_second=settings.SIMULATOR_TOKENS_PER_SECOND,
+            error_rate=settings.SIMULATOR_ERROR_RATE,
+            reply_tokens=settings.SIMULATOR_REPLY_TOKENS,
+            seed=settings.SIMULATOR_SEED,
+        )
+    if settings.LLM_PROVIDER == "openai":
+        return OpenAICompatibleProvider(
+            settings.OPENAI_BASE_URL,
+            settings.OPENAI_MODEL,
+            system_instruction=template.system_instruction,
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.GEMINI_CALL_TIMEOUT_SECONDS,
+        )
+    if _configure_genai() is None:
+        return None
+    if _uses_model_router():
+        return _create_model_router(template)
+    return GeminiProvider(_create_gemini_model(template), settings.GEMINI_MODEL, _get_upstream_executor())
+
+
+def _get_provider(mode: str = "chat") -> Any:
+    """Devuelve el proveedor del modo ("chat"/"rag"), creándolo la primera vez"""
+    provider = _providers.get(mode)
+    if provider is not None:
+        return provider
+
+    try:
+        provider = _create_provider(PROMPTS[mode])
+    except Exception as e:
+        logger.error("❌ Error al inicializar el proveedor %s: %s", settings.LLM_PROVIDER, e)
+        return None
+    if provider is not None:
+        _providers[mode] = provider
+        logger.info("✅ Proveedor %s inicializado con modelo: %s (%s)", provider.name, provider.model_name, mode)
+    return provider
+
+
+def _create_gemini_model(template: PromptTemplate) -> Any:
+    """Modelo con la instrucción de sistema de la plantilla (sin llamadas de red)"""
+    return genai.GenerativeModel(settings.GEMINI_MODEL, system_instruction=template.system_instruction)
+
+
+def _create_cached_gemini_model(template: PromptTemplate) -> Any:
+    """Modelo que usa la instrucción de la plantilla subida como contexto cacheado, o None si Gemini lo rechaza.
+
+    `CachedContent.create` es una llamada de red bloqueante: se ejecuta en un
+    hilo desde `refresh_context_caches`, nunca al atender una solicitud. Si
+    Gemini lo rechaza (p. ej. el prefijo es más corto que el mínimo
+    cacheable) se sigue usando `system_instruction` normal.
+    """
+    try:
+        cached = genai.caching.CachedContent.create(
+            model=settings.GEMINI_MODEL,
+            display_name=f"simulador-{template.version}",
+            system_instruction=template.system_instruction,
+            ttl=timedelta(seconds=settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS),
+        )
+    except Exception as e:
+        logger.warning("⚠️ No se pudo cachear el contexto de %s, se usa system_instruction: %s", template.mode, e)
+        return None
+    logger.info("🗄️ Contexto cacheado creado para %s (%s)", template.mode, template.version)
+    return genai.GenerativeModel.from_cached_content(cached)
+
+
+async def refresh_context_caches() -> None:
+    """Crea el contexto cacheado de cada modo y lo renueva antes de que venza (GEMINI_CONTEXT_CACHE_ENABLED).
+
+    Corre en segundo plano desde el inicio de la app: mientras el contexto
+    no está listo, o si Gemini lo rechaza, los modos usan el modelo con
+    `system_instruction` normal. Un rechazo se vuelve a intentar en la
+    siguiente renovación.
+    """
+    refresh_after = settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS * 0.9
+    next_attempt: Dict[str, float] = {}
+    while True:
+        for mode, template in PROMPTS.items():
+            provider = _get_provider(mode)
+            # Solo el proveedor de Gemini con una clave (el pool de claves no cachea el contexto)
+            if not isinstance(provider, GeminiProvider) or time.monotonic() < next_attempt.get(mode, 0.0):
+                continue
+            model = await asyncio.to_thread(_create_cached_gemini_model, template)
+            next_attempt[mode] = time.monotonic() + refresh_after
+            if model is not None:
+                _cached_context_expiry[mode] = next_attempt[mode]
+                _providers[mode] = GeminiProvider(model, settings.GEMINI_MODEL, _get_upstream_executor())
+            elif _cached_context_expiry.pop(mode, None) is not None:
+                # El contexto anterior está por vencer: volver a la instrucción normal
+                _providers[mode] = GeminiProvider(_create_gemini_model(template), settings.GEMINI_MODEL, _get_upstream_executor())
+        wait = min(next_attempt.values(), default=time.monotonic() + refresh_after) - time.monotonic()
+        await asyncio.sleep(max(1.0, wait))
+
+
+async def _session_history(session_id: Optional[str]) -> Optional[str]:
+    """Historial de la sesión recortado a `CHAT_HISTORY_TOKEN_BUDGET`, listo para el prompt"""
+    if not session_id or not settings.CHAT_SESSIONS_ENABLED:
+        return None
+    with span("session_read"):
+        stored = await _sessions.ahistory(session_id)
+    summary, turns = trim_history(stored, settings.CHAT_HISTORY_TOKEN_BUDGET)
+    lines = [f"(Temas anteriores: {summary})"] if summary else []
+    for turn in turns:
+        lines.append(f"Usuario: {turn.user}")
+        lines.append(f"Asistente: {turn.assistant}")
+    return "\n".join(lines) or None
+
+
+async def _remember_turn(session_id: Optional[str], prompt: str, reply: str) -> None:
+    if session_id and settings.CHAT_SESSIONS_ENABLED:
+        with span("session_write"):
+            await _sessions.aappend(session_id, prompt, reply)
+
+
+def _simulated_chat_reply(prompt: str) -> str:
+    """Respuesta fija del modo simulación (sin API key o SDK no disponible)"""
+    return (
+        f"¡Hola! Soy el simulador de ChatGPT. Has preguntado: '{prompt[:200]}'\n\n"
+        "Este es un espacio de práctica donde puedes hacer cualquier pregunta o solicitud. "
+        "Puedes pedirme que te ayude a escribir textos, explicarte conceptos, darte ideas, "
+        "o cualquier otra cosa que se te ocurra.\n\n"
+        "💡 Consejo: Formula preguntas claras y específicas. Puedes hacer preguntas de seguimiento "
+        "para profundizar en cualquier tema.\n\n"
+        "📝 Nota: Estás en modo simulación. Para usar respuestas reales de IA, "
+        "configura GEMINI_API_KEY en el archivo .env"
+    )
+
+
+def _degraded_chat_reply(prompt: str) -> str:
+    """Respuesta local mientras Gemini no está disponible (circuito abierto)"""
+    return (
+        f"Recibí tu mensaje: '{prompt[:200]}'\n\n"
+        "⚠️ En este momento el servicio de inteligencia artificial no está respondiendo, "
+        "así que no puedo darte una respuesta completa. No es un problema de tu pregunta "
+        "ni de tu equipo.\n\n"
+        "💡 Mientras tanto, puedes revisar cómo escribiste tu pregunta o intentarlo de nuevo "
+        "en unos minutos."
+    )
+
+
+def _get_upstream_executor() -> ThreadPoolExecutor:
+    global _upstream_executor
+    if _upstream_executor is None:
+        _upstream_executor = ThreadPoolExecutor(
+            max_workers=settings.GEMINI_MAX_CONCURRENCY,
+            thread_name_prefix="gemini",
+        )
+    return _upstream_executor
+
+
+def _record_usage(mode: str, usage: Optional[Dict[str, int]]) -> None:
+    if usage:
+        UPSTREAM_TOKENS.labels(mode, "prompt").inc(usage["prompt_tokens"] or 0)
+        UPSTREAM_TOKENS.labels(mode, "candidates").inc(usage["candidates_tokens"] or 0)
+
+
+def _check_breaker() -> None:
+    """Lanza `CircuitOpenError` si el circuito no permite llamar al modelo"""
+    if settings.BREAKER_ENABLED and not _breaker.allow():
+        raise CircuitOpenError("Gemini no está disponible en este momento")
+
+
+def _record_breaker(outcome: str, duration: float = 0.0) -> None:
+    if not settings.BREAKER_ENABLED:
+        return
+    if outcome == "success":
+        _breaker.record_success(duration)
+    elif outcome == "failure":
+        _breaker.record_failure()
+    else:
+        _breaker.record_ignored()
+
+
+async def _upstream_call(provider: Any, prompt: str, mode: str, timeout: float) -> Generation:
+    """Una llamada al proveedor con circuit breaker, límite de concurrencia y plazo.
+
+    Puede lanzar `CircuitOpenError` (sin esperar), `UpstreamBusyError` (cola
+    llena) o `UpstreamTimeoutError` (plazo vencido). Registra latencia,
+    errores y tokens en las métricas de `mode` ("chat"/"rag").
+    """
+    _check_breaker()
+    queued = time.perf_counter()
+    try:
+        async with _upstream_limiter.slot():
+            started = time.perf_counter()
+            record_span("queue", started - queued)
+            try:
+                with span("upstream"):
+                    response = await asyncio.wait_for(provider.generate(prompt), timeout=timeout)
+            except asyncio.TimeoutError:
+                raise UpstreamTimeoutError(f"Gemini no respondió en {timeout:.3g} segundos")
+            elapsed = time.perf_counter() - started
+    except UpstreamBusyError as e:
+        UPSTREAM_ERRORS.labels(mode, type(e).__name__).inc()
+        _record_breaker("ignored")
+        raise
+    except asyncio.CancelledError:
+        # Perdió contra el hedge o se canceló la solicitud: no dice nada de la salud de Gemini
+        _record_breaker("ignored")
+        raise
+    except Exception as e:
+        UPSTREAM_ERRORS.labels(mode, type(e).__name__).inc()
+        _record_breaker("failure")
+        raise
+
+    _record_breaker("success", elapsed)
+    _upstream_latencies.add(elapsed)
+    UPSTREAM_LATENCY.labels(mode).observe(elapsed)
+    _record_usage(mode, response.usage)
+    return response
+
+
+def _hedge_delay() -> Optional[float]:
+    """Segundos a esperar antes del hedge, o None si no corresponde hacerlo"""
+    if not settings.GEMINI_HEDGE_ENABLED:
+        return None
+    delay = _upstream_latencies.percentile(settings.GEMINI_HEDGE_PERCENTILE)
+    if delay is None:
+        return None
+    return max(delay, settings.GEMINI_HEDGE_MIN_DELAY_SECONDS)
+
+
+async def _generate(provider: Any, prompt: str, mode: str) -> Generation:
+    """Llama al proveedor con reintentos acotados y, opcionalmente, hedging.
+
+    Los errores transitorios se reintentan con
+    backoff y jitter mientras quede tiempo dentro de
+    `GEMINI_REQUEST_DEADLINE_SECONDS`. Con hedging activo, si la llamada tarda
+    más que el percentil configurado se lanza una copia (solo con el circuito
+    cerrado y lugar libre en el limitador) y gana la primera en responder.
+    """
+    deadline = time.monotonic() + settings.GEMINI_REQUEST_DEADLINE_SECONDS
+
+    def should_hedge() -> bool:
+        if _breaker.state != CLOSED or _upstream_limiter.in_flight >= _upstream_limiter.max_concurrency:
+            return False
+        UPSTREAM_HEDGES.labels(mode).inc()
+        return True
+
+    attempt = 0
+    while True:
+        timeout = min(settings.GEMINI_CALL_TIMEOUT_SECONDS, deadline - time.monotonic())
         try:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            _gemini_model = genai.GenerativeModel(settings.GEMINI_MODEL)
-            logger.info(f"✅ Cliente Gemini inicializado con modelo: {settings.GEMINI_MODEL}")
+            response, hedge_won = await hedged_call(
+                lambda: _upstream_call(provider, prompt, mode, timeout), _hedge_delay(), should_hedge
+            )
         except Exception as e:
-            logger.error(f"❌ Error al inicializar Gemini: {e}")
-            return None
-    
-    return _gemini_model
+            if attempt >= settings.GEMINI_MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, settings.GEMINI_RETRY_BACKOFF_SECONDS, settings.GEMINI_RETRY_BACKOFF_MAX_SECONDS)
+            if time.monotonic() + delay >= deadline:
+                raise
+            attempt += 1
+            UPSTREAM_RETRIES.labels(mode).inc()
+            logger.warning(
+                "🔁 Reintento %s/%s de Gemini (%s) en %.2fs: %s",
+                attempt, settings.GEMINI_MAX_RETRIES, mode, delay, type(e).__name__,
+            )
+            with span("retry_backoff"):
+                await asyncio.sleep(delay)
+            continue
 
+        if hedge_won:
+            UPSTREAM_HEDGE_WINS.labels(mode).inc()
+        return response
 
-async def chat_simulate(prompt: str) -> Dict[str, Any]:
+
+async def _stream_generate(provider: Any, prompt: str, mode: str) -> AsyncIterator[Generation]:
+    """Genera en streaming y entrega cada fragmento apenas llega.
+
+    El lugar en el limitador se mantiene mientras dure el stream. El plazo
+    `GEMINI_CALL_TIMEOUT_SECONDS` aplica al stream completo.
+    Registra las métricas bajo "<mode>_stream".
+    """
+    metric_mode = f"{mode}_stream"
+    _check_breaker()
+    last_chunk = None
+    queued = time.perf_counter()
+    try:
+        async with _upstream_limiter.slot():
+            started = time.perf_counter()
+            record_span("queue", started - queued)
+            deadline = started + settings.GEMINI_CALL_TIMEOUT_SECONDS
+            chunks = provider.stream(prompt).__aiter__()
+            try:
+                while True:
+                    remaining = deadline - time.perf_counter()
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(remaining, 0))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise UpstreamTimeoutError(
+                            f"Gemini no completó la respuesta en {settings.GEMINI_CALL_TIMEOUT_SECONDS:g} segundos"
+                        )
+                    last_chunk = chunk
+                    yield chunk
+            finally:
+                await chunks.aclose()
+            elapsed = time.perf_counter() - started
+    except UpstreamBusyError as e:
+        UPSTREAM_ERRORS.labels(metric_mode, type(e).__name__).inc()
+        _record_breaker("ignored")
+        raise
+    except (GeneratorExit, asyncio.CancelledError):
+        # El cliente cortó el stream o se canceló la solicitud: no es un resultado del modelo
+        _record_breaker("ignored")
+        raise
+    except Exception as e:
+        UPSTREAM_ERRORS.labels(metric_mode, type(e).__name__).inc()
+        _record_breaker("failure")
+        raise
+
+    _record_breaker("success", elapsed)
+    record_span("upstream", elapsed)
+    UPSTREAM_LATENCY.labels(metric_mode).observe(elapsed)
+    _record_usage(metric_mode, last_chunk.usage if last_chunk else None)
+
+
+async def _stream_simulated_text(text: str, delay: float = 0.02) -> AsyncIterator[str]:
+    """Entrega un texto palabra por palabra, imitando la generación de un modelo"""
+    words = text.split(" ")
+    for position, word in enumerate(words):
+        await asyncio.sleep(delay)
+        yield word if position == len(words) - 1 else f"{word} "
+
+
+async def chat_simulate(prompt: str, session_id: Optional[str] = None) -> Dict[str, Any]:
     """Simula el envío de un prompt a Gemini.
     Si GEMINI_API_KEY está configurado, realiza la llamada real a la API.
     Si no, devuelve una respuesta simulada para propósitos de capacitación.
+    Con `session_id` se incluye la conversación previa y se guarda el intercambio.
     """
     if not prompt or not prompt.strip():
         return {"error": "El prompt está vacío"}
 
-    # Intentar usar Gemini real si está configurado
-    model = _initialize_gemini()
+    history = await _session_history(session_id)
+    session = {"session_id": session_id} if session_id and settings.CHAT_SESSIONS_ENABLED else {}
+
+    # Intentar usar el proveedor configurado (Gemini real si hay API key)
+    provider = _get_provider("chat")
     
-    if model is not None:
+    # Solo se cachean las consultas sin historial: con sesión la respuesta depende del contexto
+    cache_key = None
+    if provider is not None and history is None and settings.CHAT_CACHE_ENABLED:
+        cache_key = make_cache_key(prompt, configured_model(), CHAT_PROMPT.version)
+        with span("cache"):
+            cached = await _chat_cache.aget(cache_key)
+        if cached is not None:
+            await _remember_turn(session_id, prompt, cached["reply"])
+            return {**cached, "cached": True, **session}
+    
+    if provider is not None:
         try:
-            # Llamada real a Gemini API con instrucciones para respuestas breves
-            logger.info(f"Enviando prompt a Gemini: {prompt[:50]}...")
-            
-            # Agregar instrucciones de sistema para respuestas breves
-            # El chat es para PRÁCTICA LIBRE, puede hablar de cualquier tema
-            enhanced_prompt = f"""Eres un asistente amigable y útil. Puedes ayudar con cualquier tema que el usuario necesite.
-
-IMPORTANTE: 
-- Da respuestas BREVES y CLARAS (máximo 3-4 párrafos)
-- Usa lenguaje SIMPLE y accesible
-- Si explicas conceptos técnicos, usa ejemplos cotidianos
-- Sé paciente y alentador
-
-Pregunta del usuario:
-{prompt}"""
+            # Las instrucciones viajan como system_instruction: solo se envía el texto del usuario
+            logger.info("Enviando prompt a Gemini: %s...", prompt[:50])
+            enhanced_prompt = chat_user_content(prompt, history)
             
-            # Generar respuesta de forma asíncrona
-            response = await asyncio.to_thread(
-                lambda: model.generate_content(enhanced_prompt)
-            )
+            # Generar respuesta de forma asíncrona; prompts iguales en curso (sin historial)
+            # comparten la llamada
+            with span("generate"):
+                if settings.SINGLE_FLIGHT_ENABLED and history is None:
+                    flight_key = f"chat:{configured_model()}:{CHAT_PROMPT.version}:{normalize_text(prompt)}"
+                    response = await _single_flight.do(flight_key, lambda: _generate(provider, enhanced_prompt, "chat"))
+                else:
+                    response = await _generate(provider, enhanced_prompt, "chat")
             
-            reply = response.text if hasattr(response, 'text') else str(response)
+            reply = response.text
             
             logger.info("✅ Respuesta recibida de Gemini")
+            await _remember_turn(session_id, prompt, reply)
             
-            # Extraer metadatos de uso de forma segura
-            tokens_info = None
-            if hasattr(response, 'usage_metadata'):
-                try:
-                    usage = response.usage_metadata
-                    tokens_info = {
-                        "prompt_tokens": getattr(usage, 'prompt_token_count', 0),
-                        "candidates_tokens": getattr(usage, 'candidates_token_count', 0),
-                        "total_tokens": getattr(usage, 'total_token_count', 0)
-                    }
-                except Exception as e:
-                    logger.warning(f"No se pudo extraer usage_metadata: {e}")
-            
-            return {
-                "model": settings.GEMINI_MODEL,
+            result = {
+                "model": response.model or configured_model(),
                 "reply": reply,
-                "is_simulated": False,
-                "tokens_used": tokens_info
+                "is_simulated": provider.simulated,
+                "tokens_used": response.usage,
             }
+            if cache_key is not None:
+                with span("cache_store"):
+                    await _chat_cache.aset(cache_key, result)
+                result["cached"] = False
+            return {**result, **session}
             
+        except UpstreamBusyError as e:
+            logger.warning("⏳ Gemini saturado, se rechaza la consulta: %s", e)
+            return {"error": str(e), "status_code": 503}
+        except CircuitOpenError:
+            DEGRADED_RESPONSES.labels("chat").inc()
+            return {
+                "model": configured_model(),
+                "reply": _degraded_chat_reply(prompt),
+                "is_simulated": True,
+                "degraded": True,
+                **session,
+            }
         except Exception as e:
-            logger.error(f"❌ Error al llamar a Gemini API: {e}")
+            logger.error("❌ Error al llamar a Gemini API: %s", e)
             # Fallback a modo simulación en caso de error
             return {
                 "error": f"Error al conectar con Gemini: {str(e)}",
-                "model": settings.GEMINI_MODEL,
+                "model": configured_model(),
                 "is_simulated": True
             }
     
     # Modo simulación - Sin API key o SDK no disponible
     await asyncio.sleep(0.05)  # Simular latencia de red
-    
-    reply = (
-        f"¡Hola! Soy el simulador de ChatGPT. Has preguntado: '{prompt[:200]}'\n\n"
-        "Este es un espacio de práctica donde puedes hacer cualquier pregunta o solicitud. "
-        "Puedes pedirme que te ayude a escribir textos, explicarte conceptos, darte ideas, "
-        "o cualquier otra cosa que se te ocurra.\n\n"
-        "💡 Consejo: Formula preguntas claras y específicas. Puedes hacer preguntas de seguimiento "
-        "para profundizar en cualquier tema.\n\n"
-        "📝 Nota: Estás en modo simulación. Para usar respuestas reales de IA, "
-        "configura GEMINI_API_KEY en el archivo .env"
-    )
+    reply = _simulated_chat_reply(prompt)
+    await _remember_turn(session_id, prompt, reply)
     
     return {
-        "model": settings.GEMINI_MODEL,
+        "model": configured_model(),
         "reply": reply,
-        "is_simulated": True
+        "is_simulated": True,
+        **session,
+    }
+
+
+async def chat_simulate_stream(prompt: str, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Versión en streaming de `chat_simulate`.
+
+    Produce eventos `{"event": ..., "data": ...}`: un "chunk" por cada fragmento
+    de texto y un "done" final con `tokens_used`. Ante un error produce un
+    único evento "error". Con `session_id`, el intercambio se guarda al terminar.
+    """
+    if not prompt or not prompt.strip():
+        yield {"event": "error", "data": {"error": "El prompt está vacío"}}
+        return
+
+    provider = _get_provider("chat")
+    history = await _session_history(session_id)
+    session = {"session_id": session_id} if session_id and settings.CHAT_SESSIONS_ENABLED else {}
+
+    if provider is not None:
+        logger.info("Enviando prompt a Gemini (streaming): %s...", prompt[:50])
+        last_chunk = None
+        parts: List[str] = []
+        try:
+            async for chunk in _stream_generate(provider, chat_user_content(prompt, history), "chat"):
+                last_chunk = chunk
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield {"event": "chunk", "data": {"text": chunk.text}}
+        except UpstreamBusyError as e:
+            yield {"event": "error", "data": {"error": str(e), "status_code": 503}}
+            return
+        except CircuitOpenError:
+            DEGRADED_RESPONSES.labels("chat_stream").inc()
+            async for text in _stream_simulated_text(_degraded_chat_reply(prompt), delay=0):
+                yield {"event": "chunk", "data": {"text": text}}
+            yield {
+                "event": "done",
+                "data": {
+                    "model": configured_model(), "is_simulated": True, "degraded": True, "tokens_used": None, **session,
+                },
+            }
+            return
+        except Exception as e:
+            logger.error("❌ Error al llamar a Gemini API en streaming: %s", e)
+            yield {"event": "error", "data": {"error": f"Error al conectar con Gemini: {str(e)}"}}
+            return
+
+        logger.info("✅ Streaming de Gemini completado")
+        await _remember_turn(session_id, prompt, "".join(parts))
+        yield {
+            "event": "done",
+            "data": {
+                "model": (last_chunk.model if last_chunk else None) or configured_model(),
+                "is_simulated": provider.simulated,
+                "tokens_used": last_chunk.usage if last_chunk else None,
+                **session,
+            },
+        }
+        return
+
+    # Modo simulación: la respuesta fija se envía palabra por palabra
+    reply = _simulated_chat_reply(prompt)
+    async for text in _stream_simulated_text(reply):
+        yield {"event": "chunk", "data": {"text": text}}
+    await _remember_turn(session_id, prompt, reply)
+    yield {
+        "event": "done",
+        "data": {"model": configured_model(), "is_simulated": True, "tokens_used": None, **session},
     }
 
 
-# Base de conocimiento para RAG - Curso de IA y ChatGPT para adultos mayores
-KNOWLEDGE_BASE: List[Dict[str, str]] = [
-    {
-        "id": "ia_intro",
-        "title": "🤖 ¿Qué es la Inteligencia Artificial?",
-        "category": "fundamentos",
-        "content": """La Inteligencia Artificial (IA) es la capacidad de las máquinas para realizar tareas que normalmente requieren inteligencia humana, como aprender, reconocer patrones, entender el lenguaje y tomar decisiones.
-
-🔍 Ejemplos que usas en tu día a día:
-• Asistentes virtuales como Siri o Alexa que responden a tu voz
-• Recomendaciones de películas en Netflix según tus gustos
-• Filtros de spam que protegen tu correo electrónico
-• Reconocimiento facial para desbloquear tu teléfono
-
-La IA está presente en muchas cosas cotidianas, haciéndonos la vida más fácil y segura."""
-    },
-    {
-        "id": "chatgpt_intro",
-        "title": "💬 ¿Qué es ChatGPT?",
-        "category": "fundamentos",
-        "content": """ChatGPT es un asistente de inteligencia artificial desarrollado por la empresa OpenAI. Es como tener un ayudante muy conocedor con quien puedes conversar escribiendo.
-
-✨ ¿Qué puede hacer por ti?
-• Responder preguntas sobre casi cualquier tema
-• Ayudarte a escribir textos, emails o cartas
-• Explicar conceptos complicados de forma simple
-• Generar ideas creativas para proyectos o regalos
-• Traducir textos a otros idiomas
-• Enseñarte paso a paso cómo hacer cosas
-
-ChatGPT funciona leyendo lo que escribes y generando respuestas coherentes basándose en toda la información con la que fue entrenado."""
-    },
-    {
-        "id": "chatgpt_usos",
-        "title": "🛠️ Usos prácticos de ChatGPT en tu vida",
-        "category": "fundamentos",
-        "content": """ChatGPT puede ser tu asistente personal para muchas tareas diarias:
-
-📝 Escritura y comunicación:
-• Redactar emails profesionales o personales
-• Corregir ortografía y gramática
-• Escribir cartas formales o invitaciones
-
-📚 Aprendizaje y conocimiento:
-• Explicar temas que no entiendes
-• Dar ejemplos prácticos
-• Responder dudas paso a paso
-
-🏠 Tareas del hogar y prácticas:
-• Crear listas de compras organizadas
-• Adaptar recetas según tus necesidades
-• Sugerir soluciones a problemas cotidianos
-
-🎨 Creatividad y ocio:
-• Generar ideas para regalos personalizados
-• Escribir poemas o mensajes especiales
-• Planificar viajes o actividades"""
-    },
-    {
-        "id": "prompt_que_es",
-        "title": "❓ ¿Qué es un prompt?",
-        "category": "prompting",
-        "content": """Un "prompt" es simplemente la pregunta o instrucción que le das a ChatGPT. Es tu forma de comunicarte con la inteligencia artificial.
-
-💡 Piénsalo así:
-Es como cuando le pides algo a una persona: entre más claro y específico seas, mejor te entenderá y mejor será la respuesta que obtengas.
-
-Ejemplo:
-❌ Prompt vago: "Comida"
-✅ Prompt claro: "Dame una receta fácil de pasta para 2 personas"
-
-La diferencia está en ser específico y claro con lo que necesitas."""
-    },
-    {
-        "id": "prompt_consejos",
-        "title": "✍️ Consejos para hacer buenos prompts",
-        "category": "prompting",
-        "content": """Sigue estos consejos para obtener mejores respuestas de ChatGPT:
-
-1️⃣ Sé específico y detallado
-   ❌ "Háblame de comida"
-   ✅ "Dame una receta fácil de pasta para 2 personas con ingredientes simples"
-
-2️⃣ Da contexto sobre tu situación
-   ✅ "Soy principiante en jardinería y vivo en departamento. ¿Qué plantas son fáciles de cuidar en macetas?"
-
-3️⃣ Pide el formato que necesitas
-   ✅ "Explícamelo de forma sencilla y paso a paso"
-   ✅ "Dame una lista numerada con los pasos"
-
-4️⃣ Haz preguntas de seguimiento
-   Si algo no queda claro, simplemente pregunta: "¿Podrías explicar mejor esa parte?" o "Dame un ejemplo de eso"
-
-Recuerda: No existe una pregunta tonta. ChatGPT está para ayudarte."""
-    },
-    {
-        "id": "prompt_ejemplos",
-        "title": "📋 Ejemplos de buenos prompts",
-        "category": "prompting",
-        "content": """Aquí tienes ejemplos reales de prompts efectivos que puedes usar:
-
-🎓 Para aprender:
-• "Explícame qué es WhatsApp como si tuviera 65 años y nunca lo usé"
-• "¿Cómo funciona el home banking? Dame los pasos básicos"
-
-🔒 Para seguridad:
-• "Dame 5 consejos para mantener mi computadora segura"
-• "¿Cómo identifico un email falso o estafa?"
-
-✉️ Para escribir:
-• "Ayúdame a escribir un email para cancelar una suscripción"
-• "Redacta una carta para agradecer un favor"
-
-📰 Para resumir:
-• "Resume este texto en 3 puntos principales: [tu texto]"
-
-🎁 Para ideas:
-• "Necesito ideas de regalos para mi nieto de 10 años que le gusta la ciencia"
-• "Sugiéreme actividades para hacer con mis nietos en casa"
-
-¡Copia estos ejemplos y adáptalos a tus necesidades!"""
-    },
-    {
-        "id": "seguridad_basica",
-        "title": "🔐 Seguridad básica al usar ChatGPT",
-        "category": "seguridad",
-        "content": """Es importante usar ChatGPT de forma segura. Sigue estas reglas de oro:
-
-🚫 NUNCA compartas:
-• Contraseñas o PINs
-• Números de tarjetas de crédito o débito
-• Números de documento (DNI, pasaporte)
-• Datos bancarios o financieros
-
-⚠️ Ten en cuenta:
-• ChatGPT puede equivocarse - no confíes ciegamente en toda la información
-• Verifica información importante con otras fuentes
-• Para temas médicos, legales o financieros serios, siempre consulta con profesionales
-
-✅ Úsalo con seguridad para:
-• Aprender cosas nuevas
-• Escribir textos
-• Obtener ideas
-• Practicar habilidades
-
-Recuerda: La seguridad es tu responsabilidad. Si tienes dudas, mejor no compartas la información."""
-    },
-    {
-        "id": "seguridad_privacidad",
-        "title": "🛡️ Protege tu privacidad",
-        "category": "seguridad",
-        "content": """Tu privacidad es importante. Aprende a protegerla cuando uses ChatGPT:
-
-🔒 NUNCA escribas en ChatGPT:
-• Tu dirección completa
-• Tu número de documento (DNI)
-• Contraseñas de ningún tipo
-• Datos de tarjetas bancarias
-• Información médica personal detallada
-• Fotos privadas tuyas o de tu familia
-
-⚠️ Importante saber:
-Las conversaciones que tienes con ChatGPT pueden ser revisadas por la empresa para mejorar el servicio.
-
-💡 Regla de oro:
-Trata a ChatGPT como si fuera una conversación en un café público. No digas nada que no dirías en voz alta en un lugar con gente alrededor.
-
-✅ Sí puedes compartir:
-• Preguntas generales
-• Textos para editar (sin datos personales)
-• Dudas sobre temas en general
-• Situaciones hipotéticas"""
-    },
-    {
-        "id": "seguridad_estafas",
-        "title": "⚠️ Cuidado con estafas relacionadas con IA",
-        "category": "seguridad",
-        "content": """Los estafadores también usan la IA. Protégete conociendo estos peligros:
-
-🚨 Ten cuidado con:
-
-1️⃣ Sitios web falsos
-Sitios que imitan a ChatGPT y te piden datos personales o pagos extraños.
-
-2️⃣ Emails o mensajes sospechosos
-Si recibes un email que dice venir de "OpenAI" o "ChatGPT" pidiendo información personal, es probablemente falso.
-
-3️⃣ Ofertas "demasiado buenas"
-"Gana dinero fácil con IA", "Invierte en ChatGPT", etc. Son estafas.
-
-4️⃣ Personas que se hacen pasar por soporte técnico
-Nadie real te va a pedir contraseñas por teléfono o mensaje.
-
-✅ Mantente seguro:
-• Usa SOLO el sitio oficial: chat.openai.com
-• Descarga apps SOLO de tiendas oficiales (Google Play, App Store)
-• Ante la duda, consulta con un familiar de confianza
-• Si algo parece muy bueno para ser verdad, probablemente es una estafa"""
-    },
-    {
-        "id": "limitaciones",
-        "title": "⚖️ Limitaciones que debes conocer",
-        "category": "fundamentos",
-        "content": """ChatGPT es una herramienta poderosa, pero no es perfecta. Conoce sus limitaciones:
-
-📅 Su conocimiento tiene fecha de corte
-No sabe de eventos muy recientes ni tiene acceso a información actualizada en tiempo real.
-
-❌ Puede cometer errores
-A veces da información incorrecta con mucha confianza. Siempre verifica datos importantes.
-
-🌐 No puede navegar por internet
-No puede abrir links, ver páginas web actuales ni buscar información en tiempo real.
-
-🧠 No tiene memoria entre sesiones
-Cada conversación nueva es como empezar de cero. No recuerda conversaciones anteriores.
-
-⚕️ No reemplaza a profesionales
-NO es un médico, abogado o asesor financiero. Para temas importantes de salud, legales o de dinero, consulta con expertos reales.
-
-🤖 Es una máquina, no una persona
-No tiene sentimientos, opiniones personales ni experiencias reales. Genera respuestas basándose en patrones de texto.
-
-💡 Úsalo como lo que es: una herramienta de ayuda, no una fuente de verdad absoluta."""
-    },
-    {
-        "id": "curso_edad",
-        "title": "👴👵 Este curso es para ti",
-        "category": "curso",
-        "content": """¡Bienvenido! Este curso está diseñado especialmente para personas mayores de 60 años que quieren aprender sobre inteligencia artificial y ChatGPT.
-
-✨ Lo que nos hace especiales:
-
-🎯 Sin conocimientos previos necesarios
-No importa si no sabes de tecnología. Empezamos desde cero.
-
-⏰ Aprendes a tu propio ritmo
-Sin presiones, sin apuros. Tómate el tiempo que necesites.
-
-💼 Ejemplos prácticos y útiles
-Todo lo que aprendas podrás aplicarlo en tu vida diaria.
-
-🎮 Práctica sin miedo
-Este simulador te permite practicar libremente. No hay forma de "romper" nada o equivocarte de forma permanente.
+# Base de conocimiento (archivos de KB_DIRECTORY): se carga en el primer uso y al
+# recargar se reemplaza completa, sin bloquear las búsquedas en curso
+_kb: Optional[KnowledgeBase] = None
+_kb_reload_lock: Optional[asyncio.Lock] = None
+_kb_last_reload: Optional[Dict[str, Any]] = None
+
+
+def _kb_directory() -> str:
+    return _project_path(settings.KB_DIRECTORY)
 
-🤝 Lenguaje claro y cercano
-Sin tecnicismos complicados. Si usamos algún término técnico, te lo explicamos con ejemplos simples.
-
-Recuerda: Nunca es tarde para aprender algo nuevo. ¡Estás en el lugar correcto!"""
-    },
-    {
-        "id": "curso_beneficios",
-        "title": "🌟 Beneficios de aprender IA en esta etapa",
-        "category": "curso",
-        "content": """Aprender a usar ChatGPT te traerá muchos beneficios en tu vida diaria:
 
-💻 Te mantiene actualizado con la tecnología
-La tecnología avanza rápido. Con este curso te mantienes al día.
+def _get_kb() -> KnowledgeBase:
+    global _kb
+    if _kb is None:
+        _kb, changes = KnowledgeBase.load(_kb_directory(), passage_max_tokens=settings.RAG_PASSAGE_MAX_TOKENS)
+        logger.info(
+            "📚 Base de conocimiento cargada: %s documentos en %ss", changes["documents"], changes["duration_seconds"]
+        )
+    return _kb
 
-✍️ Mejora tu comunicación escrita
-Aprende a redactar mejor emails, cartas y mensajes.
 
-🔍 Encuentra información rápidamente
-Ya no necesitas buscar en muchos sitios. Pregunta y obtén respuestas al instante.
+async def _ensure_kb() -> KnowledgeBase:
+    """Base de conocimiento cargada fuera del event loop; la primera consulta la carga si no hubo warm_up"""
+    global _kb_reload_lock
+    if _kb is None:
+        if _kb_reload_lock is None:
+            _kb_reload_lock = asyncio.Lock()
+        async with _kb_reload_lock:
+            if _kb is None:
+                await asyncio.to_thread(_get_kb)
+    return _kb
 
-👨‍👩‍👧‍👦 Conecta con tus nietos
-Ayúdalos con tareas escolares o entiende mejor de qué hablan cuando mencionan "la IA".
 
-📚 Aprende nuevas habilidades
-Desde cocina hasta jardinería, ChatGPT puede enseñarte paso a paso.
+def _get_embedding_index(kb: Optional[KnowledgeBase] = None, previous: Any = None):
+    """Devuelve el índice de embeddings de la base, cargándolo o construyéndolo si hace falta.
 
-🧠 Mantén tu mente activa
-Aprender cosas nuevas ejercita tu cerebro y mantiene tu mente ágil.
+    `previous` es el índice de la versión anterior: sus embeddings se
+    reutilizan para los fragmentos que no cambiaron.
+    """
+    kb = kb or _get_kb()
+
+    if kb.embedding_index is not None or kb.embedding_index_failed:
+        return kb.embedding_index
+
+    if not kb_embeddings.NUMPY_AVAILABLE:
+        logger.warning("numpy no está instalado. La búsqueda semántica queda deshabilitada.")
+        kb.embedding_index_failed = True
+        return None
+
+    try:
+        if settings.RAG_EMBEDDER == "gemini":
+            if _configure_genai() is None:
+                logger.warning("El embedder de Gemini requiere GEMINI_API_KEY. Búsqueda semántica deshabilitada.")
+                kb.embedding_index_failed = True
+                return None
+            embedder = kb_embeddings.make_gemini_embedder(settings.GEMINI_EMBEDDING_MODEL, "retrieval_document")
+            query_embedder = kb_embeddings.make_gemini_embedder(settings.GEMINI_EMBEDDING_MODEL, "retrieval_query")
+            embedder_name = f"gemini:{settings.GEMINI_EMBEDDING_MODEL}"
+        else:
+            embedder = query_embedder = kb_embeddings.hashing_embedder
+            embedder_name = "hashing:512"
+
+        kb.embedding_index = kb_embeddings.EmbeddingIndex.load_or_build(
+            kb.documents,
+            embedder,
+            embedder_name,
+            path=_project_path(settings.RAG_EMBEDDINGS_PATH) if settings.RAG_EMBEDDINGS_PATH else None,
+            query_embedder=query_embedder,
+            previous=previous,
+        )
+    except Exception as e:
+        logger.error("❌ Error al construir el índice de embeddings: %s", e)
+        kb.embedding_index_failed = True
+
+    return kb.embedding_index
+
+
+async def reload_knowledge_base() -> Dict[str, Any]:
+    """Relee KB_DIRECTORY y reemplaza la base en uso de forma atómica.
+
+    Solo se releen los archivos modificados y se vuelven a tokenizar (y a
+    calcular embeddings de) los documentos que cambiaron. Todo el trabajo
+    corre fuera del event loop; las consultas siguen usando la base anterior
+    hasta el reemplazo. Devuelve el resumen de cambios.
+    """
+    global _kb, _kb_reload_lock, _kb_last_reload
+    if _kb_reload_lock is None:
+        _kb_reload_lock = asyncio.Lock()
+
+    async with _kb_reload_lock:
+        current = _kb
+        new_kb, changes = await asyncio.to_thread(KnowledgeBase.load, _kb_directory(), current, settings.RAG_PASSAGE_MAX_TOKENS)
+        if current is not None and new_kb.version == current.version:
+            new_kb.embedding_index = current.embedding_index
+        elif current is not None and current.embedding_index is not None:
+            # El índice nuevo se arma antes del reemplazo para no dejar búsquedas sin él
+            await asyncio.to_thread(_get_embedding_index, new_kb, current.embedding_index)
+            if new_kb.embedding_index is not None:
+                changes["embedded_chunks"] = new_kb.embedding_index.embedded_chunks
+        _kb = new_kb
+        _kb_last_reload = {**changes, "reloaded_at": time.time()}
+
+    logger.info("🔄 Base de conocimiento recargada: %s", changes)
+    return changes
+
+
+async def watch_knowledge_base(interval: float) -> None:
+    """Revisa cada `interval` segundos si cambiaron los archivos de la base y la recarga"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            signature = await asyncio.to_thread(directory_signature, _kb_directory())
+            if signature != (await _ensure_kb()).signature:
+                await reload_knowledge_base()
+        except Exception as e:
+            logger.error("❌ Error al revisar cambios en la base de conocimiento: %s", e)
+
+
+def _fuzzy_search(kb: KnowledgeBase, question: str) -> List[SearchHit]:
+    """Corrige los errores de tipeo de la pregunta y repite la búsqueda con el mismo umbral de confianza"""
+    terms = kb.correct_terms(question, settings.RAG_FUZZY_MIN_SIMILARITY)
+    if terms is None:
+        return []
+    hits = select_kb_hits(kb.index.search_terms(terms, limit=settings.RAG_KB_MAX_RESULTS), settings.RAG_KB_MIN_CONFIDENCE)
+    if hits:
+        logger.info("🔎 Pregunta corregida: %s → %s (%s)", question[:50], " ".join(terms), hits[0].document["id"])
+    return hits
+
+
+async def _traced_to_thread(name: str, func: Callable[..., Any], *args: Any) -> Any:
+    """`asyncio.to_thread` que registra por separado la espera en el pool y la ejecución"""
+    queued = time.perf_counter()
+
+    def run() -> Any:
+        started = time.perf_counter()
+        record_span("thread_queue", started - queued)
+        try:
+            return func(*args)
+        finally:
+            record_span(name, time.perf_counter() - started)
+
+    return await asyncio.to_thread(run)
 
-🎨 Despierta tu creatividad
-Escribe poemas, genera ideas para proyectos, planifica actividades especiales.
 
-🆓 Es gratis practicar
-Este simulador es completamente gratuito para que practiques sin límites.
+async def _search_knowledge_base(question: str) -> List[SearchHit]:
+    """Busca documentos que respondan la pregunta según RAG_RETRIEVAL_MODE"""
+    mode = settings.RAG_RETRIEVAL_MODE
+    kb = _get_kb()
 
-La tecnología no es solo para jóvenes. ¡Es para todos!"""
-    },
-    {
-        "id": "primeros_pasos",
-        "title": "🚀 Tus primeros pasos con ChatGPT",
-        "category": "curso",
-        "content": """¿Listo para empezar? Sigue estos pasos simples para comenzar tu aventura con ChatGPT:
+    if mode in ("keyword", "hybrid"):
+        hits = select_kb_hits(
+            kb.index.search(question, limit=settings.RAG_KB_MAX_RESULTS),
+            settings.RAG_KB_MIN_CONFIDENCE,
+        )
+        if not hits and settings.RAG_FUZZY_ENABLED:
+            hits = _fuzzy_search(kb, question)
+        if hits or mode == "keyword":
+            return hits
 
-1️⃣ Practica aquí sin presión
-Este simulador está hecho para que experimentes libremente. No hay forma de hacer algo "mal".
+    index = _get_embedding_index(kb)
+    if index is None:
+        return []
 
-2️⃣ Empieza con preguntas simples
-Prueba con cosas como:
-• "¿Qué es...?"
-• "¿Cómo puedo...?"
-• "Explícame..."
+    if settings.RAG_EMBEDDER == "hashing":
+        semantic_hits = index.search(question, limit=settings.RAG_KB_MAX_RESULTS)
+    else:
+        # El embedding de la pregunta requiere una llamada de red
+        semantic_hits = await _traced_to_thread("embedding_search", index.search, question, settings.RAG_KB_MAX_RESULTS)
+    return select_kb_hits(semantic_hits, settings.RAG_SEMANTIC_MIN_SCORE)
 
-3️⃣ Lee las respuestas con calma
-No hay apuro. Tómate tu tiempo para entender cada respuesta.
 
-4️⃣ Haz preguntas de seguimiento
-Si algo no queda claro, simplemente pregunta:
-• "¿Podrías explicar mejor esa parte?"
-• "Dame un ejemplo de eso"
-• "¿Hay una forma más simple de hacerlo?"
+def _grounding(question: str) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """Pasajes de la base que se envían a Gemini junto con la pregunta.
 
-5️⃣ No temas equivocarte
-Los errores son parte del aprendizaje. Cada pregunta te hace aprender algo nuevo.
+    Devuelve `(contexto, fuentes)`; sin pasajes relevantes el contexto es `None`.
+    """
+    if settings.RAG_CONTEXT_TOKEN_BUDGET <= 0 or settings.RAG_CONTEXT_MAX_PASSAGES <= 0:
+        return None, []
+    kb = _get_kb()
+    hits = select_kb_hits(
+        kb.passage_index.search(question, limit=settings.RAG_CONTEXT_MAX_PASSAGES),
+        settings.RAG_CONTEXT_MIN_CONFIDENCE,
+        relative_score=0.0,
+    )
+    context, sources = pack_context(hits, kb.passages, settings.RAG_CONTEXT_TOKEN_BUDGET)
+    return context or None, sources
+
+
+def _gemini_rag_result(
+    reply: str,
+    tokens_used: Optional[Dict[str, int]] = None,
+    sources: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    return {
+        "answer": reply,
+        "sources": sources or [{"type": "gemini_ai", "note": "Respuesta generada por IA especializada en capacitación"}],
+        "total_results": len(sources) if sources else 1,
+        "source_type": "gemini_ai",
+        "tokens_used": tokens_used
+    }
+
+
+_intent_router: Optional[IntentRouter] = None
+_intent_router_lock: Optional[asyncio.Lock] = None
 
-6️⃣ Experimenta y diviértete
-Prueba diferentes tipos de preguntas. ¡Sorpréndete con lo que puedes hacer!
+_ROUTED_ANSWERS = {
+    "greeting": "¡Hola! 👋 Qué alegría tenerte en el curso. Puedes preguntarme lo que quieras sobre inteligencia artificial, ChatGPT, cómo hacer buenas preguntas (prompts) o cómo usarlos con seguridad. ¿Por dónde te gustaría empezar?",
+    "thanks": "¡Con mucho gusto! 😊 Cuando quieras seguimos aprendiendo. Recuerda que no hay preguntas tontas: cada duda es un paso más.",
+    "off_topic": "Esa pregunta se aleja un poco de nuestro curso 🙂. Aquí aprendemos sobre inteligencia artificial y ChatGPT: qué son, cómo hacerles buenas preguntas y cómo usarlos con seguridad. ¿Te gustaría saber, por ejemplo, cómo ChatGPT podría ayudarte con ese tema?",
+}
 
-💡 Consejo: Guarda las respuestas útiles que recibas. Cópialas a un documento para consultarlas después.
 
-Recuerda: Todos empezamos como principiantes. ¡Tú puedes hacerlo!"""
+def _get_intent_router() -> IntentRouter:
+    global _intent_router
+    if _intent_router is None:
+        path = _project_path(settings.INTENT_TRAINING_FILE)
+        try:
+            _intent_router = IntentRouter.from_file(path, settings.INTENT_MIN_CONFIDENCE)
+            logger.info("🧭 Clasificador de intención entrenado con %s ejemplos", _intent_router.examples)
+        except OSError as e:
+            logger.warning("⚠️ No se pudo leer %s; el clasificador de intención usa solo reglas: %s", path, e)
+            _intent_router = IntentRouter(None, settings.INTENT_MIN_CONFIDENCE)
+    return _intent_router
+
+
+async def _load_intent_router() -> IntentRouter:
+    """Clasificador de intención, entrenado fuera del event loop y una sola vez (warm_up o la primera consulta)"""
+    global _intent_router_lock
+    if _intent_router is None:
+        if _intent_router_lock is None:
+            _intent_router_lock = asyncio.Lock()
+        async with _intent_router_lock:
+            if _intent_router is None:
+                await asyncio.to_thread(_get_intent_router)
+    return _intent_router
+
+
+async def _route_question(question: str) -> Optional[Dict[str, Any]]:
+    """Respuesta local si el clasificador decide que no hace falta llamar a Gemini"""
+    if not settings.INTENT_ROUTER_ENABLED:
+        return None
+    decision = (await _load_intent_router()).route(question)
+    INTENT_DECISIONS.labels(decision.intent, decision.outcome).inc()
+    INTENT_CONFIDENCE.observe(decision.confidence)
+    if decision.outcome == "llm":
+        return None
+    logger.info("🧭 Pregunta resuelta sin Gemini (%s, %.2f): %s", decision.intent, decision.confidence, question[:50])
+    return _routed_result(decision)
+
+
+def _routed_result(decision: RouteDecision) -> Dict[str, Any]:
+    return {
+        "answer": _ROUTED_ANSWERS[decision.intent],
+        "sources": [{
+            "type": "intent_router",
+            "intent": decision.intent,
+            "confidence": decision.confidence,
+            "decided_by": decision.source,
+        }],
+        "total_results": 0,
+        "source_type": "off_topic" if decision.outcome == "off_topic" else "canned",
     }
-]
+
+
+def _rag_fallback_result(question: str) -> Dict[str, Any]:
+    """Respuesta cuando no hay Gemini disponible, con información útil sobre el curso"""
+    fallback_answer = f"""💡 **Sobre tu pregunta: "{question}"**
+
+Para responder preguntas del curso, necesito que configures la API de Gemini.
+
+📚 **Temas del curso que puedo ayudarte:**
+• ¿Qué es la Inteligencia Artificial?
+• ¿Qué es y cómo usar ChatGPT?
+• Cómo hacer buenas preguntas (prompts)
+• Seguridad y privacidad al usar IA
+• Beneficios de aprender IA para adultos mayores
+
+🔧 **Para activar las respuestas reales:**
+Configura GEMINI_API_KEY en el archivo .env
+
+¿Tienes alguna otra pregunta sobre estos temas?"""
+    
+    return {
+        "answer": fallback_answer,
+        "sources": [],
+        "total_results": 0,
+        "source_type": "not_found"
+    }
+
+
+def _degraded_rag_result(question: str) -> Dict[str, Any]:
+    """Mejor respuesta local mientras Gemini no está disponible (circuito abierto).
+
+    Usa los documentos más cercanos de la base de conocimiento aunque no
+    alcancen la confianza habitual; si no hay ninguno, explica la situación.
+    """
+    hits = [hit for hit in _get_kb().index.search(question, limit=settings.RAG_KB_MAX_RESULTS) if hit.confidence > 0]
+    if hits:
+        result = format_kb_answer(select_kb_hits(hits, min_confidence=0.0))
+    else:
+        result = {
+            "answer": (
+                "⚠️ En este momento el asistente de IA no está disponible y no encontré "
+                "esta pregunta en el material del curso. Por favor, intenta nuevamente en unos minutos."
+            ),
+            "sources": [],
+            "total_results": 0,
+            "source_type": "not_found"
+        }
+    result["degraded"] = True
+    return result
+
+
+def _rag_cache_key(question: str) -> str:
+    """La clave incluye la versión de la base: al recargarla no se sirven respuestas viejas"""
+    return make_cache_key(question, configured_model(), f"{RAG_PROMPT.version}:{_get_kb().version}")
+
+
+def _cacheable_rag_result(result: Dict[str, Any]) -> bool:
+    """Solo se guardan respuestas útiles; los errores, el modo sin API y las respuestas degradadas se reintentan"""
+    return result.get("source_type") in ("knowledge_base", "gemini_ai") and not result.get("degraded")
 
 
 async def rag_answer(question: str) -> Dict[str, Any]:
-    """Responde preguntas sobre el curso de IA y ChatGPT usando Gemini.
-    Sistema RAG que consulta directamente con Gemini para respuestas dinámicas
-    y personalizadas según cada pregunta del estudiante.
+    """Responde preguntas sobre el curso de IA y ChatGPT.
+    Sistema RAG híbrido: primero busca en la base de conocimiento local y,
+    solo si no encuentra una coincidencia suficiente, consulta a Gemini.
     """
     if not question or not question.strip():
         return {"error": "La pregunta está vacía"}
+
+    await _ensure_kb()
+    cache_key = _rag_cache_key(question)
+    if settings.RAG_CACHE_ENABLED:
+        with span("cache"):
+            cached = await _rag_cache.aget(cache_key)
+        if cached is not None:
+            RAG_RESPONSES.labels(cached["source_type"]).inc()
+            return {**cached, "cached": True}
+
+    # Las preguntas iguales en curso comparten la resolución y una sola escritura en la caché
+    if settings.SINGLE_FLIGHT_ENABLED:
+        result = await _single_flight.do(f"rag:{cache_key}", lambda: _rag_answer_and_store(question, cache_key))
+    else:
+        result = await _rag_answer_and_store(question, cache_key)
+
+    if "source_type" in result:
+        RAG_RESPONSES.labels(result["source_type"]).inc()
+    return {**result, "cached": False}
+
+
+async def _rag_answer_and_store(question: str, cache_key: str) -> Dict[str, Any]:
+    """Resuelve la pregunta y guarda el resultado en la caché si sirve"""
+    result = await _rag_answer_uncached(question)
+    if settings.RAG_CACHE_ENABLED and _cacheable_rag_result(result):
+        with span("cache_store"):
+            await _rag_cache.aset(cache_key, result)
+    return result
+
+
+async def _rag_answer_uncached(question: str) -> Dict[str, Any]:
+    """Resuelve una pregunta de RAG sin pasar por la caché"""
+    # Etapa 1: búsqueda local en la base de conocimiento (milisegundos, sin consumir API)
+    with span("kb_search"):
+        kb_hits = await _search_knowledge_base(question)
+    if kb_hits:
+        logger.info("📚 Respuesta RAG desde la base de conocimiento: %s", kb_hits[0].document["id"])
+        return format_kb_answer(kb_hits)
+
+    # Etapa 2: saludos, agradecimientos y preguntas ajenas al curso no necesitan a Gemini
+    with span("intent"):
+        routed = await _route_question(question)
+    if routed is not None:
+        return routed
+
+    # Etapa 3: usar Gemini con un prompt optimizado para la capacitación
+    provider = _get_provider("rag")
     
-    # Usar Gemini directamente con un prompt optimizado para la capacitación
-    model = _initialize_gemini()
-    
-    if model is not None:
+    if provider is not None:
         try:
-            # Prompt especializado para el curso de capacitación
-            enhanced_question = f"""Eres un instructor experto y paciente de un curso sobre inteligencia artificial y ChatGPT, diseñado específicamente para adultos mayores de 60 años.
-
-🎯 CONTEXTO DEL CURSO:
-Este es un curso práctico que enseña a personas mayores a usar ChatGPT y entender conceptos básicos de IA. Los estudiantes no tienen conocimientos técnicos previos.
-
-📚 TEMAS DEL CURSO:
-• Fundamentos de IA: Qué es, cómo funciona, ejemplos cotidianos
-• ChatGPT: Qué es, qué puede hacer, usos prácticos en la vida diaria
-• Prompting: Cómo hacer buenas preguntas, técnicas, ejemplos
-• Seguridad: Privacidad, datos personales, cuidado con estafas
-• Beneficios: Por qué aprender IA a esta edad, aplicaciones prácticas
-
-✍️ ESTILO DE RESPUESTA:
-- Usa lenguaje SIMPLE y CERCANO, sin tecnicismos
-- Máximo 2-3 párrafos cortos y directos
-- Incluye emojis para hacer la respuesta más amigable (1-2 emojis máximo)
-- Usa ejemplos COTIDIANOS que adultos mayores puedan relacionar
-- Sé ALENTADOR y MOTIVADOR
-- Si explicas algo técnico, compáralo con situaciones de la vida real
-
-❌ EVITA:
-- Términos técnicos complejos (o explícalos de forma muy simple)
-- Respuestas largas y densas
-- Jerga de internet o tecnológica
-- Asumir conocimientos previos
-
-Pregunta del estudiante:
-{question}
-
-Responde de forma clara, práctica y motivadora. Si la pregunta no está relacionada con el curso, redirígela amablemente hacia los temas del curso. SEA BREVE Y CONCISO"""
-            
-            logger.info(f"Consultando Gemini RAG para: {question[:50]}...")
+            # La pregunta va acompañada de los pasajes del curso más relevantes
+            with span("prompt"):
+                context, sources = _grounding(question)
+                enhanced_question = rag_user_content(question, context)
             
-            response = await asyncio.to_thread(
-                lambda: model.generate_content(enhanced_question)
-            )
+            logger.info("Consultando Gemini RAG para: %s...", question[:50])
             
-            reply = response.text if hasattr(response, 'text') else str(response)
+            with span("generate"):
+                response = await _generate(provider, enhanced_question, "rag")
             
             logger.info("✅ Respuesta RAG recibida de Gemini")
             
-            return {
-                "answer": reply,
-                "sources": [{"type": "gemini_ai", "note": "Respuesta generada por IA especializada en capacitación"}],
-                "total_results": 1,
-                "source_type": "gemini_ai"
-            }
+            return _gemini_rag_result(response.text, response.usage, sources)
             
+        except UpstreamBusyError as e:
+            logger.warning("⏳ Gemini saturado, se rechaza la consulta RAG: %s", e)
+            return {"error": str(e), "status_code": 503}
+        except CircuitOpenError:
+            DEGRADED_RESPONSES.labels("rag").inc()
+            return _degraded_rag_result(question)
         except Exception as e:
-            logger.error(f"❌ Error al consultar Gemini para RAG: {e}")
+            logger.error("❌ Error al consultar Gemini para RAG: %s", e)
             return {
                 "answer": f"Ocurrió un error al procesar tu pregunta: {str(e)}. Por favor, intenta nuevamente o reformula tu pregunta.",
                 "sources": [],
@@ -519,25 +1237,258 @@ Responde de forma clara, práctica y motivadora. Si la pregunta no está relacio
             }
     
     # Sin Gemini disponible - mensaje de fallback con información útil
-    fallback_answer = f"""💡 **Sobre tu pregunta: "{question}"**
+    return _rag_fallback_result(question)
 
-Para responder preguntas del curso, necesito que configures la API de Gemini.
 
-📚 **Temas del curso que puedo ayudarte:**
-• ¿Qué es la Inteligencia Artificial?
-• ¿Qué es y cómo usar ChatGPT?
-• Cómo hacer buenas preguntas (prompts)
-• Seguridad y privacidad al usar IA
-• Beneficios de aprender IA para adultos mayores
+async def rag_answer_stream(question: str) -> AsyncIterator[Dict[str, Any]]:
+    """Versión en streaming de `rag_answer`.
 
-🔧 **Para activar las respuestas reales:**
-Configura GEMINI_API_KEY en el archivo .env
+    Las respuestas de la caché o de la base de conocimiento se envían en un
+    único fragmento; las de Gemini se reenvían a medida que llegan. El evento
+    "done" final lleva las fuentes, `source_type` y `tokens_used`.
+    """
+    if not question or not question.strip():
+        yield {"event": "error", "data": {"error": "La pregunta está vacía"}}
+        return
+
+    await _ensure_kb()
+    cache_key = _rag_cache_key(question)
+    with span("cache"):
+        result = await _rag_cache.aget(cache_key) if settings.RAG_CACHE_ENABLED else None
+    cached = result is not None
+
+    if result is None:
+        with span("kb_search"):
+            kb_hits = await _search_knowledge_base(question)
+        if kb_hits:
+            result = format_kb_answer(kb_hits)
+        else:
+            with span("intent"):
+                result = await _route_question(question)
+
+    provider = _get_provider("rag") if result is None else None
+    if provider is not None:
+        logger.info("Consultando Gemini RAG (streaming) para: %s...", question[:50])
+        parts: List[str] = []
+        last_chunk = None
+        with span("prompt"):
+            context, sources = _grounding(question)
+        try:
+            async for chunk in _stream_generate(provider, rag_user_content(question, context), "rag"):
+                last_chunk = chunk
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield {"event": "chunk", "data": {"text": chunk.text}}
+        except UpstreamBusyError as e:
+            yield {"event": "error", "data": {"error": str(e), "status_code": 503}}
+            return
+        except CircuitOpenError:
+            DEGRADED_RESPONSES.labels("rag_stream").inc()
+            result = _degraded_rag_result(question)
+        except Exception as e:
+            logger.error("❌ Error al consultar Gemini para RAG en streaming: %s", e)
+            yield {"event": "error", "data": {"error": f"Ocurrió un error al procesar tu pregunta: {str(e)}"}}
+            return
+        else:
+            result = _gemini_rag_result("".join(parts), last_chunk.usage if last_chunk else None, sources)
+            RAG_RESPONSES.labels(result["source_type"]).inc()
+            if settings.RAG_CACHE_ENABLED and _cacheable_rag_result(result):
+                with span("cache_store"):
+                    await _rag_cache.aset(cache_key, result)
+            metadata = {key: value for key, value in result.items() if key != "answer"}
+            yield {"event": "done", "data": {**metadata, "cached": False}}
+            return
+
+    if result is None:
+        result = _rag_fallback_result(question)
+    elif not cached and settings.RAG_CACHE_ENABLED and _cacheable_rag_result(result):
+        with span("cache_store"):
+            await _rag_cache.aset(cache_key, result)
+
+    RAG_RESPONSES.labels(result["source_type"]).inc()
+    yield {"event": "chunk", "data": {"text": result["answer"]}}
+    metadata = {key: value for key, value in result.items() if key != "answer"}
+    yield {"event": "done", "data": {"tokens_used": None, **metadata, "cached": cached}}
+
+
+async def _run_batch(items: List[str], handler: Callable[[str], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Procesa una lista de consultas en paralelo, con límite de concurrencia.
+
+    Las consultas repetidas (misma forma normalizada) se resuelven una sola vez.
+    Cada elemento del resultado conserva la posición de la entrada y lleva su
+    propio `error` si falló, sin hacer fallar al lote completo.
+    """
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        return {"error": f"El lote tiene {len(items)} consultas; el máximo es {settings.BATCH_MAX_ITEMS}"}
+
+    unique: Dict[str, str] = {}
+    keys = []
+    for item in items:
+        key = normalize_text(item)
+        unique.setdefault(key, item)
+        keys.append(key)
+
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_PARALLELISM)
+
+    async def run_one(item: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return await handler(item)
+            except Exception as e:
+                logger.error("❌ Error inesperado en consulta del lote: %s", e)
+                return {"error": f"Error inesperado: {str(e)}"}
+
+    outcomes = await asyncio.gather(*(run_one(item) for item in unique.values()))
+    by_key = dict(zip(unique.keys(), outcomes))
+
+    results = []
+    errors = 0
+    for index, key in enumerate(keys):
+        outcome = by_key[key]
+        if "error" in outcome:
+            errors += 1
+            results.append({"index": index, "error": outcome["error"]})
+        else:
+            results.append({"index": index, "result": outcome})
 
-¿Tienes alguna otra pregunta sobre estos temas?"""
-    
     return {
-        "answer": fallback_answer,
-        "sources": [],
-        "total_results": 0,
-        "source_type": "not_found"
-    }
\ No newline at end of file
+        "results": results,
+        "total": len(items),
+        "unique": len(unique),
+        "errors": errors,
+    }
+
+
+async def chat_simulate_batch(prompts: List[str]) -> Dict[str, Any]:
+    """Ejecuta `chat_simulate` para varios prompts en una sola solicitud"""
+    return await _run_batch(prompts, chat_simulate)
+
+
+async def rag_answer_batch(questions: List[str]) -> Dict[str, Any]:
+    """Ejecuta `rag_answer` para varias preguntas en una sola solicitud"""
+    return await _run_batch(questions, rag_answer)
+
+
+def canonical_questions() -> List[str]:
+    """Preguntas frecuentes del curso: los títulos de la base de conocimiento sin emojis"""
+    questions = []
+    for doc in _get_kb().documents:
+        title = re.sub(r"^[^\w¿¡]+", "", doc["title"]).strip()
+        if title:
+            questions.append(title)
+    return questions
+
+
+async def warm_up(pregenerate: bool = False, concurrency: int = 4) -> Dict[str, Any]:
+    """Prepara el servicio antes de recibir tráfico.
+
+    Crea el proveedor de cada modo (con Gemini, importa el SDK si hay API
+    key), carga la base de conocimiento
+    (y el índice de embeddings si la búsqueda lo usa) y, con `pregenerate`,
+    responde y cachea las preguntas frecuentes (`canonical_questions`) con a
+    lo sumo `concurrency` en paralelo.
+    """
+    started = time.perf_counter()
+    if settings.LLM_PROVIDER == "gemini" and gemini_key_pool() and GENAI_AVAILABLE:
+        await asyncio.to_thread(_load_genai)
+    for mode in PROMPTS:
+        _get_provider(mode)
+    kb = await _ensure_kb()
+    if settings.INTENT_ROUTER_ENABLED:
+        await _load_intent_router()
+
+    if settings.RAG_RETRIEVAL_MODE != "keyword":
+        # Construir o mapear el índice puede tardar (y llamar a la API de embeddings)
+        await asyncio.to_thread(_get_embedding_index, kb)
+
+    pregenerated = 0
+    failed = 0
+    if pregenerate:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def answer(question: str) -> bool:
+            async with semaphore:
+                try:
+                    result = await rag_answer(question)
+                except Exception as e:
+                    logger.warning("⚠️ Falló la precarga de '%s': %s", question, e)
+                    return False
+                return _cacheable_rag_result(result)
+
+        outcomes = await asyncio.gather(*(answer(question) for question in canonical_questions()))
+        pregenerated = sum(outcomes)
+        failed = len(outcomes) - pregenerated
+
+    return {
+        "duration_seconds": round(time.perf_counter() - started, 3),
+        "kb_documents": len(kb.documents),
+        "embedding_index": kb.embedding_index is not None,
+        "pregenerated": pregenerated,
+        "pregeneration_failed": failed,
+    }
+
+
+async def clear_chat_session(session_id: str) -> bool:
+    """Borra el historial de una sesión de chat. Devuelve False si no existía"""
+    return await _sessions.adelete(session_id)
+
+
+def _worker_id() -> str:
+    # Se calcula en cada uso: con gunicorn --preload el módulo se importa antes del fork
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def publish_metrics() -> None:
+    """Publica las métricas de este worker en el estado compartido"""
+    # Un worker que deja de publicar desaparece de la suma después de varios intervalos
+    ttl = max(60.0, settings.METRICS_PUBLISH_INTERVAL_SECONDS * 6)
+    await _shared_state.set(f"metrics:{_worker_id()}", json.dumps(snapshot()), ttl)
+
+
+async def publish_metrics_periodically(interval: float) -> None:
+    while True:
+        try:
+            await publish_metrics()
+        except STATE_ERRORS as e:
+            logger.warning("⚠️ No se pudieron publicar las métricas del worker: %s", e)
+        await asyncio.sleep(interval)
+
+
+async def render_metrics() -> str:
+    """Texto de /metrics: con estado compartido, la suma de todos los workers"""
+    if _shared_state.name == "local":
+        return render_prometheus()
+    try:
+        await publish_metrics()
+        snapshots = [json.loads(raw) for raw in (await _shared_state.items("metrics:")).values()]
+    except (*STATE_ERRORS, ValueError) as e:
+        logger.warning("⚠️ No se pudieron combinar las métricas de los workers, se exponen las locales: %s", e)
+        return render_prometheus()
+    return render_prometheus(snapshots=snapshots)
+
+
+def get_service_stats() -> Dict[str, Any]:
+    """Estadísticas operativas del servicio (cachés, etc.)"""
+    return {
+        "rag_cache": {"enabled": settings.RAG_CACHE_ENABLED, **_rag_cache.stats()},
+        "chat_cache": {"enabled": settings.CHAT_CACHE_ENABLED, **_chat_cache.stats()},
+        "upstream": _upstream_limiter.stats(),
+        "chat_sessions": {"enabled": settings.CHAT_SESSIONS_ENABLED, **_sessions.stats()},
+        "single_flight": {"enabled": settings.SINGLE_FLIGHT_ENABLED, **_single_flight.stats()},
+        "knowledge_base": {**(_kb.stats() if _kb else {}), "last_reload": _kb_last_reload},
+        "circuit_breaker": {"enabled": settings.BREAKER_ENABLED, **_breaker.stats()},
+        "hedging": {"enabled": settings.GEMINI_HEDGE_ENABLED, "current_delay_seconds": _hedge_delay()},
+        "provider": {
+            "name": settings.LLM_PROVIDER,
+            "model": configured_model(),
+            "modes": sorted(_providers),
+            "key_quotas": [quota.stats() for quota in _key_quotas.values()],
+        },
+        "workers": {
+            "configured": settings.WORKERS,
+            "worker_id": _worker_id(),
+            "upstream_concurrency": _upstream_limiter.max_concurrency,
+            "shared_state": _shared_state.stats(),
+        },
+        "intent_router": {"enabled": settings.INTENT_ROUTER_ENABLED, **(_intent_router.stats() if _intent_router else {})},
+    }
@@ -0,0 +1,43 @@
+from typing import Dict, Any, Awaitable, Callable, TypeVar
+import asyncio
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+    La primera llamada con una clave ejecuta la función; las que llegan
+    mientras está en curso esperan el mismo resultado (o la misma excepción).
+    Al terminar, la clave se libera: un error no queda guardado para las
+    llamadas posteriores.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, "asyncio.Future[Any]"] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is not None:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda finished: self._forget(key, finished))
+
+        # shield: si un cliente se desconecta, la llamada sigue para los demás
+        return await asyncio.shield(call)
+
+    def _forget(self, key: str, finished: "asyncio.Future[Any]") -> None:
+        if self._calls.get(key) is finished:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight_keys": len(self._calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,150 @@
+from typing import Dict, Any, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_last_access ON answers (last_access);
+"""
+
+
+class SQLiteCache:
+    """Caché persistente de respuestas en SQLite (modo WAL), compartida entre workers.
+
+    Misma interfaz asíncrona que `ResponseCache` (`aget`/`aset`/`stats`). Las
+    consultas corren en un pool de hilos propio, con una conexión por hilo,
+    para no bloquear el event loop. El vencimiento usa la hora del sistema
+    (comparable entre procesos). Cuando se superan `max_entries` se borran las
+    entradas usadas hace más tiempo; el último acceso se actualiza como mucho
+    una vez cada `touch_interval` segundos para que las lecturas no escriban
+    siempre. `stats` no consulta la base: informa un conteo aproximado que se
+    recalcula en el pool al limpiar (incluye lo escrito por otros workers).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int,
+        ttl_seconds: float,
+        touch_interval: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.touch_interval = touch_interval
+        self._clock = clock
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sqlite-cache")
+        self._writes_since_prune = 0
+        self._entries: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+        self._count()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = self._clock()
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value, expires_at, last_access FROM answers WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= now:
+            self.misses += 1
+            return None
+        if now - row[2] >= self.touch_interval:
+            connection.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        now = self._clock()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO answers (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + self.ttl_seconds, now),
+        )
+        # Limpiar cada tanto en lugar de en cada escritura
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= max(1, self.max_entries // 100):
+            self._writes_since_prune = 0
+            self.prune()
+
+    def prune(self) -> None:
+        """Borra las entradas vencidas y las menos usadas por encima del límite"""
+        connection = self._connection()
+        connection.execute("DELETE FROM answers WHERE expires_at <= ?", (self._clock(),))
+        connection.execute(
+            "DELETE FROM answers WHERE key IN ("
+            "SELECT key FROM answers ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._count()
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM answers")
+        self._entries = 0
+
+    def _count(self) -> None:
+        """Recalcula el conteo de entradas (corre en el pool, no en el event loop)"""
+        self._entries = self._connection().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self.get, key)
+        except (sqlite3.Error, ValueError) as e:
+            self.errors += 1
+            logger.warning("⚠️ Error al leer la caché SQLite: %s", e)
+            return None
+
+    async def aset(self, key: str, value: Dict[str, Any]) -> None:
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.set, key, value)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning("⚠️ Error al escribir la caché SQLite: %s", e)
+
+    async def aclear(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.clear)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": self._entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+        }
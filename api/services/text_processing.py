@@ -0,0 +1,51 @@
+from typing import List
+import re
+import unicodedata
+
+# Stopwords en español (sin tildes, ya que se comparan después de normalizar)
+SPANISH_STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes asi aun bajo bien cada como con contra cual
+cuales cuando de del desde donde dos el ella ellas ello ellos en entre era eran es esa esas ese eso esos
+esta estan estar estas este esto estos fue fueron ha hace hacen hacer han hasta hay la las le les lo los
+mas me mi mis mucho muy nada ni no nos nosotros o otra otras otro otros para pero poco por porque puede
+pueden puedo que quien se sea ser si sin sobre son su sus tambien te tengo ti tiene tienen todo todos tu
+tus un una unas uno unos usted ustedes va vamos y ya yo
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def fold_accents(text: str) -> str:
+    """Convierte a minúsculas y elimina tildes y diéresis (ñ -> n)"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (~4 caracteres por token en español), sin llamar al modelo"""
+    return (len(text) + 3) // 4
+
+
+def normalize_text(text: str) -> str:
+    """Forma canónica de una pregunta: sin tildes, mayúsculas, signos (¿?¡!) ni espacios extra.
+
+    "¿Qué es ChatGPT?" y "que es chatgpt" producen el mismo resultado.
+    """
+    return _NON_WORD_RE.sub(" ", fold_accents(text)).strip()
+
+
+def _stem(token: str) -> str:
+    """Stemming mínimo: quita el plural para que 'estafas' coincida con 'estafa'"""
+    if len(token) > 4 and token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Normaliza el texto y devuelve los términos relevantes (sin stopwords)"""
+    return [
+        _stem(token)
+        for token in _TOKEN_RE.findall(fold_accents(text))
+        if len(token) > 1 and token not in SPANISH_STOPWORDS
+    ]
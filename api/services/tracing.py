@@ -0,0 +1,168 @@
+"""
+Trazas livianas por solicitud: request ID y duración de cada etapa.
+
+`TracingMiddleware` (en `api/middleware.py`) abre una traza por solicitud y la
+deja en un ContextVar; los servicios marcan sus etapas con
+
+    with span("kb_search"):
+        ...
+
+o registran una espera ya medida con `record_span("queue", segundos)`. Solo las
+solicitudes muestreadas guardan etapas: en las demás `span` devuelve un
+contexto vacío compartido y el costo se reduce a leer el ContextVar. Las
+etapas de una solicitud muestreada salen en la cabecera `Server-Timing` y en
+un registro de log al terminar; `JsonFormatter` escribe los logs como JSON
+con el request ID de la solicitud en curso.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from contextlib import nullcontext
+from contextvars import ContextVar, Token
+from datetime import datetime, timezone
+import json
+import logging
+import os
+import re
+import time
+
+# Request IDs que se aceptan del cliente (cabecera X-Request-ID); si no, se genera uno
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+_NOOP_SPAN = nullcontext()
+
+
+class Trace:
+    """Etapas medidas de una solicitud, acumuladas por nombre en orden de aparición"""
+
+    __slots__ = ("request_id", "sampled", "started", "spans")
+
+    def __init__(self, request_id: str, sampled: bool):
+        self.request_id = request_id
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        # nombre -> [segundos, veces]; una etapa repetida (reintentos, lotes) se suma
+        self.spans: Dict[str, List[float]] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Valor de la cabecera `Server-Timing` (milisegundos), con el total hasta ahora"""
+        metrics = [f"{name};dur={seconds * 1000:.1f}" for name, (seconds, _) in list(self.spans.items())]
+        metrics.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "duration_ms": round(self.elapsed() * 1000, 2),
+            "spans": {
+                name: {"ms": round(seconds * 1000, 2), "count": int(count)}
+                for name, (seconds, count) in list(self.spans.items())
+            },
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def new_request_id() -> str:
+    return os.urandom(8).hex()
+
+
+def valid_request_id(value: Optional[str]) -> bool:
+    return bool(value) and _REQUEST_ID_RE.match(value) is not None
+
+
+def start_trace(request_id: str, sampled: bool) -> Tuple[Trace, Token]:
+    trace = Trace(request_id, sampled)
+    return trace, _current.set(trace)
+
+
+def end_trace(token: Token) -> None:
+    _current.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current.get()
+    return trace.request_id if trace is not None else None
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.trace.add(self.name, time.perf_counter() - self.started)
+
+
+def span(name: str) -> Any:
+    """Contexto que mide la etapa `name` de la solicitud en curso (si está muestreada)"""
+    trace = _current.get()
+    if trace is None or not trace.sampled:
+        return _NOOP_SPAN
+    return _Span(trace, name)
+
+
+def record_span(name: str, seconds: float) -> None:
+    """Suma una duración ya medida a la etapa `name` de la solicitud en curso"""
+    trace = _current.get()
+    if trace is not None and trace.sampled:
+        trace.add(name, seconds)
+
+
+class RequestIdFilter(logging.Filter):
+    """Agrega `request_id` a cada registro (o "-" fuera de una solicitud)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = current_request_id() or "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea: hora, nivel, logger, mensaje, request ID y la traza si la hay"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        trace = getattr(record, "trace", None)
+        if trace is not None:
+            entry.update(trace)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = "INFO", log_format: str = "text") -> None:
+    """Handler raíz con request ID, en texto ("text") o JSON por línea ("json")"""
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:[%(request_id)s] %(message)s"))
+    logging.basicConfig(level=level.upper(), handlers=[handler], force=True)
@@ -0,0 +1,109 @@
+"""
+Tiempo de importación al arrancar, desglosado por módulo.
+
+Importa `api.main` en un proceso nuevo con `python -X importtime` (la única
+forma de medir desde cero, sin módulos ya cargados) y resume el resultado:
+total, tiempo propio sumado por paquete y los módulos más costosos.
+
+    python -m api --profile-startup
+    python -m api.startup_profile --budget-ms 800 --top 20 --output startup.json
+
+Con `--budget-ms` (o STARTUP_IMPORT_BUDGET_MS) termina con código 1 si el
+total supera el presupuesto, para usarlo en CI.
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+from collections import defaultdict
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)\s*$")
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_ms: float
+    cumulative_ms: float
+
+
+def profile_imports(module: str = "api.main", env: Optional[Dict[str, str]] = None) -> List[ImportTiming]:
+    """Importa `module` en un subproceso y devuelve el tiempo de cada módulo importado"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env={**os.environ, **(env or {})},
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module}: {completed.stderr.strip().splitlines()[-1:]}")
+
+    timings = []
+    for line in completed.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, name = match.groups()
+            timings.append(ImportTiming(name, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return timings
+
+
+def summarize(timings: List[ImportTiming], module: str = "api.main", top: int = 15) -> Dict[str, object]:
+    """Total, tiempo propio por paquete de primer nivel y módulos más costosos"""
+    total = next((t.cumulative_ms for t in timings if t.module == module), sum(t.self_ms for t in timings))
+    packages: Dict[str, float] = defaultdict(float)
+    for timing in timings:
+        packages[timing.module.split(".")[0]] += timing.self_ms
+    return {
+        "module": module,
+        "total_ms": round(total, 1),
+        "modules": len(timings),
+        "packages": [
+            {"package": name, "self_ms": round(ms, 1)}
+            for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        ],
+        "slowest": [
+            {"module": t.module, "self_ms": round(t.self_ms, 1), "cumulative_ms": round(t.cumulative_ms, 1)}
+            for t in sorted(timings, key=lambda t: -t.self_ms)[:top]
+        ],
+    }
+
+
+def format_report(summary: Dict[str, object], budget_ms: float = 0.0) -> str:
+    lines = [f"⏱️ Importar {summary['module']}: {summary['total_ms']:.1f} ms ({summary['modules']} módulos)"]
+    if budget_ms > 0:
+        status = "✅ dentro" if summary["total_ms"] <= budget_ms else "❌ fuera"
+        lines.append(f"   {status} del presupuesto de {budget_ms:g} ms")
+    lines.append("📦 Por paquete (tiempo propio):")
+    lines.extend(f"   {row['self_ms']:>8.1f} ms  {row['package']}" for row in summary["packages"])
+    lines.append("🐢 Módulos más lentos (propio / acumulado):")
+    lines.extend(
+        f"   {row['self_ms']:>8.1f} ms  {row['cumulative_ms']:>8.1f} ms  {row['module']}" for row in summary["slowest"]
+    )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tiempo de importación al arrancar, por módulo")
+    parser.add_argument("--module", default="api.main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Falla si el total lo supera")
+    parser.add_argument("--output", help="Archivo JSON donde guardar el resumen")
+    args = parser.parse_args(argv)
+
+    budget_ms = args.budget_ms
+    if budget_ms is None:
+        from .config.config import settings
+        budget_ms = settings.STARTUP_IMPORT_BUDGET_MS
+
+    summary = summarize(profile_imports(args.module), args.module, args.top)
+    print(format_report(summary, budget_ms))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({**summary, "budget_ms": budget_ms}, f, indent=2)
+    return 1 if budget_ms > 0 and summary["total_ms"] > budget_ms else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
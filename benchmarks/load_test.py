@@ -0,0 +1,279 @@
+"""
+Prueba de carga del simulador con un modelo local (`SimulatorProvider`, sin red).
+
+Ejecuta la app en el mismo proceso (ASGI) o levantando uvicorn en un puerto
+local, con concurrencia y mezcla de consultas configurables, y reporta RPS y
+latencias p50/p95/p99. Los resultados se pueden guardar en JSON para comparar
+entre commits.
+
+Ejemplos:
+    python -m benchmarks.load_test --requests 2000 --concurrency 50
+    python -m benchmarks.load_test --mode uvicorn --rag-ratio 0.8 --hit-ratio 0.5 --output bench.json
+    python -m benchmarks.load_test --output nuevo.json --compare bench.json
+
+Los límites del servicio se configuran con las variables de entorno habituales
+(por ejemplo GEMINI_MAX_CONCURRENCY=64).
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+try:
+    import httpx
+except ImportError:
+    print("❌ Este benchmark necesita httpx: pip install httpx")
+    raise SystemExit(1)
+
+from api.services.llm_providers import SimulatorProvider
+
+# Consultas repetidas: simulan las preguntas frecuentes de la clase
+HOT_RAG_QUESTIONS = [
+    "¿Qué es ChatGPT?",
+    "¿Qué es la inteligencia artificial?",
+    "cómo hacer buenos prompts",
+    "cuidado con estafas",
+    "¿Cómo puedo usar ChatGPT para planificar mis vacaciones?",
+    "¿Qué hago si olvido mi contraseña del banco?",
+]
+HOT_CHAT_PROMPTS = [
+    "Explícame qué es WhatsApp como si tuviera 65 años y nunca lo usé",
+    "Dame 5 consejos para mantener mi computadora segura",
+    "Ayúdame a escribir un email para cancelar una suscripción",
+]
+
+
+def install_simulator(provider: SimulatorProvider) -> None:
+    """Usa el simulador local como proveedor del servicio en todos los modos"""
+    from api.config.config import settings
+    from api.services import simulador_service
+
+    settings.LLM_PROVIDER = "simulator"
+    for mode in simulador_service.PROMPTS:
+        simulador_service._providers[mode] = provider
+
+
+def build_workload(total: int, rag_ratio: float, hit_ratio: float, seed: int) -> List[Tuple[str, str, Dict[str, str]]]:
+    """Genera la lista de solicitudes (tipo, ruta, cuerpo)"""
+    rnd = random.Random(seed)
+    workload = []
+    for _ in range(total):
+        hot = rnd.random() < hit_ratio
+        if rnd.random() < rag_ratio:
+            question = rnd.choice(HOT_RAG_QUESTIONS) if hot else f"Pregunta única de prueba {uuid.UUID(int=rnd.getrandbits(128))}"
+            workload.append(("rag", "/simulador/rag", {"question": question}))
+        else:
+            prompt = rnd.choice(HOT_CHAT_PROMPTS) if hot else f"Prompt único de prueba {uuid.UUID(int=rnd.getrandbits(128))}"
+            workload.append(("chat", "/simulador/chat", {"prompt": prompt}))
+    return workload
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano (valores ya ordenados)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int], elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        "requests": count,
+        "rps": round(count / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(ordered) / count * 1000, 3) if count else 0.0,
+            "p50": round(percentile(ordered, 50) * 1000, 3),
+            "p95": round(percentile(ordered, 95) * 1000, 3),
+            "p99": round(percentile(ordered, 99) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3) if count else 0.0,
+        },
+        "status_codes": {str(code): n for code, n in sorted(statuses.items())},
+    }
+
+
+async def run_load(client: "httpx.AsyncClient", workload: List[Tuple[str, str, Dict[str, str]]], concurrency: int) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {"chat": [], "rag": []}
+    statuses: Dict[str, Dict[int, int]] = {"chat": {}, "rag": {}}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < len(workload):
+            kind, path, body = workload[next_index]
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            latencies[kind].append(time.perf_counter() - started)
+            statuses[kind][status] = statuses[kind].get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    all_statuses: Dict[int, int] = {}
+    for per_kind in statuses.values():
+        for code, n in per_kind.items():
+            all_statuses[code] = all_statuses.get(code, 0) + n
+
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "overall": summarize(latencies["chat"] + latencies["rag"], all_statuses, elapsed),
+        "chat": summarize(latencies["chat"], statuses["chat"], elapsed),
+        "rag": summarize(latencies["rag"], statuses["rag"], elapsed),
+    }
+
+
+async def run_in_process(app, workload, concurrency: int) -> Dict[str, Any]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        return await run_load(client, workload, concurrency)
+
+
+def run_with_uvicorn(app, workload, concurrency: int) -> Dict[str, Any]:
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    async def drive():
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits) as client:
+            return await run_load(client, workload, concurrency)
+
+    try:
+        return asyncio.run(drive())
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n📊 Resultados ({report['config']['mode']}, concurrencia {report['config']['concurrency']})")
+    for section in ("overall", "chat", "rag"):
+        data = report["results"][section]
+        if not data["requests"]:
+            continue
+        lat = data["latency_ms"]
+        print(
+            f"  {section:8s} {data['requests']:6d} req  {data['rps']:9.2f} rps  "
+            f"p50 {lat['p50']:8.2f} ms  p95 {lat['p95']:8.2f} ms  p99 {lat['p99']:8.2f} ms  "
+            f"status {data['status_codes']}"
+        )
+    print(f"  llamadas al modelo: {report['results']['upstream_calls']}")
+
+
+def print_comparison(report: Dict[str, Any], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n🔍 Comparación con {baseline_path} (commit {baseline.get('git_commit')})")
+    for section in ("overall", "chat", "rag"):
+        new = report["results"][section]
+        old = baseline["results"].get(section)
+        if not old or not new["requests"] or not old["requests"]:
+            continue
+        deltas = [f"rps {_delta(old['rps'], new['rps'])}"]
+        for key in ("p50", "p95", "p99"):
+            deltas.append(f"{key} {_delta(old['latency_ms'][key], new['latency_ms'][key])}")
+        print(f"  {section:8s} " + "  ".join(deltas))
+
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return f"{new}"
+    return f"{new} ({(new - old) / old * 100:+.1f}%)"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga del simulador con un modelo local")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rag-ratio", type=float, default=0.7, help="Fracción de solicitudes a /simulador/rag")
+    parser.add_argument("--hit-ratio", type=float, default=0.5, help="Fracción de consultas repetidas (frecuentes)")
+    parser.add_argument("--latency-median", type=float, default=0.8, help="Latencia mediana del modelo (s)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Dispersión log-normal de la latencia")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de error del modelo")
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=0.0,
+        help="Velocidad de generación del modelo (0 = toda la latencia es hasta el primer token)",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--compare", help="Archivo JSON de una corrida anterior para comparar")
+    args = parser.parse_args(argv)
+
+    from api.main import create_app
+
+    # Los logs por solicitud distorsionan las mediciones
+    logging.getLogger().setLevel(logging.WARNING)
+
+    model = SimulatorProvider(
+        args.latency_median, args.latency_sigma, args.tokens_per_second, args.error_rate,
+        reply_tokens=300, seed=args.seed,
+    )
+    install_simulator(model)
+    app = create_app()
+    workload = build_workload(args.requests, args.rag_ratio, args.hit_ratio, args.seed)
+
+    if args.mode == "uvicorn":
+        results = run_with_uvicorn(app, workload, args.concurrency)
+    else:
+        results = asyncio.run(run_in_process(app, workload, args.concurrency))
+    results["upstream_calls"] = model.calls
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output", "compare")
+        },
+        "results": results,
+    }
+
+    print_report(report)
+    if args.compare:
+        print_comparison(report, args.compare)
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Costo por solicitud de la serialización de respuestas JSON.
+
+Compara, con una respuesta típica de /simulador/rag:
+- "dict": devolver el diccionario sin `response_model` (`jsonable_encoder` +
+  `json.dumps`), el camino anterior de los endpoints.
+- "model": devolver el diccionario con `response_model` (FastAPI valida la
+  salida contra el modelo y la serializa con Pydantic).
+- "fast": `FastJSONResponse` con el diccionario (orjson si está instalado).
+- "precomputed": cuerpo ya codificado (`PrecomputedJSON`), como / y /health.
+
+Mide solo la serialización y además la solicitud completa por la app ASGI
+(llamando a la app directamente, sin red ni cliente HTTP), y muestra el
+tamaño con y sin gzip.
+
+Ejemplos:
+    python -m benchmarks.serialization_bench
+    python -m benchmarks.serialization_bench --iterations 20000 --answer-chars 4000
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import gzip
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+
+from api.responses import ORJSON_AVAILABLE, FastJSONResponse, PrecomputedJSON, dumps
+from api.routes.simulador_router import RagResponse
+
+
+def sample_payload(answer_chars: int) -> Dict[str, Any]:
+    """Respuesta de RAG con pasajes como fuentes, tildes y emojis"""
+    sentence = "La inteligencia artificial ayuda a redactar correos y resolver dudas cotidianas 🙂. "
+    return {
+        "answer": (sentence * (answer_chars // len(sentence) + 1))[:answer_chars],
+        "sources": [
+            {"type": "passage", "id": f"doc{i}#a1b2c3d4", "doc_id": f"doc{i}", "title": f"Título {i}", "score": 0.8123 - i / 10}
+            for i in range(4)
+        ],
+        "total_results": 4,
+        "source_type": "gemini_ai",
+        "tokens_used": {"prompt_tokens": 512, "candidates_tokens": 240, "total_tokens": 752},
+        "cached": False,
+    }
+
+
+def build_app(payload: Dict[str, Any]) -> FastAPI:
+    app = FastAPI()
+    precomputed = PrecomputedJSON(payload)
+
+    @app.get("/dict")
+    async def dict_path():
+        return payload
+
+    @app.get("/model", response_model=RagResponse)
+    async def model_path():
+        return payload
+
+    @app.get("/fast", response_model=RagResponse)
+    async def fast_path():
+        return FastJSONResponse(payload)
+
+    @app.get("/precomputed")
+    async def precomputed_path():
+        return precomputed.response()
+
+    return app
+
+
+def time_per_call(function: Callable[[], Any], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - started) / iterations
+
+
+async def request(app: FastAPI, path: str) -> int:
+    """Una solicitud GET por la interfaz ASGI; devuelve el tamaño del cuerpo"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    size = 0
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return size
+
+
+async def time_per_request(app: FastAPI, path: str, iterations: int) -> float:
+    for _ in range(min(200, iterations)):
+        await request(app, path)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await request(app, path)
+    return (time.perf_counter() - started) / iterations
+
+
+async def run(payload: Dict[str, Any], iterations: int) -> Dict[str, Dict[str, float]]:
+    precomputed = PrecomputedJSON(payload)
+    serialize = {
+        "dict": lambda: json.dumps(jsonable_encoder(payload), ensure_ascii=False).encode("utf-8"),
+        "model": lambda: RagResponse.model_validate(payload).model_dump_json().encode("utf-8"),
+        "fast": lambda: dumps(payload),
+        "precomputed": lambda: precomputed.body,
+    }
+    results = {name: {"serialize_us": time_per_call(function, iterations) * 1e6} for name, function in serialize.items()}
+
+    app = build_app(payload)
+    for name in results:
+        results[name]["request_us"] = await time_per_request(app, f"/{name}", iterations // 5 or 1) * 1e6
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Costo de serializar las respuestas JSON")
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--answer-chars", type=int, default=1500)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args(argv)
+
+    payload = sample_payload(args.answer_chars)
+    body = dumps(payload)
+    print(f"📦 Respuesta de {len(body)} bytes ({len(gzip.compress(body))} con gzip); orjson: {'sí' if ORJSON_AVAILABLE else 'no'}")
+
+    results = asyncio.run(run(payload, args.iterations))
+    baseline = results["dict"]["request_us"]
+    print(f"📊 {'camino':>12}  {'serialización':>13}  {'solicitud ASGI':>14}  {'ahorro':>8}")
+    for name, row in results.items():
+        print(
+            f"   {name:>12}  {row['serialize_us']:>11.1f}µs  {row['request_us']:>12.1f}µs  "
+            f"{baseline - row['request_us']:>6.1f}µs"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "bytes": len(body), "results": results}, f, indent=2)
+        print(f"💾 Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
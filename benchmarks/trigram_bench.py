@@ -0,0 +1,123 @@
+"""
+Latencia de la búsqueda aproximada por trigramas a medida que crece la base.
+
+Arma índices sintéticos con títulos combinando palabras del vocabulario de
+knowledge_base/ y consulta variantes con errores de tipeo (letras cambiadas,
+faltantes, sin tildes, palabras pegadas). Reporta el tiempo de construcción,
+las latencias p50/p95/p99 por consulta y la fracción de consultas que
+recuperan el título original como primer resultado.
+
+Ejemplos:
+    python -m benchmarks.trigram_bench
+    python -m benchmarks.trigram_bench --sizes 1000 10000 50000 --queries 2000
+"""
+
+from typing import List, Optional, Tuple
+import argparse
+import json
+import random
+import time
+
+from api.services.kb_store import KnowledgeBase
+from api.services.text_processing import SPANISH_STOPWORDS, fold_accents
+from api.services.trigram_index import TrigramIndex
+
+
+def vocabulary(directory: str) -> List[str]:
+    """Palabras de la base de conocimiento real, para que los títulos se parezcan a los del curso"""
+    kb, _ = KnowledgeBase.load(directory)
+    words = set()
+    for doc in kb.documents:
+        for word in f"{doc['title']} {doc['content']}".split():
+            word = word.strip(".,;:¿?¡!()\"'").lower()
+            if len(word) > 3 and word.isalpha() and fold_accents(word) not in SPANISH_STOPWORDS:
+                words.add(word)
+    return sorted(words)
+
+
+def make_titles(words: List[str], size: int, rng: random.Random) -> List[str]:
+    titles = set()
+    while len(titles) < size:
+        titles.add(" ".join(rng.sample(words, rng.randint(2, 4))))
+    return sorted(titles)
+
+
+def misspell(text: str, rng: random.Random) -> str:
+    """Un error de tipeo al azar: sin tildes, letra faltante, letras invertidas o palabras pegadas"""
+    kind = rng.choice(["accents", "drop", "swap", "join"])
+    if kind == "accents":
+        return fold_accents(text)
+    if kind == "join" and " " in text:
+        position = rng.choice([i for i, ch in enumerate(text) if ch == " "])
+        return text[:position] + text[position + 1:]
+    position = rng.randrange(1, max(2, len(text) - 1))
+    if kind == "swap" and position < len(text) - 1:
+        return text[:position] + text[position + 1] + text[position] + text[position + 2:]
+    return text[:position] + text[position + 1:]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(size: int, words: List[str], queries: int, min_similarity: float, seed: int) -> Tuple[float, List[float], float]:
+    rng = random.Random(seed)
+    titles = make_titles(words, size, rng)
+
+    started = time.perf_counter()
+    index = TrigramIndex(enumerate(titles))
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    found = 0
+    for _ in range(queries):
+        target = rng.randrange(len(titles))
+        query = misspell(titles[target], rng)
+        started = time.perf_counter()
+        matches = index.search(query, limit=1, min_similarity=min_similarity)
+        latencies.append(time.perf_counter() - started)
+        found += bool(matches) and matches[0][0] == target
+    return build_seconds, latencies, found / queries
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Latencia del índice de trigramas según el tamaño de la base")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000, 10000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--min-similarity", type=float, default=0.5)
+    parser.add_argument("--kb-directory", default="knowledge_base")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args(argv)
+
+    words = vocabulary(args.kb_directory)
+    print(f"📚 Vocabulario: {len(words)} palabras de {args.kb_directory}")
+    print(f"📊 {'entradas':>8}  {'construcción':>12}  {'p50':>9}  {'p95':>9}  {'p99':>9}  {'aciertos':>8}")
+
+    results = []
+    for size in args.sizes:
+        build_seconds, latencies, recall = run(size, words, args.queries, args.min_similarity, args.seed)
+        row = {
+            "entries": size,
+            "build_ms": round(build_seconds * 1000, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 4),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 4),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 4),
+            "top1_recall": round(recall, 4),
+        }
+        results.append(row)
+        print(
+            f"   {size:>8}  {row['build_ms']:>10.1f}ms  {row['p50_ms']:>7.3f}ms  "
+            f"{row['p95_ms']:>7.3f}ms  {row['p99_ms']:>7.3f}ms  {recall:>8.1%}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"💾 Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from api.services.kb_store import KnowledgeBase
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KB_DIRECTORY = os.path.join(PROJECT_DIR, "knowledge_base")
+
+
+class FakeClock:
+    """Reloj manual para cachés, cuotas y circuit breaker"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture(scope="session")
+def kb() -> KnowledgeBase:
+    """Base de conocimiento real del curso (knowledge_base/)"""
+    knowledge_base, _ = KnowledgeBase.load(KB_DIRECTORY)
+    return knowledge_base
+
+
+@pytest.fixture
+def use_provider(monkeypatch):
+    """Instala un proveedor (p. ej. el simulador) en todos los modos del servicio; se restaura al terminar"""
+    from api.services import simulador_service
+
+    def install(provider):
+        monkeypatch.setattr(simulador_service.settings, "LLM_PROVIDER", "simulator")
+        monkeypatch.setattr(simulador_service, "_providers", {mode: provider for mode in simulador_service.PROMPTS})
+        return provider
+
+    return install
+
+
+@pytest.fixture
+def app():
+    from api.main import create_app
+
+    return create_app()
+
+
+def asgi_client(app, **kwargs):
+    """Cliente HTTP contra la app en memoria, sin servidor (usar dentro de `asyncio.run`)"""
+    import httpx
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", **kwargs)
@@ -0,0 +1,59 @@
+import asyncio
+
+from api.services import simulador_service
+from api.services.llm_providers import SimulatorProvider
+
+from .conftest import asgi_client
+
+
+def run_batch(items, handler):
+    return asyncio.run(simulador_service._run_batch(items, handler))
+
+
+def test_results_keep_input_order_and_duplicates_run_once():
+    calls = []
+
+    async def handler(item):
+        calls.append(item)
+        # Las más cortas terminan primero: el orden de salida no depende del de llegada
+        await asyncio.sleep(0.001 * len(item))
+        return {"reply": item.upper()}
+
+    batch = run_batch(["cccc", "a", "¿CCCC?", "bb", "a"], handler)
+    assert sorted(calls) == ["a", "bb", "cccc"]
+    assert [r["index"] for r in batch["results"]] == [0, 1, 2, 3, 4]
+    assert [r["result"]["reply"] for r in batch["results"]] == ["CCCC", "A", "CCCC", "BB", "A"]
+    assert (batch["total"], batch["unique"], batch["errors"]) == (5, 3, 0)
+
+
+def test_failing_item_reports_its_own_error():
+    async def handler(item):
+        if item == "falla":
+            raise RuntimeError("sin conexión")
+        if item == "vacío":
+            return {"error": "El prompt está vacío"}
+        return {"reply": item}
+
+    batch = run_batch(["hola", "falla", "vacío", "chau"], handler)
+    assert batch["errors"] == 2
+    assert batch["results"][0] == {"index": 0, "result": {"reply": "hola"}}
+    assert batch["results"][1]["error"] == "Error inesperado: sin conexión"
+    assert batch["results"][2] == {"index": 2, "error": "El prompt está vacío"}
+    assert batch["results"][3] == {"index": 3, "result": {"reply": "chau"}}
+
+
+def test_too_many_items_is_rejected_with_400(app, use_provider, monkeypatch):
+    use_provider(SimulatorProvider(median_latency=0.001, sigma=0.0, tokens_per_second=0, seed=1))
+    monkeypatch.setattr(simulador_service.settings, "BATCH_MAX_ITEMS", 3)
+
+    async def run():
+        async with asgi_client(app) as client:
+            too_many = await client.post("/simulador/chat/batch", json={"prompts": ["a", "b", "c", "d"]})
+            allowed = await client.post("/simulador/rag/batch", json={"questions": ["¿Qué es ChatGPT?", "hola", "hola"]})
+            return too_many, allowed
+
+    too_many, allowed = asyncio.run(run())
+    assert too_many.status_code == 400
+    assert "máximo es 3" in too_many.json()["detail"]
+    assert allowed.status_code == 200
+    assert allowed.json()["unique"] == 2
@@ -0,0 +1,120 @@
+from api.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def make_breaker(clock, **overrides):
+    options = dict(
+        window_size=10, min_calls=4, error_rate_threshold=0.5, slow_call_seconds=5.0,
+        slow_call_rate_threshold=0.8, open_seconds=30.0, half_open_max_calls=1, clock=clock,
+    )
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.min_calls):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_opens_after_error_rate_with_min_calls(clock):
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CLOSED  # todavía no hay min_calls resultados
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_opens_on_slow_calls(clock):
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.allow()
+        breaker.record_success(6.0)
+    assert breaker.state == OPEN
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = make_breaker(clock)
+    open_breaker(breaker)
+    clock.advance(30)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # una sola llamada de prueba a la vez
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = make_breaker(clock)
+    open_breaker(breaker)
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+
+
+def test_ignored_probe_frees_the_slot(clock):
+    breaker = make_breaker(clock)
+    open_breaker(breaker)
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record_ignored()
+    assert breaker.allow()
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+
+
+def test_lost_probe_is_released_after_probe_timeout(clock):
+    breaker = make_breaker(clock, probe_timeout=10.0)
+    open_breaker(breaker)
+    clock.advance(30)
+    assert breaker.allow()  # prueba que nunca informa su resultado
+    clock.advance(5)
+    assert not breaker.allow()
+    clock.advance(6)
+    assert breaker.allow()
+    assert breaker.lost_probes == 1
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    breaker.record_ignored()  # la prueba perdida informa tarde: no deja el contador negativo
+    assert breaker.allow()
+
+
+def test_cancelled_stream_during_half_open_frees_the_probe(clock, monkeypatch):
+    import asyncio
+
+    from api.services import simulador_service
+    from api.services.llm_providers import SimulatorProvider
+
+    breaker = make_breaker(clock)
+    monkeypatch.setattr(simulador_service, "_breaker", breaker)
+    monkeypatch.setattr(simulador_service.settings, "BREAKER_ENABLED", True)
+    open_breaker(breaker)
+    clock.advance(30)
+    provider = SimulatorProvider(median_latency=0.001, sigma=0.0, tokens_per_second=100.0, seed=1)
+
+    async def consume():
+        async for _ in simulador_service._stream_generate(provider, "hola", "chat"):
+            await asyncio.sleep(0)
+
+    async def run():
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.02)  # el stream ya tomó la única prueba
+        assert breaker.state == HALF_OPEN
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    assert breaker.allow()
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import pytest
+
+from api.services import simulador_service
+from api.services.concurrency import ConcurrencyLimiter, UpstreamBusyError
+from api.services.llm_providers import SimulatorProvider
+
+from .conftest import asgi_client
+
+
+def test_counters_track_in_flight_and_queued_calls():
+    limiter = ConcurrencyLimiter(max_concurrency=1, queue_timeout=1.0)
+    seen = []
+
+    async def call(hold):
+        async with limiter.slot():
+            seen.append((limiter.in_flight, limiter.waiting))
+            await asyncio.sleep(hold)
+
+    async def run():
+        first = asyncio.create_task(call(0.05))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(call(0))
+        await asyncio.sleep(0.01)
+        assert (limiter.in_flight, limiter.waiting) == (1, 1)
+        await asyncio.gather(first, second)
+
+    asyncio.run(run())
+    assert seen == [(1, 0), (1, 0)]
+    stats = limiter.stats()
+    assert (stats["in_flight"], stats["queue_depth"], stats["max_queue_depth"]) == (0, 0, 1)
+    assert stats["acquired"] == 2 and stats["rejected"] == 0
+    assert stats["wait_seconds_max"] > 0
+
+
+def test_queue_timeout_raises_busy_and_frees_the_queue():
+    limiter = ConcurrencyLimiter(max_concurrency=1, queue_timeout=0.05)
+
+    async def run():
+        async with limiter.slot():
+            started = time.perf_counter()
+            with pytest.raises(UpstreamBusyError):
+                async with limiter.slot():
+                    pass
+            return time.perf_counter() - started
+
+    waited = asyncio.run(run())
+    assert 0.05 <= waited < 0.5
+    assert limiter.rejected == 1 and limiter.waiting == 0 and limiter.in_flight == 0
+
+
+def test_full_limiter_returns_503_within_queue_timeout(app, use_provider, monkeypatch):
+    use_provider(SimulatorProvider(median_latency=0.5, sigma=0.0, tokens_per_second=0, seed=1))
+    monkeypatch.setattr(simulador_service, "_upstream_limiter", ConcurrencyLimiter(max_concurrency=1, queue_timeout=0.1))
+    monkeypatch.setattr(simulador_service.settings, "GEMINI_HEDGE_ENABLED", False)
+
+    async def run():
+        async with asgi_client(app) as client:
+            slow = asyncio.create_task(client.post("/simulador/chat", json={"prompt": "primera consulta"}))
+            await asyncio.sleep(0.05)  # la primera ya ocupa el único lugar
+            started = time.perf_counter()
+            busy = await client.post("/simulador/chat", json={"prompt": "segunda consulta"})
+            elapsed = time.perf_counter() - started
+            return (await slow), busy, elapsed
+
+    slow, busy, elapsed = asyncio.run(run())
+    assert slow.status_code == 200
+    assert busy.status_code == 503
+    assert "ocupado" in busy.json()["detail"]
+    assert elapsed < 0.4
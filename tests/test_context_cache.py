@@ -0,0 +1,40 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from api.services import simulador_service
+from api.services.llm_providers import GeminiProvider
+
+
+class FakeGenai:
+    """SDK mínimo: registra en qué hilo se crea el contexto cacheado"""
+
+    def __init__(self):
+        self.create_threads = []
+        self.caching = SimpleNamespace(CachedContent=SimpleNamespace(create=self._create))
+        self.GenerativeModel = SimpleNamespace(from_cached_content=lambda cached: ("cached", cached))
+
+    def _create(self, **kwargs):
+        self.create_threads.append(threading.current_thread())
+        return kwargs["display_name"]
+
+
+def test_context_cache_is_created_off_the_event_loop(monkeypatch):
+    fake = FakeGenai()
+    monkeypatch.setattr(simulador_service, "genai", fake)
+    monkeypatch.setattr(simulador_service, "_providers", {
+        mode: GeminiProvider(("plain", mode), "gemini-test") for mode in simulador_service.PROMPTS
+    })
+    monkeypatch.setattr(simulador_service, "_cached_context_expiry", {})
+
+    async def run():
+        task = asyncio.create_task(simulador_service.refresh_context_caches())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run())
+    assert len(fake.create_threads) == len(simulador_service.PROMPTS)
+    assert threading.main_thread() not in fake.create_threads
+    for mode in simulador_service.PROMPTS:
+        assert simulador_service._providers[mode].model[0] == "cached"
+        assert mode in simulador_service._cached_context_expiry
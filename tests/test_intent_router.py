@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from api.services.intent_router import IntentRouter
+
+from .conftest import PROJECT_DIR
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter.from_file(os.path.join(PROJECT_DIR, "data", "intents.jsonl"))
+
+
+class FixedModel:
+    """Modelo que siempre predice la misma intención con la misma confianza"""
+
+    def __init__(self, intent, confidence):
+        self.prediction = (intent, confidence)
+
+    def predict(self, text):
+        return self.prediction
+
+
+def test_pure_greetings_and_thanks_answer_instantly(router):
+    for text, intent in [
+        ("hola", "greeting"),
+        ("¡Buenas tardes, profe!", "greeting"),
+        ("muchas gracias", "thanks"),
+        ("chau, hasta mañana", "thanks"),
+    ]:
+        decision = router.route(text)
+        assert (decision.intent, decision.outcome, decision.source) == (intent, "instant", "rule"), text
+
+
+def test_greeting_or_thanks_with_a_question_goes_to_the_model(router):
+    for text in [
+        "gracias, ¿y cómo me registro?",
+        "hola buen día, quería saber cómo crear una cuenta",
+        "gracias profe, ¿cómo descargo la app?",
+    ]:
+        assert router.route(text).outcome == "llm", text
+
+
+def test_model_never_answers_instantly():
+    for intent in ("greeting", "thanks"):
+        decision = IntentRouter(FixedModel(intent, 0.99), min_confidence=0.85).route("hola, ¿qué es un prompt?")
+        assert (decision.intent, decision.outcome, decision.source) == (intent, "llm", "model")
+
+
+def test_off_topic_questions(router):
+    assert router.route("¿quién ganó el partido de fútbol ayer?").outcome == "off_topic"
+    assert router.route("asdkjh123").outcome == "off_topic"
+    assert router.route("¿Qué es ChatGPT?").outcome == "llm"
+    # Por debajo del umbral la pregunta sigue hacia el modelo
+    assert IntentRouter(FixedModel("off_topic", 0.6), min_confidence=0.85).route("¿y el clima?").outcome == "llm"
+
+
+def test_router_trained_once_when_warm_up_and_requests_race(monkeypatch):
+    import asyncio
+
+    from api.services import simulador_service
+
+    trained = []
+    real_from_file = IntentRouter.from_file
+
+    def counting_from_file(path, min_confidence=0.85):
+        trained.append(path)
+        return real_from_file(path, min_confidence)
+
+    monkeypatch.setattr(simulador_service, "_intent_router", None)
+    monkeypatch.setattr(simulador_service, "_intent_router_lock", None)
+    monkeypatch.setattr(simulador_service.IntentRouter, "from_file", staticmethod(counting_from_file))
+
+    async def run():
+        await asyncio.gather(
+            simulador_service._load_intent_router(),
+            simulador_service._route_question("hola"),
+            simulador_service._route_question("¿qué es un prompt?"),
+        )
+
+    asyncio.run(run())
+    assert len(trained) == 1
@@ -0,0 +1,53 @@
+import numpy as np
+
+from api.services.kb_embeddings import EmbeddingIndex, hashing_embedder
+
+DOCUMENTS = [
+    {"id": "ia", "title": "Inteligencia artificial", "category": "fundamentos",
+     "content": "La inteligencia artificial permite a las máquinas aprender de datos."},
+    {"id": "seguridad", "title": "Contraseñas seguras", "category": "seguridad",
+     "content": "Usa contraseñas largas y distintas en cada sitio."},
+]
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.texts = 0
+
+    def __call__(self, texts):
+        self.texts += len(texts)
+        return hashing_embedder(texts)
+
+
+def test_save_and_mmap_round_trip(tmp_path):
+    path = str(tmp_path / "index.npy")
+    embedder = CountingEmbedder()
+    built = EmbeddingIndex.load_or_build(DOCUMENTS, embedder, "hashing", path=path)
+    assert built.embedded_chunks == len(built.chunks) == embedder.texts
+
+    reloaded_embedder = CountingEmbedder()
+    reloaded = EmbeddingIndex.load_or_build(DOCUMENTS, reloaded_embedder, "hashing", path=path)
+    assert reloaded_embedder.texts == 0
+    assert isinstance(reloaded.matrix, np.memmap)
+    assert reloaded.matrix.dtype == np.float32
+    np.testing.assert_array_equal(np.asarray(reloaded.matrix), np.asarray(built.matrix))
+    assert reloaded.search("contraseñas largas", limit=1)[0].document["id"] == "seguridad"
+
+
+def test_only_changed_chunks_are_embedded_again(tmp_path):
+    path = str(tmp_path / "index.npy")
+    EmbeddingIndex.load_or_build(DOCUMENTS, CountingEmbedder(), "hashing", path=path)
+
+    changed = [DOCUMENTS[0], {**DOCUMENTS[1], "content": "Activa la verificación en dos pasos."}]
+    embedder = CountingEmbedder()
+    index = EmbeddingIndex.load_or_build(changed, embedder, "hashing", path=path)
+    assert 0 < index.embedded_chunks < len(index.chunks)
+    assert embedder.texts == index.embedded_chunks
+
+
+def test_other_embedder_rebuilds_everything(tmp_path):
+    path = str(tmp_path / "index.npy")
+    EmbeddingIndex.load_or_build(DOCUMENTS, CountingEmbedder(), "hashing", path=path)
+    embedder = CountingEmbedder()
+    index = EmbeddingIndex.load_or_build(DOCUMENTS, embedder, "otro", path=path)
+    assert index.embedded_chunks == len(index.chunks)
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from api.services import simulador_service
+from api.services.kb_store import KnowledgeBase, directory_signature
+
+
+def write_doc(directory, doc_id, content):
+    text = f"---\nid: {doc_id}\ntitle: Documento {doc_id}\ncategory: prueba\n---\n\n{content}"
+    (directory / f"{doc_id}.md").write_text(text, encoding="utf-8")
+
+
+@pytest.fixture
+def service_kb(tmp_path, monkeypatch):
+    """El servicio apunta a una base temporal sin cargar; se restaura al terminar"""
+    for doc_id, topic in [("a", "contraseñas seguras"), ("b", "escribir prompts"), ("c", "límites del modelo")]:
+        write_doc(tmp_path, doc_id, f"Este documento explica {topic} con ejemplos.")
+    monkeypatch.setattr(simulador_service.settings, "KB_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(simulador_service.settings, "RAG_EMBEDDER", "hashing")
+    monkeypatch.setattr(simulador_service.settings, "RAG_EMBEDDINGS_PATH", "")
+    monkeypatch.setattr(simulador_service, "_kb", None)
+    monkeypatch.setattr(simulador_service, "_kb_reload_lock", None)
+    monkeypatch.setattr(simulador_service, "_kb_last_reload", None)
+    return tmp_path
+
+
+def test_reload_reindexes_only_changed_documents(service_kb):
+    async def scenario():
+        first = await simulador_service._ensure_kb()
+        simulador_service._get_embedding_index(first)
+        write_doc(service_kb, "b", "Este documento explica cómo escribir prompts claros y con contexto.")
+        changes = await simulador_service.reload_knowledge_base()
+        return first, simulador_service._kb, changes
+
+    first, second, changes = asyncio.run(scenario())
+    assert (changes["updated"], changes["unchanged"], changes["added"], changes["removed"]) == (1, 2, 0, 0)
+
+    # Los documentos sin cambios reutilizan su análisis y sus pasajes
+    for doc_id in ("a", "c"):
+        assert second._analyzed[doc_id] is first._analyzed[doc_id]
+        assert second._passages[doc_id] is first._passages[doc_id]
+    assert second._analyzed["b"] is not first._analyzed["b"]
+
+    # Solo se calculan los embeddings de los fragmentos del documento editado
+    old, new = first.embedding_index, second.embedding_index
+    reused = set(old.chunk_hashes) & set(new.chunk_hashes)
+    assert changes["embedded_chunks"] == len(new.chunk_hashes) - len(reused) > 0
+    old_rows = dict(zip(old.chunk_hashes, old.matrix))
+    for chunk_hash, row in zip(new.chunk_hashes, new.matrix):
+        if chunk_hash in reused:
+            np.testing.assert_array_equal(row, old_rows[chunk_hash])
+
+
+def test_unreadable_files_do_not_trigger_endless_reloads(tmp_path):
+    write_doc(tmp_path, "a", "Texto legible.")
+    (tmp_path / "roto.md").write_bytes(b"---\nid: roto\n\xff\xfe no es UTF-8")
+    kb, changes = KnowledgeBase.load(str(tmp_path))
+    assert changes["unreadable"] == 1 and changes["documents"] == 1
+    # La firma incluye el archivo fallido: el watcher no ve cambios hasta que se edite
+    assert directory_signature(str(tmp_path)) == kb.signature
+
+    write_doc(tmp_path, "roto", "Ahora se puede leer.")
+    assert directory_signature(str(tmp_path)) != kb.signature
+    fixed, changes = KnowledgeBase.load(str(tmp_path), previous=kb)
+    assert (changes["unreadable"], changes["added"], changes["unchanged"]) == (0, 1, 1)
+    assert fixed.unreadable == {}
+
+
+def test_watcher_ignores_an_unchanged_unreadable_file(service_kb, monkeypatch):
+    (service_kb / "roto.md").write_bytes(b"\xff\xfe")
+    reloads = []
+
+    async def fake_reload():
+        reloads.append(True)
+
+    monkeypatch.setattr(simulador_service, "reload_knowledge_base", fake_reload)
+
+    async def scenario():
+        await simulador_service._ensure_kb()
+        watcher = asyncio.create_task(simulador_service.watch_knowledge_base(0.001))
+        await asyncio.sleep(0.05)
+        watcher.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await watcher
+
+    asyncio.run(scenario())
+    assert reloads == []
+
+
+def test_first_rag_request_loads_the_knowledge_base_off_the_event_loop(service_kb, monkeypatch):
+    loaded_in = []
+    original_load = KnowledgeBase.load.__func__
+
+    def recording_load(cls, *args, **kwargs):
+        loaded_in.append(threading.current_thread())
+        return original_load(cls, *args, **kwargs)
+
+    monkeypatch.setattr(KnowledgeBase, "load", classmethod(recording_load))
+    monkeypatch.setattr(simulador_service.settings, "RAG_CACHE_ENABLED", False)
+
+    async def scenario():
+        results = await asyncio.gather(*(simulador_service.rag_answer("contraseñas seguras") for _ in range(3)))
+        return results, threading.current_thread()
+
+    results, loop_thread = asyncio.run(scenario())
+    assert len(loaded_in) == 1 and loaded_in[0] is not loop_thread
+    assert all("answer" in result for result in results)
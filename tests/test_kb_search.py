@@ -0,0 +1,85 @@
+from api.services.kb_search import BM25Index, select_kb_hits
+
+MIN_CONFIDENCE = 0.6
+
+DOCUMENTS = [
+    {"id": "python", "title": "Qué es Python", "category": "lenguajes", "content": "Python es un lenguaje de programación."},
+    {"id": "java", "title": "Qué es Java", "category": "lenguajes", "content": "Java es un lenguaje compilado a bytecode."},
+    {"id": "cocina", "title": "Recetas", "category": "hogar", "content": "Una receta de pasta con salsa de tomate."},
+]
+
+
+def test_title_match_ranks_first():
+    hits = BM25Index(DOCUMENTS).search("lenguaje python")
+    assert [hit.document["id"] for hit in hits] == ["python", "java"]
+    assert hits[0].score > hits[1].score
+
+
+def test_confidence_is_fraction_of_matched_terms():
+    index = BM25Index(DOCUMENTS)
+    assert index.search("python")[0].confidence == 1.0
+    # "rust" no está en la base: la confianza baja aunque "lenguaje" coincida
+    partial = index.search("lenguaje rust")[0]
+    assert 0 < partial.confidence < 1
+
+
+def test_confidence_halved_without_heading_match():
+    # "tomate" solo aparece en el contenido, no en el título ni la categoría
+    hit = BM25Index(DOCUMENTS).search("tomate")[0]
+    assert hit.document["id"] == "cocina"
+    assert hit.confidence == 0.5
+
+
+def test_empty_query_and_unknown_terms():
+    index = BM25Index(DOCUMENTS)
+    assert index.search("") == []
+    assert index.search("zzz qqq") == []
+
+
+def test_select_kb_hits_applies_confidence_and_relative_score():
+    hits = BM25Index(DOCUMENTS).search("qué es python")
+    selected = select_kb_hits(hits, MIN_CONFIDENCE)
+    assert [hit.document["id"] for hit in selected] == ["python"]
+    assert select_kb_hits([], MIN_CONFIDENCE) == []
+
+
+def test_course_questions_answered_from_knowledge_base(kb):
+    for question, doc_id in [
+        ("¿Qué es ChatGPT?", "chatgpt_intro"),
+        ("que es la inteligencia artificial", "ia_intro"),
+    ]:
+        selected = select_kb_hits(kb.index.search(question), MIN_CONFIDENCE)
+        assert selected and selected[0].document["id"] == doc_id, question
+
+
+def test_unrelated_or_partial_questions_fall_through(kb):
+    for question in ["receta de pasta", "¿ChatGPT miente?", "chatgpt o gemini"]:
+        assert select_kb_hits(kb.index.search(question), MIN_CONFIDENCE) == [], question
+
+
+def test_correct_terms_only_touches_unknown_words(kb):
+    assert kb.correct_terms("chat gpt") == ["chatgpt"]
+    assert kb.correct_terms("contrasenias") == ["contrasena"]
+    assert kb.correct_terms("¿Qué es ChatGPT?") is None
+
+
+def test_typos_answered_after_correction(kb):
+    from api.services.simulador_service import _fuzzy_search
+
+    for question, doc_id in [("chat gpt", "chatgpt_intro"), ("contrasenias", "seguridad_basica")]:
+        hits = _fuzzy_search(kb, question)
+        assert hits and hits[0].document["id"] == doc_id, question
+
+
+def test_correction_keeps_the_confidence_gate(kb):
+    from api.services.simulador_service import _fuzzy_search
+
+    for question in [
+        "¿ChatGPT miente?",
+        "chatgpt o gemini",
+        "¿ChatGPT es gratis?",
+        "chatgpt en ingles",
+        "cómo uso ChatGPT en el celular",
+    ]:
+        assert select_kb_hits(kb.index.search(question), MIN_CONFIDENCE) == [], question
+        assert _fuzzy_search(kb, question) == [], question
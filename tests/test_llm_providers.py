@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from api.services.llm_providers import GeminiProvider, ProviderError, SimulatorProvider, TooManyRequests, error_for_status
+from api.services.resilience import is_retryable
+
+
+class RecordingSleep:
+    def __init__(self):
+        self.total = 0.0
+
+    async def __call__(self, seconds):
+        self.total += seconds
+
+
+def test_generate_reports_usage_and_latency():
+    sleep = RecordingSleep()
+    provider = SimulatorProvider(median_latency=0.5, sigma=0, tokens_per_second=100, reply_tokens=50, sleep=sleep)
+    response = asyncio.run(provider.generate("¿Qué es un prompt?"))
+    assert response.text.startswith("Respuesta simulada")
+    assert response.usage["total_tokens"] == response.usage["prompt_tokens"] + response.usage["candidates_tokens"]
+    # Latencia hasta el primer token (sigma 0: la mediana) más el tiempo de generación
+    assert sleep.total == pytest.approx(0.5 + response.usage["candidates_tokens"] / 100)
+    assert provider.calls == 1
+
+
+def test_stream_joins_to_full_reply_with_usage_at_the_end():
+    provider = SimulatorProvider(median_latency=0, tokens_per_second=0, reply_tokens=80, sleep=RecordingSleep())
+
+    async def collect():
+        return [chunk async for chunk in provider.stream("hola")]
+
+    chunks = asyncio.run(collect())
+    assert len(chunks) > 1
+    assert "".join(chunk.text for chunk in chunks) == provider._default_reply("hola")
+    assert chunks[-1].usage is not None
+    assert all(chunk.usage is None for chunk in chunks[:-1])
+
+
+def test_error_injection_is_reproducible_and_retryable():
+    def run(seed):
+        provider = SimulatorProvider(median_latency=0, tokens_per_second=0, error_rate=0.5, seed=seed, sleep=RecordingSleep())
+        outcomes = []
+        for _ in range(20):
+            try:
+                asyncio.run(provider.generate("hola"))
+                outcomes.append("ok")
+            except ProviderError as e:
+                assert is_retryable(e)
+                outcomes.append(type(e).__name__)
+        return provider, outcomes
+
+    provider, outcomes = run(7)
+    assert run(7)[1] == outcomes
+    assert 0 < provider.failures < 20
+    assert provider.stats()["failures"] == provider.failures
+
+
+def test_error_for_status_maps_http_codes():
+    assert isinstance(error_for_status(429, "x"), TooManyRequests)
+    assert type(error_for_status(400, "x")) is ProviderError
+
+
+class BlockingStreamModel:
+    """Modelo sin API asíncrona que genera un fragmento cada `interval` segundos"""
+
+    def __init__(self, chunks=50, interval=0.02):
+        self.chunks = chunks
+        self.interval = interval
+        self.produced = 0
+        self.finished = threading.Event()
+
+    def generate_content(self, prompt, stream=False):
+        try:
+            for i in range(self.chunks):
+                time.sleep(self.interval)
+                self.produced += 1
+                yield SimpleNamespace(text=f"{i} ", usage_metadata=None)
+        finally:
+            self.finished.set()
+
+
+def test_gemini_executor_stream_yields_every_chunk():
+    model = BlockingStreamModel(chunks=5, interval=0)
+    provider = GeminiProvider(model, "fake")
+
+    async def collect():
+        return [chunk.text async for chunk in provider.stream("hola")]
+
+    assert asyncio.run(collect()) == ["0 ", "1 ", "2 ", "3 ", "4 "]
+
+
+def test_gemini_executor_stream_stops_producing_after_disconnect():
+    model = BlockingStreamModel()
+    provider = GeminiProvider(model, "fake")
+
+    async def disconnect_after_first_chunk():
+        stream = provider.stream("hola")
+        await stream.__anext__()
+        started = time.perf_counter()
+        await stream.aclose()
+        return time.perf_counter() - started
+
+    # No se espera a que el hilo termine toda la generación (50 fragmentos, ~1 s)
+    assert asyncio.run(disconnect_after_first_chunk()) < 0.2
+    assert model.finished.wait(1)
+    assert model.produced < model.chunks
+
+
+def test_gemini_executor_stream_cancellation_does_not_wait_for_producer():
+    model = BlockingStreamModel()
+    provider = GeminiProvider(model, "fake")
+
+    async def cancel_mid_stream():
+        first = asyncio.Event()
+
+        async def consume():
+            async for _ in provider.stream("hola"):
+                first.set()
+
+        task = asyncio.create_task(consume())
+        await first.wait()
+        started = time.perf_counter()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return time.perf_counter() - started
+
+    assert asyncio.run(cancel_mid_stream()) < 0.2
+    assert model.finished.wait(1)
+    assert model.produced < model.chunks
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from api.services.llm_providers import SimulatorProvider, TooManyRequests
+from api.services.model_router import LIGHT, STANDARD, KeyQuota, ModelRouter, PoolTarget, QuotaExhaustedError
+
+
+class FlakyProvider(SimulatorProvider):
+    """Simulador instantáneo que responde 429 las próximas `failures` veces"""
+
+    def __init__(self):
+        super().__init__(median_latency=0, tokens_per_second=0, reply_tokens=20, seed=1)
+        self.failures_left = 0
+
+    async def generate(self, prompt):
+        if self.failures_left:
+            self.failures_left -= 1
+            raise TooManyRequests("cuota agotada")
+        return await super().generate(prompt)
+
+
+def make_router(clock, targets, **options):
+    async def sleep(seconds):
+        clock.advance(seconds)
+
+    return ModelRouter([PoolTarget(tier, quota, FlakyProvider()) for tier, quota in targets], sleep=sleep, **options)
+
+
+LONG_PROMPT = "x" * 1000
+
+
+def test_spreads_calls_and_skips_keys_without_quota(clock):
+    key_a = KeyQuota("key-a", "std", rpm_limit=2, clock=clock)
+    key_b = KeyQuota("key-b", "std", rpm_limit=2, clock=clock)
+    router = make_router(clock, [(STANDARD, key_a), (STANDARD, key_b)], wait_timeout=0)
+
+    async def scenario():
+        for _ in range(4):
+            await router.generate(LONG_PROMPT)
+        with pytest.raises(QuotaExhaustedError):
+            await router.generate(LONG_PROMPT)
+
+    asyncio.run(scenario())
+    assert (key_a.calls, key_b.calls) == (2, 2)
+
+
+def test_waits_for_the_window_to_free_quota(clock):
+    quota = KeyQuota("key-a", "std", rpm_limit=1, clock=clock)
+    router = make_router(clock, [(STANDARD, quota)], wait_timeout=120)
+
+    async def scenario():
+        await router.generate(LONG_PROMPT)
+        await router.generate(LONG_PROMPT)
+
+    started = clock.now
+    asyncio.run(scenario())
+    assert clock.now - started >= 60
+    assert quota.calls == 2
+
+
+def test_429_puts_key_in_cooldown(clock):
+    key_a = KeyQuota("key-a", "std", clock=clock)
+    key_b = KeyQuota("key-b", "std", clock=clock)
+    router = make_router(clock, [(STANDARD, key_a), (STANDARD, key_b)], cooldown_seconds=30)
+    router.targets[0].provider.failures_left = 1
+
+    async def scenario():
+        with pytest.raises(TooManyRequests):
+            await router.generate(LONG_PROMPT)
+        return [(await router.generate(LONG_PROMPT)) for _ in range(3)]
+
+    asyncio.run(scenario())
+    assert key_a.throttled == 1 and key_a.cooling_down()
+    assert key_a.calls == 1 and key_b.calls == 3
+    clock.advance(30)
+    assert not key_a.cooling_down()
+
+
+def test_short_prompts_use_light_tier_and_overflow(clock):
+    standard = KeyQuota("key-a", "std", rpm_limit=5, clock=clock)
+    light = KeyQuota("key-a", "lite", rpm_limit=1, clock=clock)
+    router = make_router(clock, [(STANDARD, standard), (LIGHT, light)], wait_timeout=0)
+    assert router.tier_for("hola") == LIGHT
+    assert router.tier_for(LONG_PROMPT) == STANDARD
+    assert router.tier_for("Material del curso:\n...\n\nPregunta:\nhola") == STANDARD
+
+    async def scenario():
+        return [(await router.generate("hola")).model for _ in range(2)]
+
+    assert asyncio.run(scenario()) == ["lite", "std"]
+
+
+def test_settle_replaces_estimate_with_real_usage(clock):
+    quota = KeyQuota("key-a", "std", tpm_limit=1000, clock=clock)
+    first = quota.reserve(500)
+    second = quota.reserve(500)
+    assert quota.headroom(1) is None
+    quota.settle(first, {"prompt_tokens": 50, "candidates_tokens": 50, "total_tokens": 100})
+    assert quota.stats()["tokens_last_minute"] == 600
+    quota.settle(second, {"prompt_tokens": 50, "candidates_tokens": 50, "total_tokens": 100})
+    assert quota.stats()["tokens_last_minute"] == 200
+    clock.advance(60)
+    assert quota.stats()["tokens_last_minute"] == 0
+
+
+def test_settle_after_window_does_not_touch_the_total(clock):
+    quota = KeyQuota("key-a", "std", tpm_limit=1000, clock=clock)
+    old = quota.reserve(500)
+    clock.advance(60)
+    quota.reserve(500)  # misma cantidad de tokens que la reserva vencida
+    assert quota.stats()["tokens_last_minute"] == 500
+    quota.settle(old, {"prompt_tokens": 50, "candidates_tokens": 50, "total_tokens": 100})
+    assert quota.stats()["tokens_last_minute"] == 500
@@ -0,0 +1,73 @@
+from api.services.kb_search import SearchHit
+from api.services.kb_store import KnowledgeBase
+from api.services.passages import pack_context, split_passages
+from api.services.text_processing import estimate_tokens
+
+PARAGRAPHS = [f"Párrafo {n}: " + "palabra " * 20 for n in range(6)]  # ~45 tokens cada uno
+DOC = {"id": "doc", "title": "Documento", "category": "prueba", "content": "\n\n".join(PARAGRAPHS)}
+
+
+def hit(passage, confidence=0.9):
+    return SearchHit({"id": passage.id}, confidence, confidence)
+
+
+def test_passages_overlap_and_ids_are_stable():
+    passages = split_passages(DOC, max_tokens=100, overlap=1)
+    assert [p.paragraphs for p in passages] == [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5)]
+    assert [p.id for p in split_passages(dict(DOC), max_tokens=100)] == [p.id for p in passages]
+    assert len({p.id for p in passages}) == len(passages)
+
+    # Editar el primer párrafo solo cambia el id del pasaje que lo contiene
+    edited = dict(DOC, content="\n\n".join([PARAGRAPHS[0].replace("palabra", "término")] + PARAGRAPHS[1:]))
+    edited_ids = [p.id for p in split_passages(edited, max_tokens=100)]
+    assert edited_ids[1:] == [p.id for p in passages][1:]
+    assert edited_ids[0] != passages[0].id
+
+
+def test_passage_ids_survive_a_reload(tmp_path):
+    (tmp_path / "a.md").write_text("---\nid: a\ntitle: Uno\ncategory: x\n---\n\n" + DOC["content"], encoding="utf-8")
+    (tmp_path / "b.md").write_text("---\nid: b\ntitle: Dos\ncategory: x\n---\n\nOtro texto.", encoding="utf-8")
+    first, _ = KnowledgeBase.load(str(tmp_path))
+    (tmp_path / "b.md").write_text("---\nid: b\ntitle: Dos\ncategory: x\n---\n\nTexto cambiado.", encoding="utf-8")
+    second, changes = KnowledgeBase.load(str(tmp_path), previous=first)
+    assert changes["updated"] == 1
+    ids = lambda kb, doc_id: sorted(pid for pid, p in kb.passages.items() if p.doc_id == doc_id)
+    assert ids(second, "a") == ids(first, "a")
+    assert ids(second, "b") != ids(first, "b")
+
+
+def test_pack_context_honours_budget_and_lists_only_packed_sources():
+    passages = split_passages(DOC, max_tokens=100, overlap=1)
+    by_id = {p.id: p for p in passages}
+    hits = [hit(passages[0]), hit(passages[3], 0.8), hit(passages[4], 0.7)]
+
+    context, sources = pack_context(hits, by_id, token_budget=200)
+    assert estimate_tokens(context) <= 200
+    # El segundo pasaje entra; el tercero ya no cabe en lo que queda del presupuesto
+    assert [s["id"] for s in sources] == [passages[0].id, passages[3].id]
+    assert "Párrafo 5" not in context
+
+    context, sources = pack_context(hits, by_id, token_budget=20)
+    assert (context, sources) == ("", [])
+
+
+def test_pack_context_drops_overlapping_paragraphs():
+    passages = split_passages(DOC, max_tokens=100, overlap=1)
+    by_id = {p.id: p for p in passages}
+    hits = [hit(passages[1]), hit(passages[0], 0.8), hit(passages[2], 0.7), hit(passages[1], 0.6)]
+
+    context, sources = pack_context(hits, by_id, token_budget=1000)
+    # Cada párrafo aparece una sola vez y el pasaje repetido no suma una fuente
+    for n in range(4):
+        assert context.count(f"Párrafo {n}:") == 1
+    assert [s["id"] for s in sources] == [passages[1].id, passages[0].id, passages[2].id]
+
+
+def test_grounding_uses_the_configured_budget(monkeypatch):
+    from api.services import simulador_service
+
+    monkeypatch.setattr(simulador_service.settings, "RAG_CONTEXT_TOKEN_BUDGET", 250)
+    context, sources = simulador_service._grounding("consejos para escribir prompts")
+    assert sources and estimate_tokens(context) <= 250
+    # Una fuente por sección del contexto: los pasajes que no entraron no se citan
+    assert [f"[{n}]" in context for n in range(1, len(sources) + 2)] == [True] * len(sources) + [False]
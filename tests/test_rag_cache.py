@@ -0,0 +1,53 @@
+import asyncio
+
+from api.services import simulador_service
+from api.services.response_cache import ResponseCache
+
+
+def collect(stream):
+    async def run():
+        return [event async for event in stream]
+    return asyncio.run(run())
+
+
+def test_both_rag_paths_cache_the_same_results(monkeypatch):
+    cache = ResponseCache(max_entries=16, ttl_seconds=60)
+    monkeypatch.setattr(simulador_service, "_rag_cache", cache)
+    monkeypatch.setattr(simulador_service.settings, "RAG_CACHE_ENABLED", True)
+
+    # Saludo (respuesta fija del clasificador de intención): ninguna de las dos vías la guarda
+    assert asyncio.run(simulador_service.rag_answer("hola"))["source_type"] == "canned"
+    events = collect(simulador_service.rag_answer_stream("hola"))
+    assert events[-1]["data"]["source_type"] == "canned"
+    assert cache.stats()["entries"] == 0
+
+    # Respuesta de la base de conocimiento: la vía en streaming la guarda y la normal la reutiliza
+    question = "¿Qué es ChatGPT?"
+    events = collect(simulador_service.rag_answer_stream(question))
+    assert events[-1]["data"]["source_type"] == "knowledge_base"
+    assert cache.stats()["entries"] == 1
+    assert asyncio.run(simulador_service.rag_answer(question))["cached"] is True
+
+
+class CountingCache(ResponseCache):
+    def __init__(self):
+        super().__init__(max_entries=16, ttl_seconds=60)
+        self.writes = 0
+
+    async def aset(self, key, value):
+        self.writes += 1
+        await super().aset(key, value)
+
+
+def test_coalesced_rag_requests_store_the_result_once(monkeypatch):
+    cache = CountingCache()
+    monkeypatch.setattr(simulador_service, "_rag_cache", cache)
+    monkeypatch.setattr(simulador_service.settings, "RAG_CACHE_ENABLED", True)
+    monkeypatch.setattr(simulador_service.settings, "SINGLE_FLIGHT_ENABLED", True)
+
+    async def scenario():
+        return await asyncio.gather(*(simulador_service.rag_answer("¿Qué es un prompt?") for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert all(result["source_type"] == "knowledge_base" and result["cached"] is False for result in results)
+    assert cache.writes == 1
@@ -0,0 +1,81 @@
+import asyncio
+
+from api.services import simulador_service
+from api.services.resilience import LatencyTracker, backoff_delay, hedged_call
+
+
+def test_slow_primary_launches_hedge_and_loser_is_cancelled():
+    started = []
+    cancelled = []
+
+    async def call():
+        attempt = len(started)
+        started.append(attempt)
+        try:
+            await asyncio.sleep(1.0 if attempt == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return f"respuesta {attempt}"
+
+    async def run():
+        result = await hedged_call(call, hedge_delay=0.02)
+        await asyncio.sleep(0)  # deja que la cancelación llegue a la perdedora
+        return result
+
+    assert asyncio.run(run()) == ("respuesta 1", True)
+    assert started == [0, 1]
+    assert cancelled == [0]
+
+
+def test_fast_primary_or_denied_hedge_runs_once():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    assert asyncio.run(hedged_call(call, hedge_delay=0.01, should_hedge=lambda: False)) == ("ok", False)
+    assert asyncio.run(hedged_call(call, hedge_delay=None)) == ("ok", False)
+    assert len(calls) == 2
+
+
+def test_backoff_is_exponential_capped_and_jittered():
+    assert [backoff_delay(attempt, 0.25, 2.0, rng=lambda: 1.0) for attempt in range(6)] == [0.25, 0.5, 1.0, 2.0, 2.0, 2.0]
+    assert backoff_delay(3, 0.25, 2.0, rng=lambda: 0.5) == 1.0
+    assert backoff_delay(3, 0.25, 2.0, rng=lambda: 0.0) == 0.0
+    delays = {backoff_delay(10, 0.25, 2.0) for _ in range(50)}
+    assert len(delays) > 1 and all(0 <= delay <= 2.0 for delay in delays)
+
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for value in range(1, 10):
+        tracker.add(value / 100)
+    assert tracker.percentile(95) is None  # pocas muestras
+    for value in range(10, 101):
+        tracker.add(value / 100)
+    assert tracker.percentile(50) == 0.5
+    assert tracker.percentile(95) == 0.95
+    tracker.add(5.0)  # la ventana descarta la muestra más vieja
+    assert tracker.percentile(100) == 5.0
+
+
+def test_hedge_delay_follows_percentile_with_floor(monkeypatch):
+    tracker = LatencyTracker(window=100, min_samples=10)
+    monkeypatch.setattr(simulador_service, "_upstream_latencies", tracker)
+    monkeypatch.setattr(simulador_service.settings, "GEMINI_HEDGE_ENABLED", True)
+    monkeypatch.setattr(simulador_service.settings, "GEMINI_HEDGE_PERCENTILE", 90.0)
+    monkeypatch.setattr(simulador_service.settings, "GEMINI_HEDGE_MIN_DELAY_SECONDS", 0.5)
+
+    assert simulador_service._hedge_delay() is None  # sin muestras no hay hedge
+    for value in range(1, 101):
+        tracker.add(value / 100)
+    assert simulador_service._hedge_delay() == 0.9
+    for _ in range(100):
+        tracker.add(0.1)
+    assert simulador_service._hedge_delay() == 0.5  # piso
+
+    monkeypatch.setattr(simulador_service.settings, "GEMINI_HEDGE_ENABLED", False)
+    assert simulador_service._hedge_delay() is None
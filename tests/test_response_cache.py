@@ -0,0 +1,70 @@
+import asyncio
+
+from api.services.response_cache import ResponseCache, make_cache_key
+from api.services.sqlite_cache import SQLiteCache
+
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = ResponseCache(max_entries=2, ttl_seconds=60, clock=clock)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}  # "a" pasa a ser la más reciente
+    cache.set("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("c") == {"v": 3}
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(max_entries=10, ttl_seconds=60, clock=clock)
+    cache.set("a", {"v": 1})
+    clock.advance(59)
+    assert cache.get("a") == {"v": 1}
+    clock.advance(1)
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_disabled_cache_and_stats(clock):
+    cache = ResponseCache(max_entries=0, ttl_seconds=60, clock=clock)
+    cache.set("a", {"v": 1})
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["hit_rate"] == 0.0
+
+
+def test_async_interface(clock):
+    cache = ResponseCache(max_entries=10, ttl_seconds=60, clock=clock)
+
+    async def scenario():
+        await cache.aset("a", {"v": 1})
+        return await cache.aget("a")
+
+    assert asyncio.run(scenario()) == {"v": 1}
+
+
+def test_cache_key_normalizes_question():
+    assert make_cache_key("¿Qué es ChatGPT?", "m", "v1") == make_cache_key("que es chatgpt", "m", "v1")
+    assert make_cache_key("que es chatgpt", "m", "v1") != make_cache_key("que es chatgpt", "m", "v2")
+
+
+def test_sqlite_stats_do_not_query_the_database(tmp_path, clock):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), max_entries=50, ttl_seconds=60, clock=clock)
+    assert cache.stats()["entries"] == 0
+
+    async def fill():
+        for i in range(3):
+            await cache.aset(f"k{i}", {"v": i})
+        assert await cache.aget("k1") == {"v": 1}
+
+    asyncio.run(fill())  # con 50 entradas se limpia (y se recuenta) en cada escritura
+
+    def forbidden():
+        raise AssertionError("stats no debe consultar SQLite desde el event loop")
+
+    cache._connection = forbidden
+    stats = cache.stats()
+    assert stats["entries"] == 3
+    assert stats["hits"] == 1
@@ -0,0 +1,68 @@
+import asyncio
+
+from api.responses import PrecomputedJSON, dumps
+
+from .conftest import asgi_client
+
+
+def request(app, method, path, **kwargs):
+    async def run():
+        async with asgi_client(app) as client:
+            return await client.request(method, path, **kwargs)
+    return asyncio.run(run())
+
+
+def test_dumps_keeps_accents_unescaped():
+    assert dumps({"texto": "¿Qué es ChatGPT? 👋"}).decode("utf-8") == '{"texto":"¿Qué es ChatGPT? 👋"}'
+
+
+def test_if_none_match_returns_304_without_body(app):
+    first = request(app, "GET", "/")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    cached = request(app, "GET", "/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    assert request(app, "GET", "/", headers={"If-None-Match": 'W/"otro", ' + etag}).status_code == 304
+    assert request(app, "GET", "/", headers={"If-None-Match": '"otro"'}).status_code == 200
+
+
+def test_precomputed_error_bodies_never_answer_304():
+    body = PrecomputedJSON({"status": "warming_up"}, status_code=503)
+
+    class FakeRequest:
+        headers = {"if-none-match": body.etag}
+
+    assert body.response(FakeRequest()).status_code == 503
+
+
+def test_large_answers_are_gzipped_when_accepted(app):
+    # Un lote de respuestas de la base supera GZIP_MINIMUM_SIZE
+    batch = {"questions": ["¿Qué es ChatGPT?", "¿Qué es un prompt?", "¿Qué es ChatGPT?"]}
+    compressed = request(app, "POST", "/simulador/rag/batch", json=batch, headers={"Accept-Encoding": "gzip"})
+    assert compressed.status_code == 200
+    assert compressed.headers.get("content-encoding") == "gzip"
+    assert int(compressed.headers["content-length"]) < len(compressed.content)  # httpx lo descomprime
+
+    plain = request(app, "POST", "/simulador/rag/batch", json=batch, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    answers = lambda response: [item["result"]["answer"] for item in response.json()["results"]]
+    assert answers(plain) == answers(compressed)
+
+
+def test_small_answers_are_not_gzipped(app):
+    response = request(app, "GET", "/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_sse_responses_are_never_compressed(app):
+    response = request(
+        app, "POST", "/simulador/rag/stream", json={"question": "¿Qué es ChatGPT?"}, headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "content-encoding" not in response.headers
+    assert "event: done" in response.text
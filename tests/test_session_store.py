@@ -0,0 +1,39 @@
+from api.services.session_store import Turn, trim_history
+from api.services.text_processing import estimate_tokens
+
+
+def history_tokens(summary, turns):
+    return estimate_tokens(summary or "") + sum(estimate_tokens(t.user) + estimate_tokens(t.assistant) for t in turns)
+
+
+def test_recent_turns_kept_and_older_summarized():
+    turns = [Turn(f"pregunta {i}", "respuesta " * 10) for i in range(10)]
+    summary, kept = trim_history(turns, token_budget=100)
+    assert kept and kept[-1] == turns[-1]
+    assert summary.endswith("pregunta " + str(len(turns) - len(kept) - 1))
+    assert history_tokens(summary, kept) <= 100
+
+
+def test_long_answer_is_clipped_to_the_budget():
+    summary, kept = trim_history([Turn("¿qué es un prompt?", "x" * 4000)], token_budget=100)
+    assert summary is None
+    assert kept[0].user == "¿qué es un prompt?"
+    assert kept[0].assistant.endswith("…")
+    assert history_tokens(summary, kept) <= 80
+
+
+def test_oversized_question_is_clipped_too():
+    turns = [Turn("hola", "¡Hola!"), Turn("y" * 4000, "respuesta corta")]
+    summary, kept = trim_history(turns, token_budget=100)
+    assert len(kept) == 1 and kept[0].user.endswith("…")
+    assert kept[0].assistant == "respuesta corta"
+    assert history_tokens(summary, kept) <= 100
+
+    summary, kept = trim_history([Turn("y" * 4000, "z" * 4000)], token_budget=100)
+    assert estimate_tokens(kept[0].user) == estimate_tokens(kept[0].assistant) == 40
+
+
+def test_budget_too_small_drops_everything():
+    assert trim_history([Turn("y" * 400, "z")], token_budget=0) == (None, [])
+    summary, kept = trim_history([Turn("y" * 400, "z" * 400)], token_budget=1)
+    assert kept == []
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from api.services.response_cache import ResponseCache, TieredCache
+from api.services.session_store import SharedSessionStore, Turn
+from api.services.shared_state import LocalState, RedisState, SharedStateCache, SQLiteState
+
+BACKENDS = ["local", "sqlite", "redis"]
+
+
+class Backend:
+    """Dos "instancias de la app" (workers) sobre el mismo almacén, y cómo hacer vencer sus claves"""
+
+    def __init__(self, name, clock, tmp_path):
+        self.name = name
+        self.clock = clock
+        self.path = str(tmp_path / "state.db")
+        if name == "redis":
+            fakeredis = pytest.importorskip("fakeredis")
+            self.server = fakeredis.FakeServer()
+            self._fakeredis = fakeredis
+        self._local = None
+
+    def make(self):
+        if self.name == "local":
+            # En memoria no hay nada que compartir entre procesos: ambas instancias usan el mismo
+            self._local = self._local or LocalState(clock=self.clock)
+            return self._local
+        if self.name == "sqlite":
+            return SQLiteState(self.path, clock=self.clock)
+        client = self._fakeredis.aioredis.FakeRedis(server=self.server, decode_responses=True)
+        return RedisState(client)
+
+    async def expire(self, seconds):
+        if self.name == "redis":
+            await asyncio.sleep(seconds)  # Redis vence las claves con su propio reloj
+        else:
+            self.clock.advance(seconds)
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, clock, tmp_path):
+    return Backend(request.param, clock, tmp_path)
+
+
+def test_get_set_delete_and_ttl(backend):
+    async def run():
+        state = backend.make()
+        assert await state.get("a") is None
+        await state.set("a", "1")
+        await state.set("b", "2", ttl_seconds=0.05)
+        assert await state.get("a") == "1"
+        assert await state.get("b") == "2"
+        await backend.expire(0.1)
+        assert await state.get("b") is None
+        assert await state.get("a") == "1"
+        assert await state.delete("a") is True
+        assert await state.delete("a") is False
+        assert await state.get("a") is None
+
+    asyncio.run(run())
+
+
+def test_items_and_delete_prefix(backend):
+    async def run():
+        state = backend.make()
+        await state.set("answers:x", "1")
+        await state.set("answers:y", "2")
+        await state.set("session:z", "3")
+        await state.set("answers:old", "4", ttl_seconds=0.05)
+        await backend.expire(0.1)
+        assert await state.items("answers:") == {"answers:x": "1", "answers:y": "2"}
+        assert await state.delete_prefix("answers:") >= 2
+        assert await state.items("answers:") == {}
+        assert await state.items("session:") == {"session:z": "3"}
+
+    asyncio.run(run())
+
+
+def test_tiered_cache_clears_shared_answers_only(backend):
+    async def run():
+        state = backend.make()
+        cache = TieredCache(ResponseCache(max_entries=10, ttl_seconds=60), SharedStateCache(state, ttl_seconds=60))
+        await cache.aset("k", {"answer": "hola"})
+        await state.set("session:s", "[]")
+        assert await cache.aget("k") == {"answer": "hola"}
+        await cache.aclear()
+        assert await cache.aget("k") is None
+        assert await state.get("session:s") == "[]"
+
+    asyncio.run(run())
+
+
+def test_session_round_trip_across_two_instances(backend):
+    async def run():
+        first = SharedSessionStore(backend.make(), max_turns=2, idle_seconds=60)
+        second = SharedSessionStore(backend.make(), max_turns=2, idle_seconds=60)
+        await first.aappend("s1", "hola", "¡Hola!")
+        await second.aappend("s1", "¿qué es un prompt?", "Es una instrucción.")
+        await first.aappend("s1", "gracias", "De nada")
+        assert await second.ahistory("s1") == [
+            Turn("¿qué es un prompt?", "Es una instrucción."),
+            Turn("gracias", "De nada"),
+        ]
+        assert await second.adelete("s1") is True
+        assert await first.ahistory("s1") == []
+
+    asyncio.run(run())
+
+
+def test_session_expires_when_idle(backend):
+    async def run():
+        store = SharedSessionStore(backend.make(), max_turns=5, idle_seconds=0.05)
+        await store.aappend("s1", "hola", "¡Hola!")
+        await backend.expire(0.1)
+        assert await store.ahistory("s1") == []
+
+    asyncio.run(run())
+
+
+def test_concurrent_appends_from_two_instances_keep_every_turn(backend):
+    async def run():
+        first = SharedSessionStore(backend.make(), max_turns=50, idle_seconds=60)
+        second = SharedSessionStore(backend.make(), max_turns=50, idle_seconds=60)
+        stores = [first, second]
+        await asyncio.gather(*(stores[n % 2].aappend("s1", f"pregunta {n}", f"respuesta {n}") for n in range(20)))
+        turns = await first.ahistory("s1")
+        assert sorted(turn.user for turn in turns) == sorted(f"pregunta {n}" for n in range(20))
+
+        # El límite se aplica en el mismo agregado atómico
+        trimmed = SharedSessionStore(backend.make(), max_turns=3, idle_seconds=60)
+        await asyncio.gather(*(trimmed.aappend("s2", f"p{n}", f"r{n}") for n in range(10)))
+        assert len(await trimmed.ahistory("s2")) == 3
+
+    asyncio.run(run())
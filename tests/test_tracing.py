@@ -0,0 +1,90 @@
+import asyncio
+import io
+import json
+import logging
+
+from fastapi import FastAPI
+
+from api.middleware import TracingMiddleware
+from api.services.tracing import JsonFormatter, RequestIdFilter, span
+
+from .conftest import asgi_client
+
+service_logger = logging.getLogger("tests.tracing")
+
+
+def traced_app(**options):
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        with span("kb_search"):
+            service_logger.info("buscando")
+        return {"ok": True}
+
+    app.add_middleware(TracingMiddleware, **options)
+    return app
+
+
+def get(app, path="/work", **kwargs):
+    async def run():
+        async with asgi_client(app) as client:
+            return await client.get(path, **kwargs)
+    return asyncio.run(run())
+
+
+def test_sampled_requests_return_server_timing():
+    response = get(traced_app(sample_rate=1.0))
+    timing = response.headers["server-timing"]
+    assert timing.startswith("kb_search;dur=")
+    assert "total;dur=" in timing
+
+
+def test_sample_rate_zero_skips_server_timing_unless_forced():
+    app = traced_app(sample_rate=0.0)
+    assert "server-timing" not in get(app).headers
+    assert "server-timing" in get(app, headers={"X-Trace": "1"}).headers
+
+
+def test_sample_rate_samples_a_fraction(monkeypatch):
+    draws = iter([0.05, 0.5, 0.09, 0.95])
+    monkeypatch.setattr("api.middleware.random.random", lambda: next(draws))
+    app = traced_app(sample_rate=0.1)
+    assert ["server-timing" in get(app).headers for _ in range(4)] == [True, False, True, False]
+
+
+def test_server_timing_can_be_disabled():
+    response = get(traced_app(sample_rate=1.0, server_timing=False))
+    assert "server-timing" not in response.headers
+    assert "x-request-id" in response.headers
+
+
+def test_request_id_is_echoed_or_generated():
+    app = traced_app()
+    assert get(app, headers={"X-Request-ID": "cliente-42"}).headers["x-request-id"] == "cliente-42"
+    generated = get(app, headers={"X-Request-ID": "no valido!"}).headers["x-request-id"]
+    assert generated != "no valido!" and len(generated) == 16
+
+
+def test_json_log_lines_carry_the_request_id():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(JsonFormatter())
+    loggers = [service_logger, logging.getLogger("api.trace")]
+    for logger in loggers:
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    try:
+        get(traced_app(sample_rate=1.0), headers={"X-Request-ID": "abc-123"})
+    finally:
+        for logger in loggers:
+            logger.removeHandler(handler)
+
+    service_line, trace_line = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert service_line["message"] == "buscando"
+    assert service_line["request_id"] == "abc-123"
+    assert trace_line["logger"] == "api.trace"
+    assert trace_line["request_id"] == "abc-123"
+    assert trace_line["route"] == "/work" and trace_line["status"] == 200
+    assert trace_line["spans"]["kb_search"]["count"] == 1